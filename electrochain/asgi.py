@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "electrochain.settings")
+# Под ASGI постоянные соединения с БД отключаются (см. DB_CONNECTION_STRATEGY в settings)
+os.environ.setdefault("DJANGO_SERVER_INTERFACE", "asgi")
 
 application = get_asgi_application()
@@ -1,7 +1,7 @@
-import sys
 from pathlib import Path
 
 from decouple import Csv, config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,6 +23,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Наши приложения
     "network.apps.NetworkConfig",
     # Сторонние приложения
@@ -33,11 +34,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "network.metrics.MetricsMiddleware",  # Первым: время обработки запроса целиком
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "network.profiling.RequestProfilerMiddleware",  # Профиль запроса по X-Profile суперпользователя
+    "network.instrumentation.SQLInstrumentationMiddleware",  # Включается SQL_INSTRUMENTATION
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -91,17 +95,32 @@ DATABASES = {
     }
 }
 
-# Проверка подключения к базе данных
-try:
-    # Тестовое подключение
-    from django.db import connections
-
-    connections["default"].ensure_connection()
-    print("✅ Подключение к PostgreSQL успешно установлено")
-except Exception as e:
-    print(f"❌ Ошибка подключения к PostgreSQL: {e}")
-    print("Проверьте настройки в .env файле")
-    sys.exit(1)
+# Стратегия соединений с БД:
+#   persistent - соединение процесса переиспользуется между запросами (CONN_MAX_AGE)
+#                и проверяется перед повторным использованием (CONN_HEALTH_CHECKS);
+#                под ASGI соединение живет в потоке sync_to_async и не закрывается по окончании
+#                запроса, поэтому там CONN_MAX_AGE принудительно 0 (для переиспользования - pool);
+#   pool       - пул соединений драйвера psycopg 3 (пакет psycopg[pool] из requirements.txt);
+#   none       - новое соединение на каждый запрос.
+# Подключение к БД при старте не проверяется: для этого есть команда check_database
+# и эндпоинт /api/health/ready/.
+DB_CONNECTION_STRATEGY = config("DB_CONNECTION_STRATEGY", default="persistent")
+# Выставляется в electrochain/asgi.py до загрузки настроек
+SERVER_INTERFACE = config("DJANGO_SERVER_INTERFACE", default="wsgi")
+if DB_CONNECTION_STRATEGY == "persistent":
+    if SERVER_INTERFACE == "asgi":
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+    else:
+        DATABASES["default"]["CONN_MAX_AGE"] = config("DB_CONN_MAX_AGE", default=60, cast=int)
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+elif DB_CONNECTION_STRATEGY == "pool":
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": config("DB_POOL_MIN_SIZE", default=2, cast=int),
+        "max_size": config("DB_POOL_MAX_SIZE", default=10, cast=int),
+        "timeout": config("DB_POOL_TIMEOUT", default=10, cast=int),
+    }
+elif DB_CONNECTION_STRATEGY != "none":
+    raise ImproperlyConfigured("DB_CONNECTION_STRATEGY: ожидается persistent, pool или none")
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -139,5 +158,72 @@ MEDIA_ROOT = BASE_DIR / "media"
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Интервал пакетной записи Employee.last_login_date (секунды).
+# Сохраненная дата последней активности отстает от фактической не больше чем на это значение.
+EMPLOYEE_LAST_SEEN_FLUSH_INTERVAL = config("EMPLOYEE_LAST_SEEN_FLUSH_INTERVAL", default=60, cast=int)
+
+# Кеш. Контекст авторизации сотрудника (network/access.py) кешируется между запросами только в общем
+# для процессов бэкенде: с кешем в памяти процесса (по умолчанию) он загружается из БД на каждый запрос,
+# иначе деактивация сотрудника не была бы видна другим воркерам. Для нескольких воркеров, например:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache, CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default=""),
+    }
+}
+
+# Время жизни кеша контекста авторизации сотрудника (секунды). Сохранение и удаление Employee/User
+# сбрасывают кеш сразу; изменения в обход save() (QuerySet.update) действуют не позже чем через таймаут.
+ACCESS_CONTEXT_CACHE_TIMEOUT = config("ACCESS_CONTEXT_CACHE_TIMEOUT", default=60, cast=int)
+
+# Размер порции серверного курсора при потоковой выгрузке /api/network-nodes/export/
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", default=2000, cast=int)
+
+# Размер порции UPDATE ... RETURNING при массовой очистке задолженности
+CLEAR_DEBT_CHUNK_SIZE = config("CLEAR_DEBT_CHUNK_SIZE", default=1000, cast=int)
+
+# Фоновые задачи (python manage.py run_jobs): массовые операции больше порога выполняются
+# в фоне и отвечают 202 Accepted со ссылкой на /api/jobs/<id>/
+JOB_ASYNC_THRESHOLD = config("JOB_ASYNC_THRESHOLD", default=5000, cast=int)
+JOB_WORKER_PROCESSES = config("JOB_WORKER_PROCESSES", default=2, cast=int)
+# Воркер обновляет Job.heartbeat_at раз в JOB_HEARTBEAT_INTERVAL секунд; задача без сигнала дольше
+# JOB_STALE_TIMEOUT (воркер убит) помечается ошибкой при выборе следующей задачи
+JOB_HEARTBEAT_INTERVAL = config("JOB_HEARTBEAT_INTERVAL", default=30, cast=int)
+JOB_STALE_TIMEOUT = config("JOB_STALE_TIMEOUT", default=300, cast=int)
+
+# Списки звеньев и продуктов сериализуются через values() без экземпляров моделей (network/fastpath.py).
+# Ответ совпадает с ModelSerializer; False - обычная сериализация DRF
+FAST_LIST_SERIALIZATION = config("FAST_LIST_SERIALIZATION", default=True, cast=bool)
+
+# Профилирование запросов (network/instrumentation.py): число и время SQL-запросов, самые медленные
+# выражения и фазы обработки. Сотрудники с is_staff получают заголовок Server-Timing, доля
+# SQL_INSTRUMENTATION_SAMPLE_RATE запросов записывается строкой JSON в журнал network.instrumentation
+SQL_INSTRUMENTATION = config("SQL_INSTRUMENTATION", default=False, cast=bool)
+SQL_INSTRUMENTATION_SAMPLE_RATE = config("SQL_INSTRUMENTATION_SAMPLE_RATE", default=0.01, cast=float)
+SQL_INSTRUMENTATION_SLOWEST = config("SQL_INSTRUMENTATION_SLOWEST", default=3, cast=int)
+
+# Метрики запросов для Prometheus (network/metrics.py, /api/metrics/). Несколько процессов
+# объединяют метрики через файлы в METRICS_DIR (каталог очищается при перезапуске сервиса);
+# доступ - заголовок "Authorization: Bearer METRICS_TOKEN" или сотрудник с is_staff
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+METRICS_DIR = config("METRICS_DIR", default="")
+METRICS_FLUSH_INTERVAL = config("METRICS_FLUSH_INTERVAL", default=10, cast=int)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Профиль отдельного запроса по заголовку "X-Profile: cprofile|sample" от суперпользователя
+# (network/profiling.py): период снятия стеков (сек.) и число хранимых профилей
+REQUEST_PROFILER_INTERVAL = config("REQUEST_PROFILER_INTERVAL", default=0.005, cast=float)
+REQUEST_PROFILER_KEEP = config("REQUEST_PROFILER_KEEP", default=200, cast=int)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "network.instrumentation": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
+
 # Email settings (для разработки)
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
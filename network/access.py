@@ -0,0 +1,141 @@
+"""
+Контекст авторизации запроса.
+
+Аутентификация, IsActiveEmployee, DepartmentPermission и кастомные действия
+используют один и тот же профиль сотрудника. Контекст загружается один раз
+на запрос (и кешируется между запросами на ACCESS_CONTEXT_CACHE_TIMEOUT секунд),
+а права отдела заранее разворачиваются в набор разрешенных HTTP-методов.
+Кеш сбрасывается при сохранении или удалении сотрудника и пользователя.
+
+Сброс должен быть виден всем воркерам, поэтому между запросами контекст
+кешируется только в общем бэкенде CACHES (Redis, Memcached, база данных,
+файлы). С кешем в памяти процесса (LocMemCache, по умолчанию) деактивация
+сотрудника не дошла бы до других процессов до истечения таймаута - тогда
+контекст загружается из БД на каждый запрос. С общим кешем изменения через
+save()/delete() действуют сразу, а изменения в обход сигналов
+(QuerySet.update) - не позже чем через ACCESS_CONTEXT_CACHE_TIMEOUT секунд.
+"""
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.permissions import SAFE_METHODS
+
+from .models import Employee
+
+ALL_METHODS = None  # Без ограничений по методам
+
+# Права отделов: названия отделов (в нижнем регистре) -> разрешенные методы
+DEPARTMENT_POLICIES = (
+    # Администраторы - полный доступ
+    (("администрация", "administration", "руководство"), ALL_METHODS),
+    # Отдел продаж - все методы кроме DELETE
+    (("продажи", "sales", "торговый отдел"), frozenset({"GET", "HEAD", "OPTIONS", "POST", "PUT", "PATCH"})),
+    # Отдел аналитики - только чтение
+    (("аналитика", "analytics", "отдел анализа"), frozenset(SAFE_METHODS)),
+)
+
+# Остальные отделы - только безопасные методы
+DEFAULT_ALLOWED_METHODS = frozenset(SAFE_METHODS)
+
+_department_methods = {
+    department: methods for departments, methods in DEPARTMENT_POLICIES for department in departments
+}
+
+DEFAULT_CACHE_TIMEOUT = 60
+REQUEST_ATTRIBUTE = "_network_access_context"
+
+
+def allowed_methods_for(department):
+    """Набор разрешенных методов для отдела (None - без ограничений)"""
+    return _department_methods.get((department or "").lower(), DEFAULT_ALLOWED_METHODS)
+
+
+def cache_key(user_id):
+    return f"network:access:{user_id}"
+
+
+def shared_cache():
+    """Кеш контекста или None, если бэкенд не общий для процессов"""
+    cache = caches["default"]
+    return None if isinstance(cache, (LocMemCache, DummyCache)) else cache
+
+
+class AccessContext:
+    """Результат разрешения прав пользователя для одного запроса"""
+
+    __slots__ = ("user_id", "employee", "is_active", "allowed_methods")
+
+    def __init__(self, user_id, employee):
+        self.user_id = user_id
+        self.employee = employee
+        self.is_active = employee is not None and employee.is_active
+        self.allowed_methods = allowed_methods_for(employee.department) if employee is not None else frozenset()
+
+    @property
+    def has_profile(self):
+        return self.employee is not None
+
+    def allows_method(self, method):
+        return self.allowed_methods is ALL_METHODS or method in self.allowed_methods
+
+
+def _load_employee(user):
+    """Профиль сотрудника из кеша или одним запросом из БД"""
+    cache = shared_cache()
+    key = cache_key(user.pk)
+    cached = cache.get(key) if cache is not None else None
+    if cached is None:
+        employee = Employee.objects.filter(user_id=user.pk).first()
+        if cache is not None:
+            # False - отметка "профиля нет", чтобы не отличать ее от промаха кеша
+            timeout = getattr(settings, "ACCESS_CONTEXT_CACHE_TIMEOUT", DEFAULT_CACHE_TIMEOUT)
+            cache.set(key, employee or False, timeout)
+    else:
+        employee = cached or None
+
+    if employee is not None:
+        # Связываем профиль с уже загруженным пользователем, чтобы не запрашивать его повторно
+        employee.user = user
+    return employee
+
+
+def get_access_context(request, user=None):
+    """
+    Контекст авторизации для запроса. Сохраняется на исходном HttpRequest,
+    поэтому общий для DRF Request и middleware. user передается явно из
+    аутентификации, где request.user еще не установлен.
+    """
+    if user is None:
+        user = request.user
+    if not user or not user.is_authenticated:
+        return None
+
+    http_request = getattr(request, "_request", request)
+    context = getattr(http_request, REQUEST_ATTRIBUTE, None)
+    if context is None or context.user_id != user.pk:
+        context = AccessContext(user.pk, _load_employee(user))
+        setattr(http_request, REQUEST_ATTRIBUTE, context)
+    return context
+
+
+def invalidate_access_context(user_id):
+    cache = shared_cache()
+    if cache is not None:
+        cache.delete(cache_key(user_id))
+
+
+@receiver(post_save, sender=Employee, dispatch_uid="network_access_employee_saved")
+@receiver(post_delete, sender=Employee, dispatch_uid="network_access_employee_deleted")
+def invalidate_on_employee_change(sender, instance, **kwargs):
+    invalidate_access_context(instance.user_id)
+
+
+@receiver(post_save, sender=User, dispatch_uid="network_access_user_saved")
+@receiver(post_delete, sender=User, dispatch_uid="network_access_user_deleted")
+def invalidate_on_user_change(sender, instance, **kwargs):
+    invalidate_access_context(instance.pk)
@@ -0,0 +1,115 @@
+"""
+Отложенная запись активности сотрудников (Employee.last_login_date).
+
+Аутентификация и проверка прав вызываются на каждый API-запрос, поэтому
+синхронный UPDATE на каждый вызов создает лишнюю нагрузку на таблицу
+сотрудников. Трекер копит отметки в памяти процесса, а фоновый поток
+записывает их пачкой раз в EMPLOYEE_LAST_SEEN_FLUSH_INTERVAL секунд, в том
+числе когда процесс после всплеска запросов простаивает. Гарантия точности:
+сохраненная дата отстает от фактической не больше чем на интервал; при
+аварийном завершении процесса (SIGKILL) теряются отметки не более чем за
+один интервал, при обычном завершении буфер сбрасывается. Запрос сам в БД
+не пишет, поэтому ошибка записи не влияет на аутентификацию.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, DateTimeField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+logger = logging.getLogger("network.activity")
+
+DEFAULT_FLUSH_INTERVAL = 60
+
+
+class LastSeenTracker:
+    """Буфер отметок активности сотрудников с пакетной записью из фонового потока"""
+
+    def __init__(self, flush_interval=None):
+        self._flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is not None:
+            return timedelta(seconds=self._flush_interval)
+        return timedelta(seconds=getattr(settings, "EMPLOYEE_LAST_SEEN_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL))
+
+    def touch(self, employee):
+        """Отмечает активность сотрудника; запись в БД выполняет фоновый поток"""
+        now = timezone.now()
+
+        # Сохраненное значение и так в пределах гарантии точности - писать нечего
+        if employee.last_login_date and now - employee.last_login_date < self.flush_interval:
+            return
+
+        employee.last_login_date = now
+        with self._lock:
+            self._pending[employee.pk] = now
+            if self._flusher is None:
+                # Поток запускается при первой отметке (не при импорте: процесс может быть форкнут)
+                self._flusher = threading.Thread(target=self._run, name="last-seen-flush", daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        """Фоновый поток: запись раз в интервал, пока есть отметки"""
+        while True:
+            time.sleep(self.flush_interval.total_seconds())
+            with self._lock:
+                if not self._pending:
+                    self._flusher = None
+                    return
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Не удалось записать отметки активности сотрудников")
+            finally:
+                connection.close()  # Соединение потока не держится между записями
+
+    def flush(self):
+        """Записывает накопленные отметки одним UPDATE (при ошибке отметки возвращаются в буфер)"""
+        from .models import Employee
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return 0
+
+        # GREATEST не дает перезаписать более свежую отметку другого процесса
+        seen_at = Case(
+            *[When(pk=pk, then=Value(timestamp)) for pk, timestamp in pending.items()],
+            output_field=DateTimeField(),
+        )
+        try:
+            return Employee.objects.filter(pk__in=pending).update(last_login_date=Greatest("last_login_date", seen_at))
+        except Exception:
+            with self._lock:
+                for pk, timestamp in pending.items():
+                    self._pending[pk] = max(timestamp, self._pending.get(pk, timestamp))
+            raise
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+
+last_seen = LastSeenTracker()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        last_seen.flush()
+    except Exception:
+        # При завершении процесса БД может быть уже недоступна
+        pass
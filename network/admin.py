@@ -1,10 +1,19 @@
+from django import forms
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+from django.urls import path, reverse
 from django.utils.html import format_html
 
-from .models import NetworkNode, Product
+from .hierarchy import validate_supplier
+from .jobs import async_threshold, enqueue
+from .models import Job, NetworkNode, Product, ProfiledRequest
+from .profiling import ARTIFACT_FORMATS, render_artifact
+from .search import RankedSearchAdminMixin
+from .statistics import clear_debt as clear_nodes_debt
 
 
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(RankedSearchAdminMixin, admin.ModelAdmin):
     list_display = ("name", "model", "release_date")
     list_filter = ("release_date",)
     search_fields = ("name", "model", "description")
@@ -24,7 +33,24 @@ class ProductAdmin(admin.ModelAdmin):
     is_new_display.short_description = "Новый продукт"
 
 
-class NetworkNodeAdmin(admin.ModelAdmin):
+class NetworkNodeAdminForm(forms.ModelForm):
+    """Форма звена сети с проверкой цикла до сохранения"""
+
+    class Meta:
+        model = NetworkNode
+        fields = "__all__"
+
+    def clean_supplier(self):
+        supplier = self.cleaned_data.get("supplier")
+        try:
+            validate_supplier(self.instance.pk, supplier.pk if supplier else None)
+        except forms.ValidationError as exc:
+            raise forms.ValidationError(exc.message_dict["supplier"])
+        return supplier
+
+
+class NetworkNodeAdmin(RankedSearchAdminMixin, admin.ModelAdmin):
+    form = NetworkNodeAdminForm
     list_display = (
         "name",
         "get_node_type_display",
@@ -34,7 +60,7 @@ class NetworkNodeAdmin(admin.ModelAdmin):
         "debt_display",
         "created_at_display",
     )
-    list_filter = ("node_type", "city", "country", "created_at")
+    list_filter = ("node_type", "level", "city", "country", "created_at")
     search_fields = ("name", "email", "phone", "country", "city", "street")
     readonly_fields = ("level_display", "created_at", "updated_at", "full_address_display")
     fieldsets = (
@@ -54,6 +80,7 @@ class NetworkNodeAdmin(admin.ModelAdmin):
         return obj.level
 
     level_display.short_description = "Уровень"
+    level_display.admin_order_field = "level"
 
     def supplier_info(self, obj):
         if obj.supplier:
@@ -87,7 +114,12 @@ class NetworkNodeAdmin(admin.ModelAdmin):
 
     def clear_debt(self, request, queryset):
         """Действие для очистки задолженности"""
-        updated = queryset.update(debt=0)
+        ids = list(queryset.values_list("pk", flat=True))
+        if len(ids) > async_threshold():
+            job = enqueue(Job.Kind.CLEAR_DEBT, {"ids": ids}, user=request.user, total=len(ids))
+            self.message_user(request, f"Очистка задолженности поставлена в очередь: задача #{job.pk}.")
+            return
+        updated = len(clear_nodes_debt(ids=ids))
         self.message_user(request, f"Задолженность очищена для {updated} объектов.")
 
     clear_debt.short_description = "Очистить задолженность"
@@ -98,5 +130,84 @@ class NetworkNodeAdmin(admin.ModelAdmin):
         return queryset.select_related("supplier")
 
 
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "processed", "total", "created_by", "created_at", "finished_at")
+    list_filter = ("kind", "status")
+    # created_by допускает NULL, такие связи автоматический select_related() списка не загружает
+    list_select_related = ("created_by",)
+    readonly_fields = [field.name for field in Job._meta.fields]
+
+    def has_add_permission(self, request):
+        # Задачи создаются массовыми операциями, а не вручную
+        return False
+
+
+class ProfiledRequestAdmin(admin.ModelAdmin):
+    list_display = (
+        "created_at",
+        "method",
+        "path",
+        "view_name",
+        "profiler",
+        "status_code",
+        "duration_ms",
+        "samples",
+        "created_by",
+        "downloads",
+    )
+    list_filter = ("profiler", "view_name")
+    list_select_related = ("created_by",)
+    search_fields = ("path", "view_name")
+    exclude = ("artifact",)
+    readonly_fields = [field.name for field in ProfiledRequest._meta.fields if field.name != "artifact"]
+    readonly_fields.append("downloads")
+
+    def get_queryset(self, request):
+        # Профили бывают большими, а списку они не нужны
+        return super().get_queryset(request).defer("artifact")
+
+    def has_add_permission(self, request):
+        # Профили создаются заголовком X-Profile (network/profiling.py)
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        download = path(
+            "<path:object_id>/download/<str:artifact_format>/",
+            self.admin_site.admin_view(self.download),
+            name="network_profiledrequest_download",
+        )
+        return [download, *super().get_urls()]
+
+    def downloads(self, obj):
+        links = [
+            format_html(
+                '<a href="{}">{}</a>',
+                reverse("admin:network_profiledrequest_download", args=[obj.pk, artifact_format]),
+                artifact_format,
+            )
+            for artifact_format in ARTIFACT_FORMATS[obj.profiler]
+        ]
+        return format_html(" | ".join(["{}"] * len(links)), *links)
+
+    downloads.short_description = "Скачать"
+
+    def download(self, request, object_id, artifact_format):
+        profile = self.get_object(request, object_id)
+        # admin_view проверяет только is_staff; право просмотра - как в change_view
+        if not self.has_view_permission(request, profile):
+            raise PermissionDenied
+        if profile is None or artifact_format not in ARTIFACT_FORMATS[profile.profiler]:
+            raise Http404
+        content, content_type, filename = render_artifact(profile, artifact_format)
+        response = HttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
 admin.site.register(Product, ProductAdmin)
 admin.site.register(NetworkNode, NetworkNodeAdmin)
+admin.site.register(Job, JobAdmin)
+admin.site.register(ProfiledRequest, ProfiledRequestAdmin)
@@ -7,4 +7,5 @@ class NetworkConfig(AppConfig):
     verbose_name = "Сеть продаж электроники"
 
     def ready(self):
-        pass
+        # Регистрируем обработчики сброса кеша контекста авторизации
+        from . import access  # noqa: F401
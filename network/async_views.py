@@ -0,0 +1,134 @@
+"""
+Асинхронные представления для чтения звеньев сети (под ASGI).
+
+DRF выполняет представления синхронно, поэтому медленный список или сводка
+занимают поток воркера на все время запроса. Здесь те же эндпоинты чтения
+(список, звено, by_country, suppliers_summary) реализованы как async-
+представления: запросы к БД выполняются через async ORM, а поток
+освобождается на время ожидания.
+
+Аутентификация, права, фильтры, поиск, сортировка, пагинация и
+сериализаторы берутся из NetworkNodeViewSet, поэтому ответы и коды ошибок
+совпадают с синхронным API. Проверка прав (сессия, профиль сотрудника)
+выполняется синхронным кодом DRF одним переходом в поток.
+"""
+
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from rest_framework import generics, status
+from rest_framework.response import Response
+
+from .fieldsets import SparseFieldsetViewMixin
+from .instrumentation import PhaseTimingViewMixin
+from .models import NetworkNode
+from .serializers import NetworkNodeSerializer
+from .statistics import asummary as statistics_asummary
+from .views import SUMMARY_FILTERS_AVAILABLE, NetworkNodeViewSet
+
+
+class AsyncGenericAPIView(PhaseTimingViewMixin, generics.GenericAPIView):
+    """
+    GenericAPIView с асинхронными обработчиками (async def get).
+    Django определяет представление как асинхронное по обработчикам методов.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # Аутентификация, права и ограничения частоты - те же классы DRF
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            method = request.method.lower()
+            handler = getattr(self, method, None) if method in self.http_method_names else None
+            response = (handler or self.http_method_not_allowed)(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def afilter_queryset(self, queryset):
+        # Фильтры строят запрос лениво, но могут обращаться к БД (проверка pg_trgm в поиске)
+        return await sync_to_async(self.filter_queryset)(queryset)
+
+    async def alist_response(self, queryset):
+        """Ответ списка: страница, если клиент включил пагинацию, иначе весь список"""
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer([obj async for obj in queryset], many=True).data)
+
+
+class AsyncNetworkNodeReadView(SparseFieldsetViewMixin, AsyncGenericAPIView):
+    """Общие настройки асинхронного чтения звеньев - как у NetworkNodeViewSet"""
+
+    authentication_classes = NetworkNodeViewSet.authentication_classes
+    permission_classes = NetworkNodeViewSet.permission_classes
+    pagination_class = NetworkNodeViewSet.pagination_class
+    filter_backends = NetworkNodeViewSet.filter_backends
+    filterset_class = NetworkNodeViewSet.filterset_class
+    search_fields = NetworkNodeViewSet.search_fields
+    trigram_search_fields = NetworkNodeViewSet.trigram_search_fields
+    ordering_fields = NetworkNodeViewSet.ordering_fields
+    serializer_class = NetworkNodeSerializer
+    fieldset_actions = NetworkNodeViewSet.fieldset_actions
+
+    def get_queryset(self):
+        # Связи, попадающие в ответ, загружаются заранее: ленивые запросы в асинхронном коде запрещены
+        return self.get_fieldset_queryset(NetworkNode.objects.all())
+
+
+class AsyncNetworkNodeListView(AsyncNetworkNodeReadView):
+    """GET /api/async/network-nodes/"""
+
+    action = "list"
+
+    async def get(self, request):
+        return await self.alist_response(await self.afilter_queryset(self.get_queryset()))
+
+
+class AsyncNetworkNodeDetailView(AsyncNetworkNodeReadView):
+    """GET /api/async/network-nodes/{id}/"""
+
+    action = "retrieve"
+
+    async def get(self, request, pk):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        try:
+            node = await queryset.aget(pk=pk)
+        except NetworkNode.DoesNotExist:
+            raise Http404(f"No {NetworkNode._meta.object_name} matches the given query.")
+        self.check_object_permissions(request, node)
+        return Response(self.get_serializer(node).data)
+
+
+class AsyncNetworkNodeByCountryView(AsyncNetworkNodeReadView):
+    """GET /api/async/network-nodes/by_country/?country=..."""
+
+    action = "by_country"
+
+    async def get(self, request):
+        country = request.query_params.get("country", None)
+        if not country:
+            return Response({"error": "Параметр country обязателен"}, status=status.HTTP_400_BAD_REQUEST)
+        return await self.alist_response(self.get_queryset().filter(country__iexact=country))
+
+
+class AsyncSuppliersSummaryView(AsyncNetworkNodeReadView):
+    """GET /api/async/network-nodes/suppliers_summary/"""
+
+    action = "suppliers_summary"
+
+    async def get(self, request):
+        stats, countries = await statistics_asummary()
+        return Response({"statistics": stats, "by_country": countries, "filters_available": SUMMARY_FILTERS_AVAILABLE})
@@ -1,7 +1,8 @@
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
-from .models import Employee
+from .access import get_access_context
+from .activity import last_seen
 
 
 class ActiveEmployeeAuthentication(SessionAuthentication):
@@ -16,22 +17,20 @@ class ActiveEmployeeAuthentication(SessionAuthentication):
         if user_auth_tuple is not None:
             user, auth = user_auth_tuple
 
-            # Проверяем, активен ли сотрудник
-            try:
-                employee = user.employee_profile
-                if not employee.is_active:
-                    raise AuthenticationFailed("Ваш аккаунт сотрудника деактивирован.")
-
-                # Обновляем дату последнего входа
-                employee.update_last_login()
-
-            except Employee.DoesNotExist:
-                # Если у пользователя нет профиля сотрудника
+            # Контекст авторизации загружается один раз и переиспользуется в permissions
+            context = get_access_context(request, user)
+            if not context.has_profile:
+                # Суперпользователям разрешаем доступ без профиля
                 if user.is_superuser:
-                    # Суперпользователям разрешаем доступ без профиля
                     return user_auth_tuple
                 raise AuthenticationFailed("Профиль сотрудника не найден.")
 
+            if not context.is_active:
+                raise AuthenticationFailed("Ваш аккаунт сотрудника деактивирован.")
+
+            # Отмечаем активность (запись в БД выполняется отложенно)
+            last_seen.touch(context.employee)
+
             return user_auth_tuple
 
         return None
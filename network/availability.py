@@ -0,0 +1,111 @@
+"""
+Матрица наличия продуктов в звеньях сети (звено x продукт).
+
+Матрица строится одним проходом по промежуточной таблице NetworkNode.products,
+отсортированной по (networknode_id, product_id): столбцы - продукты по
+возрастанию id, строки - звенья по возрастанию id. Каждая строка
+передается компактно:
+
+- bitset - упакованные биты в base64: бит j (старший бит первого байта - j=0)
+  означает наличие продукта products[j]; раскладывается, например,
+  numpy.unpackbits(..., bitorder="big");
+- runs - отрезки подряд идущих столбцов [начало, длина].
+
+Фильтры "есть все / хотя бы один из продуктов" выполняются подзапросами к
+той же таблице по индексу product_id.
+"""
+
+import base64
+
+from django.db.models import Count, Q
+
+from .hierarchy import child_path
+from .models import NetworkNode, Product
+
+MATRIX_ENCODINGS = ("bitset", "runs")
+
+
+def _links():
+    return NetworkNode.products.through.objects
+
+
+def nodes_with_any_products(queryset, product_ids):
+    """Звенья, у которых есть хотя бы один из продуктов"""
+    return queryset.filter(pk__in=_links().filter(product_id__in=product_ids).values("networknode_id"))
+
+
+def nodes_with_all_products(queryset, product_ids):
+    """Звенья, у которых есть все перечисленные продукты"""
+    product_ids = set(product_ids)
+    carriers = (
+        _links()
+        .filter(product_id__in=product_ids)
+        .values("networknode_id")
+        .annotate(found=Count("product_id"))
+        .filter(found=len(product_ids))
+        .values("networknode_id")
+    )
+    return queryset.filter(pk__in=carriers)
+
+
+def subtree_nodes(queryset, node_id):
+    """Звено и все звенья, которые оно снабжает (индексный запрос по path)"""
+    path = NetworkNode.objects.filter(pk=node_id).values_list("path", flat=True).first()
+    if path is None:
+        return queryset.none()
+    return queryset.filter(Q(pk=node_id) | Q(path__startswith=child_path(path, node_id)))
+
+
+def encode_bitset(columns, width):
+    """Индексы столбцов -> base64 упакованных битов (старший бит первым)"""
+    row = bytearray((width + 7) // 8)
+    for column in columns:
+        row[column >> 3] |= 0x80 >> (column & 7)
+    return base64.b64encode(row).decode("ascii")
+
+
+def encode_runs(columns):
+    """Возрастающие индексы столбцов -> [[начало, длина], ...]"""
+    runs = []
+    for column in columns:
+        if runs and runs[-1][0] + runs[-1][1] == column:
+            runs[-1][1] += 1
+        else:
+            runs.append([column, 1])
+    return runs
+
+
+def availability_matrix(queryset, product_ids=None, encoding="bitset"):
+    """
+    Матрица наличия для звеньев queryset: 3 запроса (звенья, продукты,
+    промежуточная таблица) независимо от размера матрицы.
+    product_ids ограничивает столбцы перечисленными продуктами.
+    """
+    node_ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+    products = Product.objects.order_by("pk")
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    product_list = list(products.values_list("pk", flat=True))
+    column_of = {product_id: index for index, product_id in enumerate(product_list)}
+
+    # Запросы выполняются без общего снимка: продукт, созданный и привязанный после чтения
+    # столбцов, не должен попасть в связи, поэтому связи всегда ограничены прочитанными продуктами
+    links = _links().filter(networknode_id__in=queryset.values("pk"), product_id__in=product_list)
+
+    columns = {}
+    total = 0
+    for node_id, product_id in links.order_by("networknode_id", "product_id").values_list(
+        "networknode_id", "product_id"
+    ):
+        columns.setdefault(node_id, []).append(column_of[product_id])
+        total += 1
+
+    if encoding == "runs":
+        rows = [encode_runs(columns.get(node_id, ())) for node_id in node_ids]
+    else:
+        rows = [encode_bitset(columns.get(node_id, ()), len(product_list)) for node_id in node_ids]
+
+    matrix = {"encoding": encoding, "nodes": node_ids, "products": product_list, "links": total, "rows": rows}
+    if encoding == "bitset":
+        matrix["row_bytes"] = (len(product_list) + 7) // 8
+    return matrix
@@ -0,0 +1,8 @@
+"""
+Микробенчмарки горячих участков: сериализация звеньев, фильтры списка,
+проверки иерархии (clean, циклы, пересчет level/path) и классы прав.
+
+Наборы данных создаются генератором сети (network.generator) во временной
+транзакции и удаляются после замеров. Результаты сравниваются с базовыми
+(baseline.json в этом пакете). Запуск: python manage.py run_benchmarks.
+"""
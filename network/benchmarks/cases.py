@@ -0,0 +1,157 @@
+"""
+Наборы данных и сценарии бенчмарков.
+
+Сценарий - функция, которая получает BenchmarkContext (данные текущего
+набора) и возвращает замеряемую функцию без аргументов. Подготовка (выборка
+объектов, запросы для сериализации) в замер не входит.
+"""
+
+from django.contrib.auth.models import User
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from network.filters import NetworkNodeFilter
+from network.hierarchy import creates_cycle, rebuild_hierarchy
+from network.models import Employee, NetworkNode
+from network.permissions import DepartmentPermission, IsActiveEmployee
+from network.serializers import NetworkNodeSerializer
+
+# Параметры network.generator.NetworkGenerator: размер и форма сети
+DATASETS = {
+    "1k": {"factories": 10, "depth": 3, "fan_out": (3, 6), "max_nodes": 1000},
+    "10k": {"factories": 20, "depth": 4, "fan_out": (4, 8), "max_nodes": 10000},
+    "10k-deep": {"factories": 2, "depth": 12, "fan_out": (2, 3), "entrepreneur_share": 0.1, "max_nodes": 10000},
+}
+
+# Имя сценария -> (функция, число вызовов в одном замере)
+CASES = {}
+
+
+def case(name, number=1):
+    def register(func):
+        CASES[name] = (func, number)
+        return func
+
+    return register
+
+
+class BenchmarkContext:
+    """Объекты набора данных, общие для сценариев"""
+
+    def __init__(self, name):
+        self.name = name
+        nodes = NetworkNode.objects.order_by("pk")
+        self.size = nodes.count()
+        self.factory_ids = list(nodes.filter(level=0).values_list("pk", flat=True))
+        # Самые глубокие звенья: на них проверки иерархии самые дорогие
+        self.deep_ids = list(nodes.order_by("-level", "pk").values_list("pk", flat=True)[:100])
+        self.depth = nodes.order_by("-level").values_list("level", flat=True).first()
+        self.popular_products = list(
+            NetworkNode.products.through.objects.values_list("product_id", flat=True).distinct()[:2]
+        )
+
+        self.user = User.objects.create_user(username=f"benchmark-{name}", is_staff=True)
+        Employee.objects.create(user=self.user, department="Продажи", position="Менеджер", is_active=True)
+
+
+@case("serialize_nodes")
+def serialize_nodes(context):
+    """NetworkNodeSerializer для всех звеньев набора (поставщик и продукты загружены заранее)"""
+    nodes = list(NetworkNodeSerializer.shape_queryset(NetworkNode.objects.all()))
+    return lambda: NetworkNodeSerializer(nodes, many=True).data
+
+
+@case("model_clean", number=5)
+def model_clean(context):
+    """NetworkNode.clean() (проверка цикла) для 100 самых глубоких звеньев"""
+    nodes = list(NetworkNode.objects.filter(pk__in=context.deep_ids))
+
+    def run():
+        for node in nodes:
+            node.clean()
+
+    return run
+
+
+@case("cycle_check", number=5)
+def cycle_check(context):
+    """creates_cycle: завод -> глубокое звено (цикл есть) и глубокое -> завод (цикла нет)"""
+    pairs = [(context.factory_ids[0], deep_id) for deep_id in context.deep_ids]
+    pairs += [(deep_id, context.factory_ids[-1]) for deep_id in context.deep_ids]
+
+    def run():
+        for node_pk, supplier_pk in pairs:
+            creates_cycle(node_pk, supplier_pk)
+
+    return run
+
+
+@case("level_move_subtree", number=3)
+def level_move_subtree(context):
+    """Смена поставщика звена первого уровня и обратно: save() пересчитывает path и level поддерева"""
+    node = NetworkNode.objects.filter(level=1, supplier_id=context.factory_ids[0]).first()
+    original, other = node.supplier_id, context.factory_ids[-1]
+
+    def run():
+        for supplier_id in (other, original):
+            node.supplier_id = supplier_id
+            node.save(update_fields=["supplier"])
+
+    return run
+
+
+@case("level_rebuild")
+def level_rebuild(context):
+    """Полный пересчет level и path (rebuild_hierarchy)"""
+    return lambda: rebuild_hierarchy(NetworkNode)
+
+
+def evaluate_filter(params):
+    """Замеряемая функция: NetworkNodeFilter с параметрами и id отобранных звеньев"""
+
+    def run():
+        filterset = NetworkNodeFilter(data=params, queryset=NetworkNode.objects.all())
+        return list(filterset.qs.values_list("pk", flat=True))
+
+    return run
+
+
+@case("filter_country_debt", number=3)
+def filter_country_debt(context):
+    """Фильтры country и debt_gt"""
+    return evaluate_filter({"country": "Россия", "debt_gt": "20000"})
+
+
+@case("filter_level_type", number=3)
+def filter_level_type(context):
+    """Фильтры level_gte, node_type и has_supplier"""
+    return evaluate_filter({"level_gte": "2", "node_type": "retail_network", "has_supplier": "true"})
+
+
+@case("filter_subtree", number=3)
+def filter_subtree(context):
+    """Фильтр subtree: поддерево первого завода"""
+    return evaluate_filter({"subtree": str(context.factory_ids[0])})
+
+
+@case("filter_products_all", number=3)
+def filter_products_all(context):
+    """Фильтр products_all по двум продуктам"""
+    return evaluate_filter({"products_all": ",".join(map(str, context.popular_products))})
+
+
+@case("permissions", number=1000)
+def permissions(context):
+    """
+    IsActiveEmployee + DepartmentPermission для нового запроса сотрудника: профиль из общего кеша
+    или, с кешем в памяти процесса (по умолчанию), одним запросом к БД
+    """
+    factory = RequestFactory()
+    checks = (IsActiveEmployee(), DepartmentPermission())
+
+    def run():
+        request = Request(factory.get("/api/network-nodes/"))
+        request.user = context.user
+        return all(check.has_permission(request, None) for check in checks)
+
+    return run
@@ -0,0 +1,142 @@
+"""
+Запуск сценариев, сохранение и сравнение результатов.
+
+Для каждого сценария берется лучшее из repeat измерений (время одного
+вызова, мс) - оно меньше всего зависит от фоновой нагрузки - и число
+SQL-запросов одного вызова. Замедление сверх порога и рост числа запросов
+считаются регрессией.
+"""
+
+import json
+import platform
+import statistics
+import time
+from pathlib import Path
+
+import django
+from django.db import connection, transaction
+
+from network.generator import NetworkGenerator
+from network.models import NetworkNode, NetworkStatistics, Product
+
+from .cases import CASES, DATASETS, BenchmarkContext
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+DEFAULT_THRESHOLD = 0.25  # Допустимое замедление относительно базовых результатов (25%)
+
+REGRESSION_STATUSES = ("slower", "queries")
+
+
+def measure(func, number, repeat):
+    """Время одного вызова func (лучшее и медиана по repeat замерам, мс) и число запросов"""
+    func()  # Прогрев: кеши, подготовленные выражения
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number * 1000)
+    return {
+        "ms": round(min(timings), 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "queries": count_queries(func),
+    }
+
+
+def count_queries(func):
+    """Число SQL-запросов одного вызова (без журнала запросов: он ограничен 9000 записей)"""
+    executed = []
+
+    def counter(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(counter):
+        func()
+    return len(executed)
+
+
+def run_suite(datasets=None, cases=None, repeat=5, seed=0, on_result=None):
+    """
+    Прогон сценариев cases на наборах datasets (None - все). Каждый набор
+    генерируется во временной транзакции, которая откатывается после замеров.
+    on_result(набор, сценарий, результат) вызывается после каждого сценария.
+    """
+    results = {}
+    for name in datasets or DATASETS:
+        analyze_tables(vacuum=True)
+        with transaction.atomic():
+            NetworkGenerator(label=f"benchmark-{name}", seed=seed, **DATASETS[name]).run()
+            analyze_tables()
+            context = BenchmarkContext(name)
+            results[name] = {}
+            for case_name in cases or CASES:
+                setup, number = CASES[case_name]
+                results[name][case_name] = measure(setup(context), number, repeat)
+                if on_result is not None:
+                    on_result(name, case_name, results[name][case_name])
+            transaction.set_rollback(True)
+    return results
+
+
+def analyze_tables(vacuum=False):
+    """
+    Статистика планировщика по текущим данным. VACUUM убирает строки откаченных
+    наборов предыдущих прогонов: иначе замеры зависели бы от истории запусков.
+    VACUUM невозможен внутри транзакции (в том числе в тестах) и тогда пропускается.
+    """
+    if connection.vendor != "postgresql" or (vacuum and connection.in_atomic_block):
+        return
+    command = "VACUUM ANALYZE" if vacuum else "ANALYZE"
+    with connection.cursor() as cursor:
+        for model in (NetworkNode, NetworkNode.products.through, Product, NetworkStatistics):
+            cursor.execute(f"{command} {connection.ops.quote_name(model._meta.db_table)}")
+
+
+def environment():
+    """Условия замера (сохраняются вместе с базовыми результатами)"""
+    return {
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": f"{connection.vendor} {connection.cursor().connection.server_version}",
+        "machine": platform.machine(),
+    }
+
+
+def save_baseline(results, path=BASELINE_PATH, repeat=None):
+    data = {"environment": environment(), "repeat": repeat, "results": results}
+    Path(path).write_text(json.dumps(data, ensure_ascii=False, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def load_baseline(path=BASELINE_PATH):
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Сравнение с базовыми результатами: список строк
+    (набор, сценарий, мс, базовые мс или None, отношение или None, статус).
+    Статусы: ok, slower, faster, queries (выросло число запросов), new (нет в базовых).
+    """
+    rows = []
+    for dataset, cases in results.items():
+        for case_name, current in cases.items():
+            base = (baseline or {}).get("results", {}).get(dataset, {}).get(case_name)
+            if base is None:
+                rows.append((dataset, case_name, current["ms"], None, None, "new"))
+                continue
+            ratio = current["ms"] / base["ms"] if base["ms"] else None
+            if current["queries"] > base["queries"]:
+                status = "queries"
+            elif ratio is not None and ratio > 1 + threshold:
+                status = "slower"
+            elif ratio is not None and ratio < 1 - threshold:
+                status = "faster"
+            else:
+                status = "ok"
+            rows.append((dataset, case_name, current["ms"], base["ms"], ratio, status))
+    return rows
@@ -0,0 +1,96 @@
+"""
+Потоковая выгрузка звеньев сети в NDJSON и CSV.
+
+Строки читаются серверным курсором порциями по EXPORT_CHUNK_SIZE, продукты
+подгружаются одним запросом к промежуточной таблице на порцию, и каждая
+строка сразу отдается клиенту. Память воркера не зависит от размера таблицы.
+"""
+
+import csv
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from .models import NetworkNode
+
+DEFAULT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = (
+    "id",
+    "name",
+    "node_type",
+    "supplier_id",
+    "supplier_name",
+    "level",
+    "email",
+    "phone",
+    "country",
+    "city",
+    "street",
+    "house_number",
+    "postal_code",
+    "debt",
+    "created_at",
+    "updated_at",
+)
+
+EXPORT_COLUMNS = EXPORT_FIELDS + ("product_ids",)
+
+
+def iter_export_rows(queryset, chunk_size=None):
+    """Строки выгрузки (словари) без N+1: 1 курсор + 1 запрос продуктов на порцию"""
+    chunk_size = chunk_size or getattr(settings, "EXPORT_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+    rows = queryset.annotate(supplier_name=F("supplier__name")).values_list(*EXPORT_FIELDS).iterator(chunk_size)
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _with_products(chunk)
+            chunk = []
+    if chunk:
+        yield from _with_products(chunk)
+
+
+def _with_products(chunk):
+    products = {}
+    through = NetworkNode.products.through.objects.filter(networknode_id__in=[row[0] for row in chunk])
+    for node_id, product_id in through.order_by("networknode_id", "product_id").values_list(
+        "networknode_id", "product_id"
+    ):
+        products.setdefault(node_id, []).append(product_id)
+
+    for row in chunk:
+        record = dict(zip(EXPORT_FIELDS, row))
+        record["product_ids"] = products.get(row[0], [])
+        yield record
+
+
+def stream_ndjson(rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(row) + "\n"
+
+
+class _Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        row["product_ids"] = ";".join(str(product_id) for product_id in row["product_ids"])
+        row["created_at"] = row["created_at"].isoformat()
+        row["updated_at"] = row["updated_at"].isoformat()
+        yield writer.writerow([row[column] for column in EXPORT_COLUMNS])
+
+
+EXPORT_FORMATS = {
+    "ndjson": (stream_ndjson, "application/x-ndjson"),
+    "csv": (stream_csv, "text/csv; charset=utf-8"),
+}
@@ -0,0 +1,259 @@
+"""
+Быстрая сериализация больших списков.
+
+ModelSerializer на каждую строку создает экземпляр модели и обходит все
+поля сериализатора. Для списков это основная нагрузка на CPU, поэтому
+действие list читает строки через values() и превращает их в словари
+заранее построенным отображением (RowMapper): для каждого поля один раз
+определяется столбец values() и функция преобразования.
+
+Значения преобразуются теми же полями DRF (to_representation), что и в
+сериализаторе, а порядок ключей повторяет порядок полей, поэтому JSON
+совпадает с обычным ответом байт в байт. Рендерится ответ тем же
+JSONRenderer: в данных только примитивы, и json кодирует их без обращений
+к JSONEncoder.default. Если в сериализаторе есть поле, которое отображение
+не умеет строить, используется обычный путь.
+
+Отключается настройкой FAST_LIST_SERIALIZATION = False.
+"""
+
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db.models import F, ManyToManyField
+from django.utils.encoding import force_str
+from rest_framework import relations
+from rest_framework import serializers as drf_serializers
+from rest_framework.response import Response
+
+from .instrumentation import Phase
+
+# Поля, у которых to_representation для значения из БД возвращает его без изменений
+_IDENTITY_FIELDS = (drf_serializers.CharField, drf_serializers.EmailField)
+
+_mappers = {}
+
+# Столбец с id владельца в строках связанных объектов
+OWNER_COLUMN = "_fastpath_owner"
+
+# Значение поля, которого нет в ответе (SkipField в DRF)
+_SKIP = object()
+
+
+class UnsupportedField(Exception):
+    """Поле сериализатора нельзя построить из values()"""
+
+
+def fast_list_enabled():
+    return getattr(settings, "FAST_LIST_SERIALIZATION", True)
+
+
+def _converter(field):
+    if isinstance(field, _IDENTITY_FIELDS):
+        return None
+    return field.to_representation
+
+
+class RowMapper:
+    """
+    Отображение строки values() в словарь ответа для набора полей сериализатора.
+    Связи многие-ко-многим (id и вложенные сериализаторы) загружаются отдельными
+    запросами на всю страницу, как при prefetch_related.
+    """
+
+    def __init__(self, serializer_class, fields=None):
+        serializer = serializer_class(fields=fields) if fields is not None else serializer_class()
+        self.model = serializer.Meta.model
+        self.columns = {self.model._meta.pk.attname}
+        self.steps = []  # (имя поля, функция строка -> значение)
+        self.many = []  # (имя поля, поле ManyToMany, вложенное отображение или None)
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            self.steps.append((name, self.compile(name, field, serializer_class)))
+
+    def compile(self, name, field, serializer_class):
+        model_fields = {model_field.name: model_field for model_field in self.model._meta.get_fields()}
+        attrs = field.source_attrs
+
+        # Вложенный список (products_info) и список id (products)
+        if isinstance(field, (drf_serializers.ListSerializer, relations.ManyRelatedField)):
+            relation = model_fields.get(field.source)
+            if len(attrs) != 1 or not isinstance(relation, ManyToManyField):
+                raise UnsupportedField(name)
+            nested = RowMapper(type(field.child)) if isinstance(field, drf_serializers.ListSerializer) else None
+            if nested is None and not isinstance(field.child_relation, relations.PrimaryKeyRelatedField):
+                raise UnsupportedField(name)
+            self.many.append((name, relation, nested))
+            return None
+
+        # Поле модели (для внешнего ключа - его id)
+        if len(attrs) == 1 and attrs[0] in model_fields and getattr(model_fields[attrs[0]], "concrete", False):
+            model_field = model_fields[attrs[0]]
+            if isinstance(field, relations.PrimaryKeyRelatedField):
+                if field.pk_field is not None:
+                    raise UnsupportedField(name)
+                column, convert = model_field.attname, None
+            elif model_field.is_relation:
+                raise UnsupportedField(name)
+            else:
+                column, convert = model_field.attname, _converter(field)
+            return self.value_step(column, convert)
+
+        # Поле связанной модели: supplier.name, supplier.get_node_type_display
+        if len(attrs) == 2 and attrs[0] in model_fields and model_fields[attrs[0]].many_to_one:
+            relation = model_fields[attrs[0]]
+            attr = attrs[1]
+            if attr.startswith("get_") and attr.endswith("_display"):
+                choices = dict(relation.related_model._meta.get_field(attr[4:-8]).flatchoices)
+                column = f"{attrs[0]}__{attr[4:-8]}"
+                convert = _converter(field)
+                step = self.value_step(column, lambda value: convert_display(value, choices, convert))
+            else:
+                relation.related_model._meta.get_field(attr)
+                step = self.value_step(f"{attrs[0]}__{attr}", _converter(field))
+            return self.null_relation_step(field, relation.attname, step)
+
+        # Свойство модели (full_address): считается по нужным столбцам без экземпляра модели
+        prop = getattr(self.model, attrs[0], None) if len(attrs) == 1 else None
+        columns = getattr(serializer_class, "field_columns", {}).get(name)
+        if isinstance(prop, property) and columns:
+            self.columns.update(columns)
+            convert = _converter(field)
+
+            def step(row, fget=prop.fget, columns=columns, convert=convert):
+                value = fget(SimpleNamespace(**{column: row[column] for column in columns}))
+                if value is None or convert is None:
+                    return value
+                return convert(value)
+
+            return step
+
+        raise UnsupportedField(name)
+
+    def value_step(self, column, convert):
+        self.columns.add(column)
+        if convert is None:
+            return lambda row: row[column]
+
+        def step(row):
+            value = row[column]
+            return None if value is None else convert(value)
+
+        return step
+
+    def null_relation_step(self, field, fk_column, step):
+        """
+        Без связанного объекта (supplier=None) DRF не может прочитать source поля
+        и поступает по настройкам поля: default, null или поле пропускается.
+        """
+        if field.default is not drf_serializers.empty:
+            missing = field.get_default
+        elif field.allow_null:
+            missing = lambda: None  # noqa: E731
+        elif not field.required:
+            missing = lambda: _SKIP  # noqa: E731
+        else:
+            raise UnsupportedField(field.field_name)
+        self.columns.add(fk_column)
+
+        def related_step(row):
+            return missing() if row[fk_column] is None else step(row)
+
+        return related_step
+
+    def map_rows(self, rows):
+        """Строки values() -> список словарей ответа"""
+        pk = self.model._meta.pk.attname
+        ids = [row[pk] for row in rows]
+        # Связи одной таблицы (products и products_info) читаются одним запросом
+        columns = {}
+        for _, relation, nested in self.many:
+            columns.setdefault(relation, {relation.related_model._meta.pk.attname})
+            if nested is not None:
+                columns[relation].update(nested.columns)
+        loaded = {relation: self.load_many(relation, names, ids) for relation, names in columns.items()}
+        related = {name: self.group_many(relation, nested, loaded[relation]) for name, relation, nested in self.many}
+
+        results = []
+        for row in rows:
+            item = {}
+            for name, step in self.steps:
+                value = related[name].get(row[pk], []) if step is None else step(row)
+                if value is not _SKIP:
+                    item[name] = value
+            results.append(item)
+        return results
+
+    def load_many(self, relation, columns, ids):
+        """
+        Связанные объекты страницы одним запросом через таблицу связи, как prefetch_related:
+        строки values() с id владельца, в порядке ordering связанной модели
+        """
+        if not ids:
+            return []
+        owner = relation.related_query_name()
+        return list(
+            relation.related_model.objects.filter(**{f"{owner}__in": ids}).values(*columns, **{OWNER_COLUMN: F(owner)})
+        )
+
+    def group_many(self, relation, nested, rows):
+        """id строки -> список id или вложенных словарей"""
+        related_pk = relation.related_model._meta.pk.attname
+        values = nested.map_rows(rows) if nested is not None else [row[related_pk] for row in rows]
+        grouped = {}
+        for row, value in zip(rows, values):
+            grouped.setdefault(row[OWNER_COLUMN], []).append(value)
+        return grouped
+
+    def ordering_columns(self, ordering):
+        """Столбцы ключа сортировки (нужны курсору), которых нет среди полей ответа"""
+        return [field.lstrip("-") for field in ordering if field.lstrip("-") not in self.columns]
+
+
+def convert_display(value, choices, convert):
+    """Как get_FOO_display(): подпись варианта или само значение"""
+    if value is None:
+        return None
+    label = force_str(choices.get(value, value), strings_only=True)
+    return label if convert is None else convert(label)
+
+
+def get_mapper(serializer_class, fields=None):
+    """Отображение для сериализатора и набора полей (строится один раз) или None"""
+    key = (serializer_class, None if fields is None else frozenset(fields))
+    if key not in _mappers:
+        try:
+            _mappers[key] = RowMapper(serializer_class, fields)
+        except UnsupportedField:
+            _mappers[key] = None
+    return _mappers[key]
+
+
+class FastListMixin:
+    """
+    Действие list через values() и RowMapper. Фильтры, поиск, сортировка,
+    пагинация и ?fields= работают как обычно.
+    """
+
+    def list(self, request, *args, **kwargs):
+        fieldset = self.get_fieldset() if hasattr(self, "get_fieldset") else None
+        mapper = get_mapper(self.get_serializer_class(), fieldset) if fast_list_enabled() else None
+        if mapper is None:
+            return super().list(request, *args, **kwargs)
+
+        # Базовый queryset без select_related/prefetch_related: values() читает связи сам
+        queryset = self.filter_queryset(self.queryset.all())
+        paginator = self.paginator
+        page_queryset = paginator.page_queryset(queryset, request) if paginator is not None else None
+        if page_queryset is None:
+            rows = list(queryset.values(*mapper.columns))
+            with Phase("serialize"):
+                return Response(mapper.map_rows(rows))
+
+        columns = [*mapper.columns, *mapper.ordering_columns(paginator.page_ordering)]
+        rows = paginator.page_results(list(page_queryset.values(*columns)))
+        with Phase("serialize"):
+            data = mapper.map_rows(rows)
+        return paginator.get_paginated_response(data)
@@ -0,0 +1,145 @@
+"""
+Выборочные поля ответа (sparse fieldsets): ?fields= и ?expand=.
+
+Без параметров ответ не меняется. С ?fields=id,name,node_type,debt
+возвращаются только перечисленные поля, а связанные данные (продукты,
+поставщик) добавляются явно через ?expand=products,supplier.
+
+Запрос к БД строится под итоговый набор полей: читаются только нужные
+столбцы (only), JOIN поставщика и запрос продуктов выполняются только
+если соответствующие поля попали в ответ.
+"""
+
+from django.db.models import Prefetch
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def _split(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Сериализатор с ограничиваемым набором полей.
+
+    expandable_fields   - имя расширения (?expand=) -> поля ответа;
+    field_columns       - поле ответа -> столбцы модели, нужные для его значения
+                          (по умолчанию - одноименное поле модели);
+    field_select_related, field_prefetch - поле ответа -> связь для JOIN / отдельного запроса.
+    """
+
+    expandable_fields = {}
+    field_columns = {}
+    field_select_related = {}
+    field_prefetch = {}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in list(self.fields):
+                if name not in fields:
+                    self.fields.pop(name)
+
+    @classmethod
+    def available_fields(cls):
+        if "_available_fields" not in cls.__dict__:
+            cls._available_fields = tuple(cls().fields)
+        return cls._available_fields
+
+    @classmethod
+    def resolve_fieldset(cls, fields, expand):
+        """Итоговый набор полей из ?fields= и ?expand=; неизвестные имена - ошибка 400"""
+        unknown = [name for name in expand if name not in cls.expandable_fields]
+        if unknown:
+            available = ", ".join(cls.expandable_fields) or "нет"
+            message = f"Неизвестные расширения: {', '.join(unknown)}. Доступны: {available}"
+            raise ValidationError({EXPAND_PARAM: message})
+
+        unknown = [name for name in fields if name not in cls.available_fields()]
+        if unknown:
+            available = ", ".join(cls.available_fields())
+            raise ValidationError({FIELDS_PARAM: f"Неизвестные поля: {', '.join(unknown)}. Доступны: {available}"})
+
+        selected = set(fields)
+        for name in expand:
+            selected.update(cls.expandable_fields[name])
+        return selected
+
+    @classmethod
+    def shape_queryset(cls, queryset, fields=None, extra_columns=()):
+        """
+        Подгрузка связей и выбор столбцов под набор полей.
+        fields=None - полный ответ: все связи, все столбцы.
+        extra_columns - столбцы, нужные помимо полей ответа (ключ сортировки для курсора).
+        """
+        names = cls.available_fields() if fields is None else fields
+        select_related = sorted({cls.field_select_related[name] for name in names if name in cls.field_select_related})
+        prefetch = sorted({cls.field_prefetch[name] for name in names if name in cls.field_prefetch})
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        for lookup in prefetch:
+            queryset = queryset.prefetch_related(cls.prefetch_for(lookup, names))
+        if fields is None:
+            return queryset
+
+        model = queryset.model
+        concrete = {field.name for field in model._meta.concrete_fields}
+        columns = {model._meta.pk.name, *extra_columns}
+        for name in names:
+            columns.update(cls.field_columns.get(name, (name,) if name in concrete else ()))
+        return queryset.only(*columns)
+
+    @classmethod
+    def prefetch_for(cls, lookup, names):
+        """Prefetch связи; наследники сужают запрос, если нужны только id"""
+        return Prefetch(lookup)
+
+
+class SparseFieldsetViewMixin:
+    """
+    Представление с параметрами ?fields= и ?expand= для чтения.
+    Сериализатор чтения должен наследовать SparseFieldsetSerializerMixin.
+    """
+
+    fieldset_actions = ("list", "retrieve")
+
+    def get_fieldset(self):
+        """Набор полей ответа или None (полный ответ)"""
+        if not hasattr(self, "_fieldset"):
+            self._fieldset = None
+            serializer_class = self.get_serializer_class()
+            params = self.request.query_params
+            if (
+                self.action in self.fieldset_actions
+                and issubclass(serializer_class, SparseFieldsetSerializerMixin)
+                and (FIELDS_PARAM in params or EXPAND_PARAM in params)
+            ):
+                fields = _split(params.get(FIELDS_PARAM, "")) if FIELDS_PARAM in params else None
+                expand = _split(params.get(EXPAND_PARAM, ""))
+                if fields is not None:
+                    self._fieldset = serializer_class.resolve_fieldset(fields, expand)
+                else:
+                    serializer_class.resolve_fieldset([], expand)  # Только проверка имен
+        return self._fieldset
+
+    def get_serializer(self, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            kwargs.setdefault("fields", fieldset)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_fieldset_queryset(self, queryset):
+        """queryset чтения, построенный под запрошенный набор полей"""
+        if self.action not in self.fieldset_actions:
+            return queryset
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, SparseFieldsetSerializerMixin):
+            return queryset
+        # Поля сортировки нужны для ключа курсора, даже если их нет в ответе
+        ordering_columns = set(getattr(self, "ordering_fields", ()))
+        if self.paginator is not None:
+            ordering_columns.update(field.lstrip("-") for field in getattr(self.paginator, "ordering", ()))
+        return serializer_class.shape_queryset(queryset, self.get_fieldset(), ordering_columns)
@@ -1,7 +1,17 @@
 import django_filters
+from django.db.models import Q
+from django_filters.constants import EMPTY_VALUES
 
+from .availability import (nodes_with_all_products, nodes_with_any_products,
+                           subtree_nodes)
 from .models import NetworkNode
 
+MAX_CLEAR_DEBT_IDS = 100000  # Ограничение размера запроса; внутри очистка идет порциями
+
+
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    """Список чисел через запятую: ?products_all=1,2,3"""
+
 
 class NetworkNodeFilter(django_filters.FilterSet):
     """Фильтр для NetworkNode с возможностью фильтрации по стране"""
@@ -11,7 +21,7 @@ class NetworkNodeFilter(django_filters.FilterSet):
         field_name="country", lookup_expr="iexact", label="Страна"  # Без учета регистра
     )
 
-    # Фильтр по городу
+    # Фильтр по городу (UPPER(city) LIKE использует триграммный индекс, если установлен pg_trgm)
     city = django_filters.CharFilter(field_name="city", lookup_expr="icontains", label="Город")
 
     # Фильтр по типу узла
@@ -25,8 +35,20 @@ class NetworkNodeFilter(django_filters.FilterSet):
 
     debt_lt = django_filters.NumberFilter(field_name="debt", lookup_expr="lt", label="Задолженность меньше чем")
 
-    # Фильтр по уровню иерархии
-    level = django_filters.NumberFilter(method="filter_by_level", label="Уровень иерархии")
+    # Фильтры по уровню иерархии (хранимое индексируемое поле)
+    level = django_filters.NumberFilter(field_name="level", lookup_expr="exact", label="Уровень иерархии")
+
+    level_gte = django_filters.NumberFilter(field_name="level", lookup_expr="gte", label="Уровень не меньше")
+
+    level_lte = django_filters.NumberFilter(field_name="level", lookup_expr="lte", label="Уровень не больше")
+
+    # Поддерево звена (само звено и все, кого оно снабжает)
+    subtree = django_filters.NumberFilter(method="filter_subtree", label="Поддерево звена")
+
+    # Наличие продуктов (подзапросы к промежуточной таблице по индексу product_id)
+    products_all = NumberInFilter(method="filter_products_all", label="Есть все продукты (id через запятую)")
+
+    products_any = NumberInFilter(method="filter_products_any", label="Есть хотя бы один из продуктов")
 
     class Meta:
         model = NetworkNode
@@ -38,11 +60,54 @@ class NetworkNodeFilter(django_filters.FilterSet):
             return queryset.filter(supplier__isnull=False)
         return queryset.filter(supplier__isnull=True)
 
-    def filter_by_level(self, queryset, name, value):
-        """Фильтр по уровню иерархии"""
+    def filter_subtree(self, queryset, name, value):
+        return subtree_nodes(queryset, int(value))
+
+    def filter_products_all(self, queryset, name, value):
+        return nodes_with_all_products(queryset, [int(pk) for pk in value]) if value else queryset
+
+    def filter_products_any(self, queryset, name, value):
+        return nodes_with_any_products(queryset, [int(pk) for pk in value]) if value else queryset
+
+
+def clear_debt_target(data):
+    """
+    Цель массовой очистки задолженности - ровно одно из: ids (список id),
+    filters (параметры NetworkNodeFilter) или subtree (id звена, вместе с поддеревом).
+    Возвращает (аргументы для statistics.clear_debt, текст ошибки).
+    """
+    targets = [key for key in ("ids", "filters", "subtree") if data.get(key) not in (None, "", [], {})]
+    if len(targets) != 1:
+        return None, "Необходимо указать ровно одно из: ids, filters, subtree"
+
+    if targets == ["ids"]:
+        ids = data["ids"]
+        if not isinstance(ids, list) or len(ids) > MAX_CLEAR_DEBT_IDS:
+            return None, f"ids должен быть списком не более чем из {MAX_CLEAR_DEBT_IDS} элементов"
         try:
-            level = int(value)
-            # Фильтруем через Python, так как level - свойство
-            return [obj for obj in queryset if obj.level == level]
-        except ValueError:
-            return queryset
+            return {"ids": [int(pk) for pk in ids]}, None
+        except (TypeError, ValueError):
+            return None, "ids должен содержать целые числа"
+
+    if targets == ["filters"]:
+        filters = data["filters"]
+        if not isinstance(filters, dict):
+            return None, "filters должен быть объектом с параметрами фильтра списка"
+        # FilterSet молча пропускает неизвестные и пустые параметры: опечатка очистила бы всю таблицу
+        unknown = sorted(set(filters) - set(NetworkNodeFilter.base_filters))
+        if unknown:
+            return None, f"Неизвестные фильтры: {', '.join(unknown)}"
+        filterset = NetworkNodeFilter(data=filters, queryset=NetworkNode.objects.all())
+        if not filterset.is_valid():
+            return None, f"Некорректные фильтры: {dict(filterset.errors)}"
+        if all(value in EMPTY_VALUES for value in filterset.form.cleaned_data.values()):
+            return None, "filters должен содержать хотя бы один фильтр с непустым значением"
+        return {"queryset": filterset.qs}, None
+
+    try:
+        node = NetworkNode.objects.filter(pk=int(data["subtree"])).only("pk", "path").first()
+    except (TypeError, ValueError):
+        return None, "subtree должен быть id звена"
+    if node is None:
+        return None, "Звено subtree не найдено"
+    return {"queryset": NetworkNode.objects.filter(Q(pk=node.pk) | Q(path__startswith=node.children_path))}, None
@@ -0,0 +1,309 @@
+"""
+Генератор синтетической сети для нагрузочного тестирования.
+
+Сеть строится по уровням: заводы, затем их потомки и так далее до заданной
+глубины. Число потомков звена, страна и город, задолженность и набор
+продуктов выбираются случайно из заданных распределений. Все случайные
+значения берутся из одного генератора с фиксированным seed в одном и том же
+порядке, поэтому с одинаковыми параметрами на пустой базе получается один и
+тот же набор данных (отличаются только id и время создания).
+
+Звенья вставляются пакетными INSERT (bulk_create) с уже вычисленными level и
+path, связи с продуктами - пакетной вставкой в промежуточную таблицу,
+статистика сети обновляется после каждого пакета. В памяти хранятся только
+текущий пакет и звенья, у которых будут потомки.
+"""
+
+import math
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+
+from .hierarchy import child_path
+from .models import NetworkNode, Product
+from .statistics import record_nodes_created
+
+DEFAULT_BATCH_SIZE = 5000
+
+GEOGRAPHY = {
+    "Россия": ["Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Казань", "Нижний Новгород", "Самара"],
+    "Китай": ["Шэньчжэнь", "Шанхай", "Гуанчжоу", "Пекин", "Ханчжоу"],
+    "Казахстан": ["Алматы", "Астана", "Шымкент", "Караганда"],
+    "Беларусь": ["Минск", "Гомель", "Брест"],
+    "Германия": ["Берлин", "Мюнхен", "Гамбург"],
+}
+
+DEFAULT_COUNTRIES = "Россия:6,Китай:2,Казахстан:1,Беларусь:1"
+
+STREETS = ["Ленина", "Гагарина", "Мира", "Промышленная", "Торговая", "Заводская", "Центральная", "Садовая"]
+
+NAME_PREFIXES = {
+    NetworkNode.NodeType.FACTORY: "Завод",
+    NetworkNode.NodeType.RETAIL_NETWORK: "Розничная сеть",
+    NetworkNode.NodeType.INDIVIDUAL_ENTREPRENEUR: "ИП",
+}
+
+
+def parse_range(value):
+    """Диапазон "2:5" -> (2, 5); "3" -> (3, 3)"""
+    low, _, high = value.partition(":")
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        low = high = -1
+    if low < 0 or high < low:
+        raise ValueError(f"Ожидается диапазон вида 2:5, получено: {value}")
+    return low, high
+
+
+def parse_weights(value):
+    """Веса "Россия:6,Китай:2" -> {страна: вес}; страны должны быть в GEOGRAPHY"""
+    weights = {}
+    for item in value.split(","):
+        country, _, weight = item.strip().partition(":")
+        if country not in GEOGRAPHY:
+            raise ValueError(f"Неизвестная страна: {country}. Доступны: {', '.join(GEOGRAPHY)}")
+        try:
+            weights[country] = float(weight or 1)
+        except ValueError:
+            raise ValueError(f"Некорректный вес страны {country}: {weight}")
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError("Нужна хотя бы одна страна с положительным весом")
+    return weights
+
+
+def parse_debt(value):
+    """
+    Распределение задолженности -> функция rng -> Decimal:
+    zero, uniform:MIN:MAX или lognormal:MU:SIGMA (медиана e^MU).
+    """
+    kind, *params = value.split(":")
+    try:
+        params = [float(param) for param in params]
+    except ValueError:
+        raise ValueError(f"Некорректные параметры распределения: {value}")
+
+    if kind == "zero" and not params:
+        return lambda rng: Decimal("0.00")
+    if kind == "uniform" and len(params) == 2 and 0 <= params[0] <= params[1]:
+        low, high = params
+        return lambda rng: Decimal(f"{rng.uniform(low, high):.2f}")
+    if kind == "lognormal" and len(params) == 2 and params[1] >= 0:
+        mu, sigma = params
+        return lambda rng: Decimal(f"{min(rng.lognormvariate(mu, sigma), 1e12):.2f}")
+    raise ValueError(f"Ожидается zero, uniform:MIN:MAX или lognormal:MU:SIGMA, получено: {value}")
+
+
+class GenerationResult:
+    """Итог генерации: звенья по уровням, продукты и связи с продуктами"""
+
+    def __init__(self):
+        self.levels = []
+        self.products = 0
+        self.links = 0
+
+    @property
+    def nodes(self):
+        return sum(self.levels)
+
+
+class NetworkGenerator:
+    """Генерация сети по уровням с параметрами распределений (см. generate_network)"""
+
+    def __init__(
+        self,
+        factories=10,
+        depth=3,
+        fan_out=(2, 5),
+        countries=DEFAULT_COUNTRIES,
+        locality=0.9,
+        debt="lognormal:10:1.5",
+        products=200,
+        density=0.05,
+        entrepreneur_share=0.5,
+        max_nodes=None,
+        seed=0,
+        label="generated",
+        batch_size=DEFAULT_BATCH_SIZE,
+        on_batch=None,
+    ):
+        self.factories = factories
+        self.depth = depth
+        self.fan_out = fan_out
+        self.countries = parse_weights(countries) if isinstance(countries, str) else countries
+        self.locality = locality
+        self.debt = parse_debt(debt) if isinstance(debt, str) else debt
+        self.product_count = products
+        self.density = density
+        self.entrepreneur_share = entrepreneur_share
+        self.max_nodes = max_nodes
+        self.label = label
+        self.batch_size = batch_size
+        self.on_batch = on_batch  # Вызывается после каждого пакета с результатом на текущий момент
+
+        self.rng = random.Random(seed)
+        self.result = GenerationResult()
+        self.email_domain = f"{label}.invalid"
+        self.index = 0
+
+    def check_empty(self):
+        """Повторная генерация с той же меткой нарушила бы уникальность email и продуктов"""
+        if NetworkNode.objects.filter(email__endswith=f"@{self.email_domain}").exists():
+            raise ValueError(f"Сеть с меткой {self.label} уже сгенерирована, укажите другую метку")
+        if Product.objects.filter(model__startswith=f"{self.label.upper()}-").exists():
+            raise ValueError(f"Продукты с меткой {self.label} уже существуют, укажите другую метку")
+
+    def run(self):
+        self.check_empty()
+        self.products = self.create_products()
+
+        parents = [None] * self.factories  # Уровень 0: заводы без поставщика
+        for level in range(self.depth + 1):
+            if not parents or self.capacity() == 0:
+                break
+            self.result.levels.append(0)
+            parents = self.generate_level(level, parents)
+        return self.result
+
+    def capacity(self, pending=0):
+        """Сколько еще звеньев можно создать с учетом max_nodes (None - без ограничения)"""
+        if self.max_nodes is None:
+            return None
+        return max(0, self.max_nodes - self.result.nodes - pending)
+
+    def create_products(self):
+        start = date(2015, 1, 1)
+        products = Product.objects.bulk_create(
+            (
+                Product(
+                    name=f"Товар {self.label} {index:05d}",
+                    model=f"{self.label.upper()}-{index:05d}",
+                    release_date=start + timedelta(days=self.rng.randrange(3650)),
+                    price=Decimal(f"{self.rng.uniform(100, 200000):.2f}"),
+                )
+                for index in range(self.product_count)
+            ),
+            batch_size=self.batch_size,
+        )
+        self.result.products = len(products)
+        return [product.pk for product in products]
+
+    def generate_level(self, level, parents):
+        """
+        Звенья уровня level: по одному на каждого родителя уровня 0 (None),
+        либо fan_out потомков на каждого родителя. Возвращает родителей следующего уровня.
+        """
+        next_parents = []
+        batch = []
+        for parent in parents:
+            count = 1 if parent is None else self.rng.randint(*self.fan_out)
+            capacity = self.capacity(len(batch))
+            if capacity is not None:
+                if capacity == 0:
+                    break
+                count = min(count, capacity)
+            for _ in range(count):
+                batch.append(self.build_node(level, parent))
+                if len(batch) >= self.batch_size:
+                    next_parents.extend(self.flush(level, batch))
+                    batch = []
+        if batch:
+            next_parents.extend(self.flush(level, batch))
+        return next_parents
+
+    def build_node(self, level, parent):
+        rng = self.rng
+        self.index += 1
+        if parent is None:
+            node_type = NetworkNode.NodeType.FACTORY
+        elif level == 1 or rng.random() >= self.entrepreneur_share:
+            node_type = NetworkNode.NodeType.RETAIL_NETWORK
+        else:
+            node_type = NetworkNode.NodeType.INDIVIDUAL_ENTREPRENEUR
+
+        if parent is not None and rng.random() < self.locality:
+            country = parent[2]
+        else:
+            country = rng.choices(list(self.countries), weights=list(self.countries.values()))[0]
+
+        node = NetworkNode(
+            name=f"{NAME_PREFIXES[node_type]} {self.label} {self.index:07d}",
+            node_type=node_type,
+            supplier_id=None if parent is None else parent[0],
+            path="" if parent is None else child_path(parent[1], parent[0]),
+            level=level,
+            email=f"node{self.index:07d}@{self.email_domain}",
+            phone=f"+7{rng.randrange(9000000000, 10000000000)}",
+            country=country,
+            city=rng.choice(GEOGRAPHY[country]),
+            street=rng.choice(STREETS),
+            house_number=str(rng.randint(1, 200)),
+            postal_code=f"{rng.randrange(100000, 1000000)}",
+            debt=Decimal("0.00") if parent is None else self.debt(rng),
+        )
+        node.generated_products = self.pick_products()
+        return node
+
+    def pick_products(self):
+        """Случайный набор продуктов: в среднем density от их числа"""
+        total = len(self.products)
+        if not total or self.density <= 0:
+            return []
+        mean = total * self.density
+        count = round(self.rng.gauss(mean, math.sqrt(mean * max(0.0, 1 - self.density))))
+        return self.rng.sample(self.products, max(0, min(total, count)))
+
+    def flush(self, level, batch):
+        """Пакетная вставка звеньев и их продуктов; возвращает звенья, у которых будут потомки"""
+        with transaction.atomic():
+            NetworkNode.objects.bulk_create(batch, batch_size=self.batch_size)
+            links = insert_product_links(
+                (node.pk, product_id) for node in batch for product_id in node.generated_products
+            )
+            record_nodes_created(batch)
+
+        self.result.levels[level] += len(batch)
+        self.result.links += links
+        if self.on_batch is not None:
+            self.on_batch(self.result)
+
+        if level >= self.depth:
+            return []
+        # Индивидуальные предприниматели - конечные звенья; для потомков нужны (pk, path, страна)
+        return [
+            (node.pk, node.path, node.country)
+            for node in batch
+            if node.node_type != NetworkNode.NodeType.INDIVIDUAL_ENTREPRENEUR
+        ]
+
+
+def insert_product_links(pairs):
+    """
+    Связи звено-продукт одним INSERT ... SELECT unnest(массив, массив): связей в
+    несколько раз больше, чем звеньев, и экземпляры промежуточной модели для
+    bulk_create занимали бы большую часть времени генерации
+    """
+    node_ids, product_ids = [], []
+    for node_id, product_id in pairs:
+        node_ids.append(node_id)
+        product_ids.append(product_id)
+    if not node_ids:
+        return 0
+
+    through = NetworkNode.products.through._meta
+    quote = connection.ops.quote_name
+    sql = (
+        f"INSERT INTO {quote(through.db_table)} "
+        f"({quote(through.get_field('networknode').column)}, {quote(through.get_field('product').column)}) "
+        "SELECT * FROM unnest(%s::bigint[], %s::bigint[])"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [node_ids, product_ids])
+    return len(node_ids)
+
+
+def generate_network(**options):
+    """Генерирует сеть; возвращает GenerationResult"""
+    return NetworkGenerator(**options).run()
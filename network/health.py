@@ -0,0 +1,38 @@
+"""
+Проверка готовности сервиса.
+
+Настройки больше не подключаются к БД при импорте: manage.py, тесты и
+воркеры стартуют без обращения к базе, а доступность БД проверяется
+отдельно - командой check_database (например, перед запуском в
+контейнере) и эндпоинтом /api/health/ready/ для балансировщика.
+"""
+
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+
+def check_database(alias=DEFAULT_DB_ALIAS):
+    """Выполняет SELECT 1; возвращает (доступна ли БД, время ответа в мс, текст ошибки)"""
+    started = time.monotonic()
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+    except Exception as exc:
+        return False, None, str(exc)
+    return True, round((time.monotonic() - started) * 1000, 2), None
+
+
+def pending_migrations(alias=DEFAULT_DB_ALIAS):
+    """Непримененные миграции в виде строк "app.name" (читает файлы миграций - не для частых вызовов)"""
+    executor = MigrationExecutor(connections[alias])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    return [f"{migration.app_label}.{migration.name}" for migration, _ in plan]
+
+
+def readiness(alias=DEFAULT_DB_ALIAS):
+    """Ответ проверки готовности: (готов ли сервис, тело ответа)"""
+    ok, latency, _ = check_database(alias)  # Текст ошибки наружу не отдаем: эндпоинт публичный
+    return ok, {"status": "ok" if ok else "unavailable", "database": {"ok": ok, "latency_ms": latency}}
@@ -0,0 +1,131 @@
+"""
+Поддержка материализованной иерархии звеньев сети.
+
+Каждое звено хранит:
+- level - уровень в иерархии (0 - звено без поставщика);
+- path - цепочку id предков от корня, например "1/5/" для звена,
+  поставщиком которого является звено 5, а его поставщиком - завод 1.
+
+Собственный id в path не входит, поэтому path известен до вставки строки,
+а все потомки звена находятся одним индексным запросом path LIKE '<path><id>/%'.
+"""
+
+from collections import deque
+
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db.models import BigIntegerField, Case, F, Q, Value, When
+from django.db.models.functions import (Cast, Concat, Length, Replace,
+                                        StrIndex, Substr)
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+PATH_SEPARATOR = "/"
+
+CYCLE_ERROR_MESSAGE = "Обнаружена циклическая ссылка в цепочке поставщиков!"
+
+
+def child_path(path, pk):
+    """Путь, который получат непосредственные потомки звена с данными path и pk"""
+    return f"{path}{pk}{PATH_SEPARATOR}"
+
+
+def path_ids(path):
+    """Список id предков из материализованного пути (от корня к звену)"""
+    return [int(part) for part in path.split(PATH_SEPARATOR) if part]
+
+
+def level_from_path(path_expression):
+    """SQL-выражение уровня: количество разделителей в пути"""
+    return Length(path_expression) - Length(Replace(path_expression, Value(PATH_SEPARATOR), Value("")))
+
+
+def root_id_expression():
+    """SQL-выражение id корня поддерева: первый сегмент пути или собственный id корня"""
+    first_segment = Substr("path", 1, StrIndex("path", Value(PATH_SEPARATOR)) - 1)
+    return Case(When(path="", then=F("id")), default=Cast(first_segment, BigIntegerField()))
+
+
+def contains_ancestor_q(pk, prefix=""):
+    """Условие "в пути есть предок pk" для полей с префиксом prefix"""
+    return Q(**{f"{prefix}path__startswith": f"{pk}{PATH_SEPARATOR}"}) | Q(
+        **{f"{prefix}path__contains": f"{PATH_SEPARATOR}{pk}{PATH_SEPARATOR}"}
+    )
+
+
+def creates_cycle(node_pk, supplier_pk):
+    """
+    Создаст ли назначение supplier_pk поставщиком звена node_pk циклическую ссылку.
+    Цикл возникает, если поставщик - само звено или один из его потомков, то есть
+    node_pk входит в path поставщика. Проверка - один запрос по первичному ключу
+    независимо от глубины цепочки.
+    """
+    if node_pk is None or supplier_pk is None:
+        return False
+    if node_pk == supplier_pk:
+        return True
+
+    NetworkNode = apps.get_model("network", "NetworkNode")
+    return NetworkNode.objects.filter(contains_ancestor_q(node_pk), pk=supplier_pk).exists()
+
+
+def validate_supplier(node_pk, supplier_pk):
+    """Общий валидатор для модели, сериализаторов и админки"""
+    if creates_cycle(node_pk, supplier_pk):
+        raise ValidationError({"supplier": CYCLE_ERROR_MESSAGE})
+
+
+def move_subtree(model, pk, old_path, new_path):
+    """
+    Переносит всех потомков звена pk после смены его поставщика.
+    Выполняется одним UPDATE по индексу path.
+    """
+    old_prefix = child_path(old_path, pk)
+    new_prefix = child_path(new_path, pk)
+    if old_prefix == new_prefix:
+        return 0
+
+    moved_path = Concat(Value(new_prefix), Substr("path", len(old_prefix) + 1))
+    return model.objects.filter(path__startswith=old_prefix).update(path=moved_path, level=level_from_path(moved_path))
+
+
+def detach_subtree(model, pk):
+    """
+    Делает корнями прямых потомков удаленного звена pk (on_delete=SET_NULL).
+    Из путей всех потомков вырезается часть до pk включительно. Условие
+    построено по сегменту пути, а не по сохраненному path удаленного звена,
+    поэтому результат не зависит от порядка удаления при массовом delete().
+    """
+    marker = f"{PATH_SEPARATOR}{pk}{PATH_SEPARATOR}"
+    # Позиция сегмента "<pk>/" в path: ищем "/<pk>/" в "/" + path
+    position = StrIndex(Concat(Value(PATH_SEPARATOR), "path"), Value(marker))
+    detached_path = Substr("path", position + len(marker) - 1)
+    return model.objects.filter(contains_ancestor_q(pk)).update(
+        path=detached_path, level=level_from_path(detached_path)
+    )
+
+
+def rebuild_hierarchy(model):
+    """
+    Полностью пересчитывает level и path для всех звеньев (обход в ширину от корней).
+    Используется в миграции и для восстановления после ручного вмешательства в БД.
+    """
+    children = {}
+    for pk, supplier_id in model.objects.values_list("pk", "supplier_id").iterator():
+        children.setdefault(supplier_id, []).append(pk)
+
+    updated = []
+    queue = deque((pk, "", 0) for pk in children.get(None, []))
+    while queue:
+        pk, path, level = queue.popleft()
+        updated.append(model(pk=pk, path=path, level=level))
+        queue.extend((child_pk, child_path(path, pk), level + 1) for child_pk in children.get(pk, []))
+
+    model.objects.bulk_update(updated, ["path", "level"], batch_size=1000)
+    return len(updated)
+
+
+@receiver(post_delete, sender="network.NetworkNode", dispatch_uid="network_hierarchy_detach_subtree")
+def detach_subtree_on_delete(sender, instance, **kwargs):
+    """После удаления поставщика его поддерево становится самостоятельным"""
+    detach_subtree(sender, instance.pk)
@@ -0,0 +1,322 @@
+"""
+Массовый импорт звеньев сети и их продуктов из CSV или NDJSON.
+
+Весь пакет проверяется в памяти: поля модели, уникальность email (в файле
+и в БД одним запросом), правило "у завода нет поставщика", ссылки на
+поставщиков из того же файла, циклы и существование продуктов. Если
+ошибок нет, звенья вставляются пакетными INSERT по уровням (поставщик
+всегда раньше потомка) с уже вычисленными level и path, а связи с
+продуктами - пакетной вставкой в промежуточную таблицу. Если ошибки
+есть, в БД ничего не пишется, а возвращается отчет по строкам.
+
+Между проверкой и вставкой параллельная транзакция может занять email,
+удалить поставщика или продукт. Тогда вставка откатывается целиком, а
+проверки ссылок повторяются, и конфликт попадает в тот же отчет по строкам.
+"""
+
+import csv
+import io
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .hierarchy import child_path
+from .models import NetworkNode, Product
+from .statistics import record_nodes_created
+
+IMPORT_FIELDS = (
+    "name",
+    "node_type",
+    "email",
+    "phone",
+    "country",
+    "city",
+    "street",
+    "house_number",
+    "postal_code",
+    "debt",
+)
+
+# Поля, которые не проверяются на уровне строки (ссылки и служебные поля)
+EXCLUDED_FROM_CLEAN = ["supplier", "products", "path", "level", "created_at", "updated_at"]
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class ImportResult:
+    """Итог импорта: созданные id или отчет об ошибках по строкам"""
+
+    def __init__(self):
+        self.errors = {}
+        self.created_ids = []
+
+    def add_error(self, row_number, field, message):
+        self.errors.setdefault(row_number, {}).setdefault(field, []).append(message)
+
+    @property
+    def is_valid(self):
+        return not self.errors
+
+    def error_report(self):
+        return [{"row": row_number, "errors": errors} for row_number, errors in sorted(self.errors.items())]
+
+
+def parse_rows(content, file_format):
+    """Разбирает содержимое файла в список словарей"""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+
+    if file_format == "csv":
+        return [dict(row) for row in csv.DictReader(io.StringIO(content))]
+    if file_format == "ndjson":
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+    raise ValueError(f"Неизвестный формат: {file_format}")
+
+
+def _parse_id_list(value):
+    """Список id без повторов (порядок сохраняется): связь звена с продуктом уникальна"""
+    if value in (None, ""):
+        return []
+    if isinstance(value, (list, tuple)):
+        ids = [int(item) for item in value]
+    else:
+        ids = [int(item) for item in str(value).replace(",", ";").split(";") if item.strip()]
+    return list(dict.fromkeys(ids))
+
+
+def _parse_optional_id(value):
+    return None if value in (None, "") else int(value)
+
+
+def _by_lower_email(emails):
+    return NetworkNode.objects.annotate(email_lower=Lower("email")).filter(email_lower__in=list(emails))
+
+
+class NetworkImporter:
+    """Проверка и вставка пакета звеньев"""
+
+    def __init__(self, rows, allow_debt=True, batch_size=DEFAULT_BATCH_SIZE):
+        self.rows = rows
+        self.allow_debt = allow_debt
+        self.batch_size = batch_size
+        self.result = ImportResult()
+
+    def run(self, dry_run=False):
+        nodes, references, product_ids = self.validate()
+        if self.result.is_valid and not dry_run:
+            try:
+                with transaction.atomic():
+                    self.insert(nodes, references, product_ids)
+            except IntegrityError:
+                self.report_conflicts(nodes, references, product_ids)
+        return self.result
+
+    # === Проверка ===
+
+    def validate(self):
+        nodes, references, product_ids = {}, {}, {}
+        emails = {}
+        self.rejected_emails = {}
+
+        for row_number, row in enumerate(self.rows, start=1):
+            if not isinstance(row, dict):
+                # Например, строка NDJSON 1 или "x" или элемент rows, не являющийся объектом
+                self.result.add_error(row_number, "non_field_errors", "Строка должна быть объектом с полями звена.")
+                continue
+            node, reference, products = self.validate_row(row_number, row)
+            if node is None:
+                email = str(row.get("email") or "").strip().lower()
+                if email:
+                    self.rejected_emails.setdefault(email, row_number)
+                continue
+            nodes[row_number], references[row_number], product_ids[row_number] = node, reference, products
+
+            # Уникальность email внутри файла
+            email = node.email.lower()
+            if email in emails:
+                self.result.add_error(row_number, "email", f"Email повторяется в строке {emails[email]}.")
+            else:
+                emails[email] = row_number
+
+        self.emails = emails
+        self.check_existing_emails(emails)
+        self.resolve_suppliers(nodes, references, emails)
+        self.check_products(product_ids)
+        return nodes, references, product_ids
+
+    def validate_row(self, row_number, row):
+        data = {field: row[field] for field in IMPORT_FIELDS if row.get(field) not in (None, "")}
+        if not self.allow_debt and "debt" in data:
+            self.result.add_error(row_number, "debt", 'Поле "Задолженность" нельзя задать через API.')
+            return None, None, None
+
+        try:
+            supplier_id = _parse_optional_id(row.get("supplier"))
+        except (TypeError, ValueError):
+            self.result.add_error(row_number, "supplier", "Ссылка supplier должна быть целым id.")
+        try:
+            products = _parse_id_list(row.get("product_ids"))
+        except (TypeError, ValueError):
+            self.result.add_error(row_number, "product_ids", "Ссылки product_ids должны быть целыми id.")
+        if row_number in self.result.errors:
+            return None, None, None
+
+        supplier_email = (row.get("supplier_email") or "").strip().lower() or None
+        if supplier_id and supplier_email:
+            self.result.add_error(row_number, "supplier", "Укажите только supplier или supplier_email.")
+
+        node = NetworkNode(**data)
+        try:
+            node.clean_fields(exclude=EXCLUDED_FROM_CLEAN)
+        except ValidationError as exc:
+            for field, messages in exc.message_dict.items():
+                for message in messages:
+                    self.result.add_error(row_number, field, message)
+            return None, None, None
+
+        if node.node_type == NetworkNode.NodeType.FACTORY and (supplier_id or supplier_email):
+            self.result.add_error(row_number, "supplier", "Завод не может иметь поставщика!")
+
+        return node, (supplier_id, supplier_email), products
+
+    def check_existing_emails(self, emails):
+        """Один запрос на все email пакета"""
+        for email in _by_lower_email(emails).values_list("email_lower", flat=True):
+            self.result.add_error(emails[email], "email", "Звено сети с таким email уже существует.")
+
+    def resolve_suppliers(self, nodes, references, emails):
+        """
+        Проверяет ссылки на поставщиков и порядок вставки.
+        Поставщики из БД загружаются одним запросом; ссылки внутри файла
+        упорядочиваются топологически, оставшиеся строки образуют цикл.
+        """
+        supplier_ids = {supplier_id for supplier_id, _ in references.values() if supplier_id}
+        external_emails = {email for _, email in references.values() if email and email not in emails}
+        existing = NetworkNode.objects.annotate(email_lower=Lower("email")).filter(
+            Q(pk__in=supplier_ids) | Q(email_lower__in=external_emails)
+        )
+        self.existing_suppliers = {}
+        existing_by_email = {}
+        for pk, email, path, level in existing.values_list("pk", "email_lower", "path", "level"):
+            self.existing_suppliers[pk] = (path, level)
+            existing_by_email[email] = pk
+
+        self.parents = {}
+        for row_number, (supplier_id, supplier_email) in references.items():
+            if supplier_id:
+                if supplier_id not in self.existing_suppliers:
+                    self.result.add_error(row_number, "supplier", f"Поставщик с id {supplier_id} не найден.")
+                else:
+                    references[row_number] = (supplier_id, None)
+            elif supplier_email:
+                if supplier_email in emails:
+                    self.parents[row_number] = emails[supplier_email]
+                    references[row_number] = (None, emails[supplier_email])
+                elif supplier_email in existing_by_email:
+                    references[row_number] = (existing_by_email[supplier_email], None)
+                elif supplier_email in self.rejected_emails:
+                    parent = self.rejected_emails[supplier_email]
+                    self.result.add_error(row_number, "supplier", f"Поставщик в строке {parent} содержит ошибки.")
+                else:
+                    self.result.add_error(row_number, "supplier", f"Поставщик {supplier_email} не найден.")
+
+        self.layers = self.topological_layers(nodes)
+
+    def topological_layers(self, nodes):
+        """Строки по уровням: сначала те, чей поставщик уже в БД или отсутствует"""
+        children = {}
+        for row_number, parent in self.parents.items():
+            if parent == row_number:
+                continue
+            children.setdefault(parent, []).append(row_number)
+
+        layers = []
+        layer = [row_number for row_number in nodes if row_number not in self.parents]
+        placed = set(layer)
+        while layer:
+            layers.append(layer)
+            layer = [child for row_number in layer for child in children.get(row_number, [])]
+            placed.update(layer)
+
+        for row_number in nodes:
+            if row_number not in placed:
+                self.result.add_error(row_number, "supplier", "Обнаружена циклическая ссылка в цепочке поставщиков!")
+
+        # Строки, поставщик которых в файле содержит ошибки, тоже не могут быть вставлены
+        for layer in layers:
+            for row_number in layer:
+                parent = self.parents.get(row_number)
+                if parent is not None and parent in self.result.errors and row_number not in self.result.errors:
+                    self.result.add_error(row_number, "supplier", f"Поставщик в строке {parent} содержит ошибки.")
+        return layers
+
+    def check_products(self, product_ids):
+        requested = {product_id for products in product_ids.values() for product_id in products}
+        existing = set(Product.objects.filter(pk__in=requested).values_list("pk", flat=True))
+        for row_number, products in product_ids.items():
+            missing = [product_id for product_id in products if product_id not in existing]
+            if missing:
+                self.result.add_error(
+                    row_number, "product_ids", f"Продукты не найдены: {', '.join(map(str, missing))}."
+                )
+
+    def report_conflicts(self, nodes, references, product_ids):
+        """Вставка нарушила ограничение БД: повторяет проверки, которые могли устареть после validate()"""
+        self.result.created_ids = []
+        self.check_existing_emails(self.emails)
+        suppliers = {supplier_id for supplier_id, _ in references.values() if supplier_id is not None}
+        deleted = suppliers - set(NetworkNode.objects.filter(pk__in=suppliers).values_list("pk", flat=True))
+        for row_number, (supplier_id, _) in references.items():
+            if supplier_id in deleted:
+                self.result.add_error(row_number, "supplier", f"Поставщик с id {supplier_id} не найден.")
+        self.check_products(product_ids)
+        if self.result.is_valid:
+            self.result.add_error(
+                min(nodes), "non_field_errors", "Пакет не записан: данные изменились во время импорта, повторите."
+            )
+
+    # === Вставка ===
+
+    def insert(self, nodes, references, product_ids):
+        inserted = {}  # номер строки -> (pk, path, level)
+        for layer in self.layers:
+            batch = []
+            for row_number in layer:
+                node = nodes[row_number]
+                supplier_id, parent_row = references[row_number]
+                if parent_row is not None:
+                    supplier_id, supplier_path, supplier_level = inserted[parent_row]
+                elif supplier_id is not None:
+                    supplier_path, supplier_level = self.existing_suppliers[supplier_id]
+
+                if supplier_id is None:
+                    node.supplier_id, node.path, node.level = None, "", 0
+                else:
+                    node.supplier_id = supplier_id
+                    node.path, node.level = child_path(supplier_path, supplier_id), supplier_level + 1
+                batch.append(node)
+
+            NetworkNode.objects.bulk_create(batch, batch_size=self.batch_size)
+            for row_number in layer:
+                node = nodes[row_number]
+                inserted[row_number] = (node.pk, node.path, node.level)
+
+        Through = NetworkNode.products.through
+        Through.objects.bulk_create(
+            [
+                Through(networknode_id=nodes[row_number].pk, product_id=product_id)
+                for row_number, products in product_ids.items()
+                for product_id in products
+            ],
+            batch_size=self.batch_size,
+        )
+        record_nodes_created(nodes.values())
+        self.result.created_ids = [nodes[row_number].pk for row_number in sorted(nodes)]
+
+
+def import_network(rows, dry_run=False, allow_debt=True, batch_size=DEFAULT_BATCH_SIZE):
+    """Проверяет и импортирует пакет строк; возвращает ImportResult"""
+    return NetworkImporter(rows, allow_debt=allow_debt, batch_size=batch_size).run(dry_run=dry_run)
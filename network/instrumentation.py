@@ -0,0 +1,297 @@
+"""
+Профилирование запросов: SQL и фазы обработки (Server-Timing и журнал).
+
+SQLInstrumentationMiddleware включается настройкой SQL_INSTRUMENTATION. Для
+профилируемого запроса собираются число SQL-запросов, их суммарное время,
+самые медленные выражения (без параметров) и время фаз: auth и permissions
+(классы DRF), view (обработчик), serialize (сериализаторы и быстрый путь
+списков) и render (отрисовка ответа DRF или TemplateResponse). Фазы
+вложены друг в друга и в SQL: время запросов к БД входит и в фазу, в
+которой они выполнены.
+
+Профилируются запросы сотрудников с is_staff (ответ получает заголовок
+Server-Timing) и доля SQL_INSTRUMENTATION_SAMPLE_RATE остальных запросов
+(строка JSON в журнал network.instrumentation). Чтобы выбрать запрос,
+middleware обращается к request.user: пользователь сессии загружается до
+представления, а не в нем. Для запроса без профиля точки замера фаз только
+проверяют, что профиль не установлен. Потоковые ответы (export) читают
+данные после выхода из middleware, эти запросы в профиль не попадают.
+
+Middleware работает и под ASGI без перехода в поток: пользователь загружается
+через request.auser(), а SQL из потоков sync_to_async учитывается
+execute_wrapper-ом всех соединений по профилю из ContextVar.
+"""
+
+import heapq
+import json
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger("network.instrumentation")
+
+DEFAULT_SAMPLE_RATE = 0.01
+DEFAULT_SLOWEST = 3
+SQL_PREVIEW_LENGTH = 300
+
+# Порядок метрик в заголовке Server-Timing
+PHASES = ("auth", "permissions", "view", "serialize", "render")
+
+_current = ContextVar("request_profile", default=None)
+
+
+def current_profile():
+    """Профиль текущего запроса или None"""
+    return _current.get()
+
+
+class RequestProfile:
+    """Число и время SQL-запросов, самые медленные выражения и время фаз запроса"""
+
+    def __init__(self, slowest=DEFAULT_SLOWEST):
+        self.started = time.perf_counter()
+        self.duration = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest_limit = slowest
+        self.slowest = []  # Куча (время, номер, SQL) размером не больше slowest_limit
+        self.phases = {}
+        self.active = set()
+
+    def record_query(self, execute, sql, params, many, context):
+        """execute_wrapper соединения: замер каждого запроса"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql_time += elapsed
+            if self.slowest_limit:
+                item = (elapsed, self.queries, sql)
+                if len(self.slowest) < self.slowest_limit:
+                    heapq.heappush(self.slowest, item)
+                elif elapsed > self.slowest[0][0]:
+                    heapq.heapreplace(self.slowest, item)
+
+    def add_phase(self, name, elapsed):
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def slowest_statements(self):
+        """Самые медленные выражения по убыванию времени (SQL без параметров, обрезан)"""
+        return [
+            {"ms": round(elapsed * 1000, 3), "sql": sql[:SQL_PREVIEW_LENGTH]}
+            for elapsed, _, sql in sorted(self.slowest, reverse=True)
+        ]
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing (длительности в мс)"""
+        metrics = [f"total;dur={self.duration * 1000:.2f}"]
+        metrics.append(f'sql;dur={self.sql_time * 1000:.2f};desc="{self.queries} queries"')
+        metrics.extend(f"{name};dur={self.phases[name] * 1000:.2f}" for name in PHASES if name in self.phases)
+        return ", ".join(metrics)
+
+    def as_dict(self):
+        return {
+            "duration_ms": round(self.duration * 1000, 3),
+            "queries": self.queries,
+            "sql_ms": round(self.sql_time * 1000, 3),
+            "phases": {name: round(self.phases[name] * 1000, 3) for name in PHASES if name in self.phases},
+            "slowest": self.slowest_statements(),
+        }
+
+
+class Phase:
+    """
+    Замер фазы текущего запроса: with Phase("serialize"): ...
+    Вложенный замер той же фазы не учитывается повторно; без профиля ничего не делает.
+    """
+
+    __slots__ = ("name", "profile", "started")
+
+    def __init__(self, name):
+        self.name = name
+        self.profile = None
+
+    def __enter__(self):
+        profile = _current.get()
+        if profile is not None and self.name not in profile.active:
+            profile.active.add(self.name)
+            self.profile = profile
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profile is not None:
+            self.profile.add_phase(self.name, time.perf_counter() - self.started)
+            self.profile.active.discard(self.name)
+            self.profile = None
+        return False
+
+
+class PhaseTimingViewMixin:
+    """Фазы auth и permissions для представлений DRF"""
+
+    def perform_authentication(self, request):
+        with Phase("auth"):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with Phase("permissions"):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with Phase("permissions"):
+            super().check_object_permissions(request, obj)
+
+
+class PhaseTimingSerializerMixin:
+    """Фаза serialize: to_representation сериализатора (вложенные и элементы списков - одна фаза)"""
+
+    def to_representation(self, instance):
+        if _current.get() is None:
+            return super().to_representation(instance)
+        with Phase("serialize"):
+            return super().to_representation(instance)
+
+
+def sample_rate():
+    return getattr(settings, "SQL_INSTRUMENTATION_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper всех соединений: SQL учитывается в профиле текущего запроса"""
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.record_query(execute, sql, params, many, context)
+
+
+@receiver(connection_created, dispatch_uid="network_instrumentation_record_query")
+def install_query_recorder(sender=None, connection=connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def mark_view_started(request):
+    if hasattr(request, "profile_view_started"):
+        request.profile_view_started = time.perf_counter()
+
+
+def mark_view_finished(request):
+    if hasattr(request, "profile_view_started"):
+        request.profile_view_finished = time.perf_counter()
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Профиль запроса: Server-Timing для сотрудников с is_staff, строка журнала
+    для доли запросов SQL_INSTRUMENTATION_SAMPLE_RATE. Должен стоять после
+    AuthenticationMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "SQL_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Точки замера фаз вызываются без перехода в поток sync_to_async
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sampled = random.random() < sample_rate()
+        user = getattr(request, "user", None)
+        if not sampled and not (user is not None and user.is_staff):
+            return self.get_response(request)
+
+        install_query_recorder()  # Соединение потока могло открыться до загрузки модуля
+        profile = self.start(request)
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        profile.finish()
+        return self.report(request, response, profile, sampled)
+
+    async def __acall__(self, request):
+        sampled = random.random() < sample_rate()
+        user = await request.auser() if hasattr(request, "auser") else None
+        if not sampled and not (user is not None and user.is_staff):
+            return await self.get_response(request)
+
+        profile = self.start(request)
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        profile.finish()
+        # request.user может загружаться из БД, поэтому отчет - в потоке sync_to_async
+        return await sync_to_async(self.report)(request, response, profile, sampled)
+
+    def start(self, request):
+        request.profile_view_started = request.profile_view_finished = None
+        return RequestProfile(getattr(settings, "SQL_INSTRUMENTATION_SLOWEST", DEFAULT_SLOWEST))
+
+    def report(self, request, response, profile, sampled):
+        """Фазы view и render, заголовок Server-Timing и строка журнала"""
+        finished = profile.started + profile.duration
+        if request.profile_view_started is not None:
+            # Ответы с render(): view - до process_template_response, остальное - отрисовка
+            view_finished = request.profile_view_finished or finished
+            profile.add_phase("view", view_finished - request.profile_view_started)
+            if request.profile_view_finished is not None:
+                profile.add_phase("render", finished - request.profile_view_finished)
+
+        # Пользователь мог быть определен аутентификацией DRF уже после начала запроса
+        user = getattr(request, "user", None)
+        if user is not None and user.is_staff:
+            response["Server-Timing"] = profile.server_timing()
+        if sampled:
+            self.log(request, response, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mark_view_started(request)
+
+    def process_template_response(self, request, response):
+        mark_view_finished(request)
+        return response
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        mark_view_started(request)
+
+    async def aprocess_template_response(self, request, response):
+        mark_view_finished(request)
+        return response
+
+    def log(self, request, response, profile):
+        match = request.resolver_match
+        data = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            **profile.as_dict(),
+        }
+        logger.info(json.dumps(data, ensure_ascii=False), extra={"profile": data})
@@ -0,0 +1,273 @@
+"""
+Фоновые задачи без внешнего брокера.
+
+Очередь - таблица Job. Воркеры (команда run_jobs, пул процессов) забирают
+задачи запросом SELECT ... FOR UPDATE SKIP LOCKED, поэтому несколько
+процессов не ждут друг друга и не берут одну задачу дважды. Прогресс
+пишется через отдельное соединение с БД: сама операция может выполняться
+в одной длинной транзакции, а статус должен быть виден API сразу.
+
+Пока задача выполняется, фоновый поток воркера раз в JOB_HEARTBEAT_INTERVAL
+секунд обновляет Job.heartbeat_at. Если воркер завершился аварийно (OOM,
+SIGKILL, деплой), сигнал прекращается: claim_next помечает такие задачи
+ошибкой через JOB_STALE_TIMEOUT секунд. Повторно они не запускаются -
+задача, из-за которой падает воркер, иначе выполнялась бы бесконечно.
+"""
+
+import threading
+import time
+import traceback
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import (DEFAULT_DB_ALIAS, close_old_connections, connections,
+                       transaction)
+from django.db.models import Q
+from django.utils import timezone
+
+from .filters import clear_debt_target
+from .hierarchy import rebuild_hierarchy
+from .importer import import_network
+from .models import Job, NetworkNode
+from .statistics import clear_debt, recompute
+
+DEFAULT_ASYNC_THRESHOLD = 5000
+PROGRESS_INTERVAL = 1.0  # Не чаще одной записи прогресса в секунду
+DEFAULT_HEARTBEAT_INTERVAL = 30
+DEFAULT_STALE_TIMEOUT = 300
+CLEARED_REPORT_LIMIT = 1000  # Звеньев со старой задолженностью в ответе; итоги считаются по всем
+
+_handlers = {}
+
+
+class JobFailed(Exception):
+    """Задача завершилась ошибкой, но с содержательным результатом (например, отчетом импорта)"""
+
+    def __init__(self, result):
+        super().__init__(result)
+        self.result = result
+
+
+def job_handler(kind):
+    """Регистрирует обработчик задачи: handler(params, progress) -> result (JSON)"""
+
+    def register(handler):
+        _handlers[kind] = handler
+        return handler
+
+    return register
+
+
+def async_threshold():
+    """Размер пакета, начиная с которого массовые операции уходят в фоновую задачу"""
+    return getattr(settings, "JOB_ASYNC_THRESHOLD", DEFAULT_ASYNC_THRESHOLD)
+
+
+def enqueue(kind, params=None, user=None, total=None):
+    return Job.objects.create(
+        kind=kind, params=params or {}, total=total, created_by=user if user and user.is_authenticated else None
+    )
+
+
+def fail_stale_jobs():
+    """Помечает ошибкой выполняющиеся задачи без сигнала воркера дольше JOB_STALE_TIMEOUT; возвращает их число"""
+    timeout = getattr(settings, "JOB_STALE_TIMEOUT", DEFAULT_STALE_TIMEOUT)
+    now = timezone.now()
+    deadline = now - timedelta(seconds=timeout)
+    # Задачи, начатые до появления heartbeat_at, проверяются по времени начала
+    stale = Q(heartbeat_at__lt=deadline) | Q(heartbeat_at__isnull=True, started_at__lt=deadline)
+    return Job.objects.filter(stale, status=Job.Status.RUNNING).update(
+        status=Job.Status.FAILED,
+        error=f"Воркер перестал отвечать: нет сигнала дольше {timeout} сек.",
+        finished_at=now,
+    )
+
+
+def claim_next():
+    """Забирает самую старую задачу из очереди (или None)"""
+    fail_stale_jobs()
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.Status.PENDING)
+            .order_by("created_at", "pk")
+            .first()
+        )
+        if job is not None:
+            job.status, job.started_at = Job.Status.RUNNING, timezone.now()
+            job.heartbeat_at = job.started_at
+            job.save(update_fields=["status", "started_at", "heartbeat_at"])
+    return job
+
+
+class Heartbeat:
+    """Фоновый поток: обновляет Job.heartbeat_at, пока задача выполняется (собственное соединение)"""
+
+    def __init__(self, job, interval=None):
+        self.job = job
+        self.interval = interval or getattr(settings, "JOB_HEARTBEAT_INTERVAL", DEFAULT_HEARTBEAT_INTERVAL)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"job-heartbeat-{job.pk}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        connection = None
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    if connection is None:
+                        connection = connections.create_connection(DEFAULT_DB_ALIAS)
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            f"UPDATE {connection.ops.quote_name(Job._meta.db_table)} SET heartbeat_at = %s "
+                            "WHERE id = %s",
+                            [timezone.now(), self.job.pk],
+                        )
+                except Exception:
+                    # Сбой соединения не прерывает задачу: следующий сигнал - через интервал с новым соединением
+                    if connection is not None:
+                        connection.close()
+                    connection = None
+        finally:
+            if connection is not None:
+                connection.close()
+
+
+class ProgressReporter:
+    """Запись прогресса задачи через собственное соединение в режиме autocommit"""
+
+    def __init__(self, job):
+        self.job = job
+        self._connection = None
+        self._last_write = 0.0
+
+    def __call__(self, processed, total=None, force=False):
+        self.job.processed = processed
+        if total is not None:
+            self.job.total = total
+
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+
+        if self._connection is None:
+            self._connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        with self._connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {self._connection.ops.quote_name(Job._meta.db_table)} "
+                "SET processed = %s, total = COALESCE(%s, total) WHERE id = %s",
+                [processed, total, self.job.pk],
+            )
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+
+
+def run_job(job):
+    """Выполняет забранную задачу и сохраняет результат или ошибку"""
+    handler = _handlers.get(job.kind)
+    progress = ProgressReporter(job)
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+    try:
+        if handler is None:
+            raise ValueError(f"Неизвестный тип задачи: {job.kind}")
+        job.result = handler(job.params, progress)
+        job.status = Job.Status.SUCCEEDED
+    except JobFailed as exc:
+        job.status, job.result = Job.Status.FAILED, exc.result
+    except Exception:
+        job.status, job.error = Job.Status.FAILED, traceback.format_exc()
+    finally:
+        heartbeat.stop()
+        progress.close()
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "result", "error", "processed", "total", "finished_at"])
+    return job
+
+
+def run_pending(limit=None):
+    """Выполняет задачи из очереди в текущем процессе, пока она не опустеет"""
+    done = 0
+    while limit is None or done < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
+
+
+def worker_loop(poll_interval=1.0, once=False):
+    """Цикл процесса пула: забирает и выполняет задачи (once - до опустения очереди)"""
+    done = 0
+    while True:
+        processed = run_pending()
+        done += processed
+        if once and not processed:
+            return done
+        if not processed:
+            time.sleep(poll_interval)
+        close_old_connections()  # Учитывает CONN_MAX_AGE и проверку соединения
+
+
+# === Обработчики ===
+
+
+def clear_debt_report(cleared):
+    """
+    Ответ массовой очистки задолженности (общий для API и задачи). Список
+    звеньев ограничен CLEARED_REPORT_LIMIT, чтобы Job.result не рос с пакетом.
+    """
+    total_debt = sum((old_debt for _, old_debt in cleared), Decimal(0))
+    return {
+        "message": "Задолженность очищена",
+        "cleared_count": len(cleared),
+        "total_debt_cleared": float(total_debt),
+        "cleared": [{"id": pk, "old_debt": old_debt} for pk, old_debt in cleared[:CLEARED_REPORT_LIMIT]],
+        "truncated": len(cleared) > CLEARED_REPORT_LIMIT,
+    }
+
+
+@job_handler(Job.Kind.CLEAR_DEBT)
+def clear_debt_job(params, progress):
+    target, error = clear_debt_target(params)
+    if error:
+        raise ValueError(error)
+    report = clear_debt_report(clear_debt(**target, on_progress=progress))
+    progress(report["cleared_count"], force=True)
+    return report
+
+
+@job_handler(Job.Kind.IMPORT_NODES)
+def import_nodes_job(params, progress):
+    rows = params.get("rows", [])
+    progress(0, total=len(rows), force=True)
+    result = import_network(rows, dry_run=params.get("dry_run", False), allow_debt=params.get("allow_debt", False))
+    progress(len(rows))
+    if not result.is_valid:
+        raise JobFailed({"errors": result.error_report()})
+    return {"created": len(result.created_ids), "ids": result.created_ids}
+
+
+@job_handler(Job.Kind.REBUILD_HIERARCHY)
+def rebuild_hierarchy_job(params, progress):
+    updated = rebuild_hierarchy(NetworkNode)
+    progress(updated, total=updated, force=True)
+    return {"updated": updated}
+
+
+@job_handler(Job.Kind.REBUILD_STATISTICS)
+def rebuild_statistics_job(params, progress):
+    recompute()
+    return {"message": "Статистика сети перестроена"}
@@ -0,0 +1,107 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность эндпоинтов чтения при параллельных запросах: "
+        "синхронный API через WSGI-обработчик (пул потоков, как gunicorn gthread) "
+        "и асинхронный API /api/async/... через ASGI-обработчик (один цикл событий, как uvicorn)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Путь синхронного API (можно несколько). Асинхронный путь - с префиксом /api/async/",
+        )
+        parser.add_argument("--user", required=True, help="Имя пользователя, от которого выполняются запросы")
+        parser.add_argument("--requests", type=int, default=200, help="Запросов на каждый путь и режим")
+        parser.add_argument("--concurrency", type=int, default=32, help="Одновременных запросов клиента")
+        parser.add_argument("--wsgi-threads", type=int, default=4, help="Потоков WSGI-воркера")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден")
+
+        login = Client()
+        login.force_login(user)
+        self.session_key = login.cookies[settings.SESSION_COOKIE_NAME].value
+
+        paths = options["paths"] or ["/api/network-nodes/", "/api/network-nodes/suppliers_summary/"]
+        for path in paths:
+            if not path.startswith("/api/"):
+                raise CommandError(f"Путь должен начинаться с /api/: {path}")
+            async_path = path.replace("/api/", "/api/async/", 1)
+            self.stdout.write(f"\n{path}  (ASGI: {async_path})")
+            self.stdout.write(f"{'режим':<6}{'ошибок':>8}{'запр/с':>10}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+            self.report("WSGI", *self.run_wsgi(path, options))
+            self.report("ASGI", *asyncio.run(self.run_asgi(async_path, options)))
+
+    def authenticated(self, client):
+        client.cookies[settings.SESSION_COOKIE_NAME] = self.session_key
+        return client
+
+    def run_wsgi(self, path, options):
+        """
+        concurrency клиентов против пула из wsgi-threads потоков: запросы сверх
+        числа потоков ждут в очереди, и это ожидание входит в задержку
+        """
+        local = threading.local()
+        in_flight = threading.BoundedSemaphore(options["concurrency"])
+
+        def call(submitted):
+            try:
+                if not hasattr(local, "client"):
+                    local.client = self.authenticated(Client())
+                status = local.client.get(path).status_code
+                return status, time.perf_counter() - submitted
+            finally:
+                in_flight.release()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["wsgi_threads"]) as pool:
+            futures = []
+            for _ in range(options["requests"]):
+                in_flight.acquire()
+                futures.append(pool.submit(call, time.perf_counter()))
+            results = [future.result() for future in futures]
+        return results, time.perf_counter() - started
+
+    async def run_asgi(self, path, options):
+        client = self.authenticated(AsyncClient())
+        semaphore = asyncio.Semaphore(options["concurrency"])
+
+        async def call():
+            async with semaphore:
+                submitted = time.perf_counter()
+                response = await client.get(path)
+                return response.status_code, time.perf_counter() - submitted
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(call() for _ in range(options["requests"])))
+        return results, time.perf_counter() - started
+
+    def report(self, mode, results, elapsed):
+        latencies = [latency * 1000 for _, latency in results]
+        errors = sum(1 for status, _ in results if status != 200)
+        self.stdout.write(
+            f"{mode:<6}{errors:>8}{len(results) / elapsed:>10.1f}{statistics.median(latencies):>10.1f}"
+            f"{percentile(latencies, 0.95):>10.1f}{percentile(latencies, 0.99):>10.1f}"
+        )
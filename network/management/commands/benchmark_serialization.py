@@ -0,0 +1,102 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from network.fastpath import get_mapper
+from network.models import NetworkNode, Product
+from network.serializers import NetworkNodeSerializer
+
+BENCH_EMAIL_DOMAIN = "benchmark.invalid"
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает скорость сериализации списка звеньев (строк в секунду): ModelSerializer DRF "
+        "и быстрый путь через values() (network/fastpath.py). Тестовые звенья создаются "
+        "во временной транзакции и удаляются после замера"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000, help="Количество звеньев в списке")
+        parser.add_argument("--products", type=int, default=3, help="Продуктов у каждого звена")
+        parser.add_argument("--repeat", type=int, default=3, help="Повторов замера (берется лучший)")
+
+    def handle(self, *args, **options):
+        if options["rows"] < 1 or options["repeat"] < 1:
+            raise CommandError("--rows и --repeat должны быть положительными")
+
+        with transaction.atomic():
+            self.create_nodes(options["rows"], options["products"])
+            queryset = NetworkNode.objects.filter(email__endswith=f"@{BENCH_EMAIL_DOMAIN}")
+
+            drf_time, drf_body = self.measure(options["repeat"], lambda: self.render_drf(queryset))
+            fast_time, fast_body = self.measure(options["repeat"], lambda: self.render_fast(queryset))
+            transaction.set_rollback(True)
+
+        rows = options["rows"]
+        self.stdout.write(f"{'режим':<18}{'время, с':>10}{'строк/с':>12}")
+        self.stdout.write(f"{'ModelSerializer':<18}{drf_time:>10.3f}{rows / drf_time:>12.0f}")
+        self.stdout.write(f"{'values()':<18}{fast_time:>10.3f}{rows / fast_time:>12.0f}")
+        self.stdout.write(f"Ускорение: {drf_time / fast_time:.1f}x")
+        if drf_body != fast_body:
+            raise CommandError("Ответы быстрого пути и ModelSerializer различаются")
+        self.stdout.write(self.style.SUCCESS("Ответы совпадают байт в байт"))
+
+    def create_nodes(self, rows, products_per_node):
+        """Завод, розничные звенья под ним и продукты (bulk_create в обход save)"""
+        products = Product.objects.bulk_create(
+            Product(name=f"Бенчмарк {index}", model=f"BENCH-{index}", release_date="2024-01-01", price="10.00")
+            for index in range(products_per_node)
+        )
+        factory = NetworkNode.objects.create(
+            name="Бенчмарк: завод",
+            node_type=NetworkNode.NodeType.FACTORY,
+            email=f"factory@{BENCH_EMAIL_DOMAIN}",
+            country="Россия",
+            city="Москва",
+            street="Заводская",
+            house_number="1",
+        )
+        nodes = NetworkNode.objects.bulk_create(
+            NetworkNode(
+                name=f"Бенчмарк: звено {index:07d}",
+                node_type=NetworkNode.NodeType.RETAIL_NETWORK,
+                supplier=factory,
+                path=factory.children_path,
+                level=1,
+                email=f"node{index}@{BENCH_EMAIL_DOMAIN}",
+                country="Россия",
+                city="Казань",
+                street="Торговая",
+                house_number=str(index),
+                postal_code="420000",
+                debt=index,
+            )
+            for index in range(rows - 1)
+        )
+        through = NetworkNode.products.through
+        through.objects.bulk_create(
+            through(networknode_id=node.pk, product_id=product.pk)
+            for node in [factory, *nodes]
+            for product in products
+        )
+
+    def measure(self, repeat, render):
+        best, body = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = render()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, body
+
+    def render_drf(self, queryset):
+        serializer_class = NetworkNodeSerializer
+        data = serializer_class(serializer_class.shape_queryset(queryset), many=True).data
+        return JSONRenderer().render(data)
+
+    def render_fast(self, queryset):
+        mapper = get_mapper(NetworkNodeSerializer)
+        return JSONRenderer().render(mapper.map_rows(list(queryset.values(*mapper.columns))))
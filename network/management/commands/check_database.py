@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from network.health import check_database, pending_migrations
+
+
+class Command(BaseCommand):
+    help = "Проверяет доступность базы данных (и, при необходимости, примененные миграции)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--wait", type=float, default=0, help="Ждать доступности БД до указанного числа секунд (по умолчанию 0)"
+        )
+        parser.add_argument("--interval", type=float, default=1.0, help="Пауза между попытками, сек.")
+        parser.add_argument("--migrations", action="store_true", help="Считать неприменные миграции ошибкой")
+
+    def handle(self, *args, **options):
+        deadline = time.monotonic() + options["wait"]
+        while True:
+            ok, latency, error = check_database()
+            if ok or time.monotonic() >= deadline:
+                break
+            self.stderr.write(f"БД недоступна, повтор через {options['interval']} с: {error}")
+            time.sleep(options["interval"])
+
+        if not ok:
+            raise CommandError(f"Ошибка подключения к PostgreSQL: {error}")
+        self.stdout.write(self.style.SUCCESS(f"Подключение к PostgreSQL установлено ({latency} мс)"))
+
+        if options["migrations"]:
+            pending = pending_migrations()
+            if pending:
+                raise CommandError(f"Непримененные миграции: {', '.join(pending)}")
+            self.stdout.write(self.style.SUCCESS("Все миграции применены"))
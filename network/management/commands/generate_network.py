@@ -0,0 +1,90 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from network.generator import (DEFAULT_BATCH_SIZE, DEFAULT_COUNTRIES,
+                               GEOGRAPHY, NetworkGenerator, parse_range)
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерирует синтетическую сеть для нагрузочного тестирования: заводы и их потомки до заданной "
+        "глубины, с распределениями стран, задолженности и продуктов. Одинаковые параметры и --seed "
+        "на пустой базе дают одинаковый набор данных"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--factories", type=int, default=10, help="Количество заводов (уровень 0)")
+        parser.add_argument("--depth", type=int, default=3, help="Глубина сети ниже заводов")
+        parser.add_argument("--fan-out", default="2:5", help="Потомков у звена: MIN:MAX (равномерно)")
+        parser.add_argument("--max-nodes", type=int, help="Ограничение общего числа звеньев")
+        parser.add_argument(
+            "--countries",
+            default=DEFAULT_COUNTRIES,
+            help=f"Веса стран для заводов: Страна:вес,... Доступны: {', '.join(GEOGRAPHY)}",
+        )
+        parser.add_argument(
+            "--locality", type=float, default=0.9, help="Вероятность, что звено в той же стране, что и поставщик"
+        )
+        parser.add_argument(
+            "--debt",
+            default="lognormal:10:1.5",
+            help="Распределение задолженности: zero, uniform:MIN:MAX или lognormal:MU:SIGMA",
+        )
+        parser.add_argument("--products", type=int, default=200, help="Количество создаваемых продуктов")
+        parser.add_argument("--density", type=float, default=0.05, help="Средняя доля продуктов у звена (0..1)")
+        parser.add_argument(
+            "--entrepreneur-share",
+            type=float,
+            default=0.5,
+            help="Доля ИП среди звеньев уровня 2 и ниже (ИП - конечные звенья)",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Seed генератора случайных чисел")
+        parser.add_argument("--label", default="generated", help="Метка данных (в email и артикулах продуктов)")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Размер пакета INSERT")
+
+    def handle(self, *args, **options):
+        if options["factories"] < 1 or options["depth"] < 0 or options["batch_size"] < 1:
+            raise CommandError("--factories и --batch-size должны быть положительными, --depth - неотрицательной")
+        for name in ("locality", "density", "entrepreneur_share"):
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f"--{name.replace('_', '-')} должен быть от 0 до 1")
+
+        self.started = time.perf_counter()
+        self.reported = 0
+        try:
+            generator = NetworkGenerator(
+                factories=options["factories"],
+                depth=options["depth"],
+                fan_out=parse_range(options["fan_out"]),
+                countries=options["countries"],
+                locality=options["locality"],
+                debt=options["debt"],
+                products=options["products"],
+                density=options["density"],
+                entrepreneur_share=options["entrepreneur_share"],
+                max_nodes=options["max_nodes"],
+                seed=options["seed"],
+                label=options["label"],
+                batch_size=options["batch_size"],
+                on_batch=self.progress,
+            )
+            result = generator.run()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        elapsed = time.perf_counter() - self.started
+        for level, count in enumerate(result.levels):
+            self.stdout.write(f"Уровень {level}: {count}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Создано звеньев: {result.nodes}, продуктов: {result.products}, связей с продуктами: "
+                f"{result.links} за {elapsed:.1f} с ({result.nodes / max(elapsed, 1e-9):.0f} звеньев/с)"
+            )
+        )
+
+    def progress(self, result):
+        # Не чаще чем каждые 100 000 звеньев
+        if result.nodes - self.reported >= 100000:
+            self.reported = result.nodes
+            self.stdout.write(f"... {result.nodes} звеньев, {time.perf_counter() - self.started:.0f} с")
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from network.importer import DEFAULT_BATCH_SIZE, import_network, parse_rows
+
+
+class Command(BaseCommand):
+    help = "Импортирует звенья сети и их продукты из CSV или NDJSON (все или ничего)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="Путь к файлу импорта")
+        parser.add_argument(
+            "--format",
+            dest="file_format",
+            choices=["csv", "ndjson"],
+            help="Формат файла (по умолчанию определяется по расширению)",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Только проверить файл, ничего не записывать")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Размер пакета INSERT")
+
+    def handle(self, *args, **options):
+        path = Path(options["file"])
+        if not path.exists():
+            raise CommandError(f"Файл не найден: {path}")
+
+        file_format = options["file_format"] or path.suffix.lstrip(".").lower()
+        if file_format not in ("csv", "ndjson"):
+            raise CommandError("Не удалось определить формат файла, укажите --format")
+
+        try:
+            rows = parse_rows(path.read_bytes(), file_format)
+        except ValueError as exc:
+            raise CommandError(f"Не удалось разобрать файл: {exc}")
+
+        result = import_network(rows, dry_run=options["dry_run"], batch_size=options["batch_size"])
+
+        if not result.is_valid:
+            for item in result.error_report():
+                for field, messages in item["errors"].items():
+                    for message in messages:
+                        self.stderr.write(f"Строка {item['row']}, {field}: {message}")
+            raise CommandError(f"Импорт отменен: ошибок в строках - {len(result.errors)}")
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"Проверка пройдена: строк - {len(rows)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Импортировано звеньев: {len(result.created_ids)}"))
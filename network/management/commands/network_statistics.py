@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from network.statistics import recompute, verify
+
+
+class Command(BaseCommand):
+    help = "Перестраивает или сверяет статистику сети (NetworkStatistics)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify", action="store_true", help="Только сверить статистику с данными, ничего не изменяя"
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            recompute()
+            self.stdout.write(self.style.SUCCESS("Статистика сети перестроена"))
+            return
+
+        mismatches = verify()
+        for (country, node_type, has_supplier), (stored, actual) in sorted(mismatches.items()):
+            supplier = "с поставщиком" if has_supplier else "без поставщика"
+            self.stderr.write(f"{country} / {node_type} / {supplier}: сохранено {stored}, фактически {actual}")
+        if mismatches:
+            raise CommandError(f"Расхождений: {len(mismatches)}. Запустите команду без --verify для пересчета")
+        self.stdout.write(self.style.SUCCESS("Статистика сети совпадает с данными"))
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from network.benchmarks.cases import CASES, DATASETS
+from network.benchmarks.runner import (BASELINE_PATH, DEFAULT_THRESHOLD,
+                                       REGRESSION_STATUSES, compare,
+                                       load_baseline, run_suite, save_baseline)
+
+STATUS_LABELS = {
+    "ok": "",
+    "slower": "ЗАМЕДЛЕНИЕ",
+    "faster": "быстрее",
+    "queries": "БОЛЬШЕ ЗАПРОСОВ",
+    "new": "нет в базовых",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Микробенчмарки сериализации, фильтров, проверок иерархии и прав на сгенерированных наборах данных. "
+        "Сравнивает результаты с базовыми (network/benchmarks/baseline.json) и завершается ошибкой "
+        "при замедлении сверх порога или росте числа запросов; --save обновляет базовые результаты"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dataset", action="append", dest="datasets", choices=list(DATASETS), help="Набор данных (несколько)"
+        )
+        parser.add_argument("--case", action="append", dest="cases", choices=list(CASES), help="Сценарий (несколько)")
+        parser.add_argument("--repeat", type=int, default=5, help="Повторов замера (берется лучший)")
+        parser.add_argument("--seed", type=int, default=0, help="Seed генератора наборов данных")
+        parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Файл базовых результатов")
+        parser.add_argument(
+            "--threshold", type=float, default=DEFAULT_THRESHOLD, help="Допустимое замедление (0.25 = 25%%)"
+        )
+        parser.add_argument("--save", action="store_true", help="Сохранить результаты как базовые")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat должен быть положительным")
+
+        self.stdout.write(f"{'набор':<10}{'сценарий':<22}{'мс':>11}{'медиана':>11}{'запросов':>10}")
+        results = run_suite(options["datasets"], options["cases"], options["repeat"], options["seed"], self.progress)
+
+        if options["save"]:
+            if options["datasets"] or options["cases"]:
+                # Частичный прогон дополняет базовые результаты, а не заменяет их
+                merged = (load_baseline(options["baseline"]) or {}).get("results", {})
+                for dataset, cases in results.items():
+                    merged.setdefault(dataset, {}).update(cases)
+                results = merged
+            save_baseline(results, options["baseline"], options["repeat"])
+            self.stdout.write(self.style.SUCCESS(f"Базовые результаты сохранены: {options['baseline']}"))
+            return
+
+        baseline = load_baseline(options["baseline"])
+        if baseline is None:
+            self.stdout.write(self.style.WARNING("Базовых результатов нет, сохраните их с --save"))
+            return
+
+        self.stdout.write(f"\nСравнение с {options['baseline']} (порог {options['threshold']:.0%})")
+        rows = compare(results, baseline, options["threshold"])
+        for dataset, case_name, current, base, ratio, status in rows:
+            change = f"{ratio - 1:+.0%}" if ratio is not None else ""
+            base = f"{base:.3f}" if base is not None else "-"
+            self.stdout.write(
+                f"{dataset:<10}{case_name:<22}{current:>11.3f}{base:>11}{change:>8}  {STATUS_LABELS[status]}"
+            )
+
+        regressions = [row for row in rows if row[-1] in REGRESSION_STATUSES]
+        if regressions:
+            raise CommandError(f"Регрессий: {len(regressions)}")
+        self.stdout.write(self.style.SUCCESS("Регрессий нет"))
+
+    def progress(self, dataset, case_name, result):
+        self.stdout.write(
+            f"{dataset:<10}{case_name:<22}{result['ms']:>11.3f}{result['median_ms']:>11.3f}{result['queries']:>10}"
+        )
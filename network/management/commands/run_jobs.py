@@ -0,0 +1,45 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def _worker(poll_interval, once):
+    """Точка входа процесса пула: процессы запускаются через spawn и настраивают Django сами"""
+    import django
+
+    django.setup()
+    from network.jobs import worker_loop
+
+    return worker_loop(poll_interval=poll_interval, once=once)
+
+
+class Command(BaseCommand):
+    help = "Запускает воркеры фоновых задач (пул процессов, очередь в таблице Job)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=getattr(settings, "JOB_WORKER_PROCESSES", None) or os.cpu_count(),
+            help="Количество процессов-воркеров",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Пауза при пустой очереди, сек.")
+        parser.add_argument("--once", action="store_true", help="Выполнить задачи из очереди и завершиться")
+
+    def handle(self, *args, **options):
+        processes = max(1, options["processes"])
+        self.stdout.write(f"Воркеры фоновых задач: {processes}")
+
+        # spawn, а не fork: дочерние процессы не наследуют соединения с БД родителя
+        with ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn")) as pool:
+            futures = [pool.submit(_worker, options["poll_interval"], options["once"]) for _ in range(processes)]
+            try:
+                done = sum(future.result() for future in futures)
+            except KeyboardInterrupt:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+        self.stdout.write(self.style.SUCCESS(f"Выполнено задач: {done}"))
@@ -0,0 +1,357 @@
+"""
+Метрики запросов в формате Prometheus без внешнего агента.
+
+MetricsMiddleware для каждого запроса записывает время обработки (гистограмма),
+ошибки (статус 5xx), время и число SQL-запросов с разбивкой по имени маршрута
+(networknode-list, networknode-clear-debt, home, ...) и методу. Методы вне
+стандартного набора учитываются как other, чтобы клиент не мог создавать
+новые ряды метрик произвольными методами. Middleware работает и в
+синхронном, и в асинхронном стеке (ASGI) без перехода в поток. Соединения с
+БД у каждого потока свои, а async-представления обращаются к БД из потоков
+sync_to_async, поэтому SQL учитывается обработчиком на всех соединениях,
+который находит запрос через ContextVar (контекст переходит в sync_to_async).
+
+Запись без блокировок: у каждого потока свой словарь гистограмм, в который
+пишет только он; при чтении словари всех потоков суммируются. Между
+процессами (воркеры gunicorn) метрики передаются через каталог METRICS_DIR:
+процесс не чаще раза в METRICS_FLUSH_INTERVAL секунд (и при завершении)
+атомарно перезаписывает свой файл, а /api/metrics/ суммирует файлы всех
+процессов. Файлы завершенных процессов остаются, чтобы счетчики не
+уменьшались; каталог нужно очищать при перезапуске сервиса. Без METRICS_DIR
+эндпоинт показывает метрики только обслужившего его процесса.
+
+Перцентили считаются в Prometheus по гистограмме (histogram_quantile);
+эндпоинт дополнительно отдает их оценку p50/p95/p99 тем же способом.
+"""
+
+import atexit
+import hmac
+import json
+import math
+import os
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы корзин гистограммы времени обработки, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+DEFAULT_FLUSH_INTERVAL = 10
+
+UNRESOLVED = "unresolved"  # Запросы, для которых не найден маршрут (404)
+
+KNOWN_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+OTHER_METHOD = "other"
+
+_current_timer = ContextVar("metrics_request_timer", default=None)
+
+
+class RouteMetrics:
+    """Счетчики одного маршрута и метода (корзины гистограммы не накопительные)"""
+
+    __slots__ = ("buckets", "count", "duration", "errors", "db_time", "queries")
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.duration = 0.0
+        self.errors = 0
+        self.db_time = 0.0
+        self.queries = 0
+
+    def observe(self, duration, error, db_time, queries):
+        index = 0
+        while duration > BUCKETS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.duration += duration
+        self.errors += error
+        self.db_time += db_time
+        self.queries += queries
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def add(self, data):
+        """Прибавляет счетчики другого потока или процесса (RouteMetrics или словарь из файла)"""
+        if isinstance(data, RouteMetrics):
+            data = data.as_dict()
+        self.buckets = [own + other for own, other in zip(self.buckets, data["buckets"])]
+        for name in ("count", "duration", "errors", "db_time", "queries"):
+            setattr(self, name, getattr(self, name) + data[name])
+
+
+class MetricsRegistry:
+    """Метрики процесса: словарь (маршрут, метод) -> RouteMetrics у каждого потока"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._stores = []  # Словари всех потоков, в том числе завершенных
+        self._register_lock = threading.Lock()  # Только при первой записи потока
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.started = time.time_ns()
+
+    def _store(self):
+        store = getattr(self._local, "store", None)
+        if store is None:
+            store = self._local.store = {}
+            with self._register_lock:
+                self._stores.append(store)
+        return store
+
+    def observe(self, view, method, duration, error=False, db_time=0.0, queries=0):
+        store = self._store()
+        metrics = store.get((view, method))
+        if metrics is None:
+            metrics = store[(view, method)] = RouteMetrics()
+        metrics.observe(duration, error, db_time, queries)
+
+    def snapshot(self):
+        """Сумма по потокам: {(маршрут, метод): RouteMetrics}"""
+        total = {}
+        for store in list(self._stores):
+            for key, metrics in list(store.items()):
+                total.setdefault(key, RouteMetrics()).add(metrics)
+        return total
+
+    @property
+    def path(self):
+        """Файл процесса в METRICS_DIR (None - метрики не передаются между процессами)"""
+        directory = getattr(settings, "METRICS_DIR", None)
+        if not directory:
+            return None
+        return Path(directory) / f"metrics-{os.getpid()}-{self.started}.json"
+
+    def maybe_flush(self):
+        """Сохраняет метрики процесса, если прошел METRICS_FLUSH_INTERVAL с прошлой записи"""
+        interval = getattr(settings, "METRICS_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)
+        if time.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    def flush(self):
+        path = self.path
+        # Запись идет в одном потоке; остальные в это время не ждут
+        if path is None or not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = time.monotonic()
+            entries = [
+                {"view": view, "method": method, **metrics.as_dict()}
+                for (view, method), metrics in self.snapshot().items()
+            ]
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = path.with_suffix(".tmp")
+            temporary.write_text(json.dumps(entries), encoding="utf-8")
+            os.replace(temporary, path)
+        finally:
+            self._flush_lock.release()
+
+    def collect(self):
+        """Метрики всех процессов: текущий - из памяти, остальные - из файлов METRICS_DIR"""
+        total = self.snapshot()
+        own = self.path
+        if own is None:
+            return total
+        for path in own.parent.glob("metrics-*.json"):
+            if path == own:
+                continue
+            try:
+                entries = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue  # Файл удален или процесс еще не записал его целиком
+            for entry in entries:
+                total.setdefault((entry["view"], entry["method"]), RouteMetrics()).add(entry)
+        return total
+
+
+registry = MetricsRegistry()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        registry.flush()
+    except Exception:
+        # При завершении процесса каталог метрик может быть недоступен
+        pass
+
+
+def metric_method(method):
+    """Метка метода: стандартные методы HTTP, остальные - other"""
+    return method if method in KNOWN_METHODS else OTHER_METHOD
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper всех соединений: SQL учитывается в запросе, который сейчас обрабатывается"""
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+@receiver(connection_created, dispatch_uid="network_metrics_record_query")
+def install_query_timer(sender=None, connection=connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestTimer:
+    """Время обработки и SQL одного запроса"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def observe(self, request, error):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match is not None and match.view_name else UNRESOLVED
+        duration = time.perf_counter() - self.started
+        registry.observe(view, metric_method(request.method), duration, error, self.db_time, self.queries)
+        registry.maybe_flush()
+
+
+class MetricsMiddleware:
+    """Время обработки, ошибки и SQL каждого запроса; ставится первым в MIDDLEWARE"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, "METRICS_ENABLED", True):
+            return self.get_response(request)
+
+        install_query_timer()  # Соединение потока могло открыться до загрузки модуля
+        timer = RequestTimer()
+        token = _current_timer.set(timer)
+        error = True  # Необработанное исключение - тоже ошибка
+        try:
+            response = self.get_response(request)
+            error = response.status_code >= 500
+            return response
+        finally:
+            _current_timer.reset(token)
+            timer.observe(request, error)
+
+    async def __acall__(self, request):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            return await self.get_response(request)
+
+        timer = RequestTimer()
+        token = _current_timer.set(timer)
+        error = True
+        try:
+            response = await self.get_response(request)
+            error = response.status_code >= 500
+            return response
+        finally:
+            _current_timer.reset(token)
+            timer.observe(request, error)
+
+
+def estimate_quantile(quantile, buckets):
+    """
+    Оценка квантиля по корзинам гистограммы (не накопительным) линейной
+    интерполяцией внутри корзины, как histogram_quantile в Prometheus
+    """
+    count = sum(buckets)
+    if not count:
+        return None
+    rank = quantile * count
+    seen = 0
+    for index, bucket in enumerate(buckets):
+        if seen + bucket >= rank and bucket:
+            upper = BUCKETS[index]
+            lower = BUCKETS[index - 1] if index else 0.0
+            if math.isinf(upper):
+                return lower  # Выше последней конечной границы оценки нет
+            return lower + (upper - lower) * (rank - seen) / bucket
+        seen += bucket
+    return BUCKETS[-2]
+
+
+def label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_number(value):
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(metrics):
+    """Текстовый формат Prometheus (0.0.4) для {(маршрут, метод): RouteMetrics}"""
+    routes = sorted(metrics.items())
+    histogram = "electrochain_http_request_duration_seconds"
+    lines = [f"# HELP {histogram} Время обработки запроса", f"# TYPE {histogram} histogram"]
+    for (view, method), route in routes:
+        labels = f'view="{label_value(view)}",method="{label_value(method)}"'
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS, route.buckets):
+            cumulative += bucket
+            lines.append(f'{histogram}_bucket{{{labels},le="{format_number(bound)}"}} {cumulative}')
+        lines.append(f"{histogram}_sum{{{labels}}} {format_number(route.duration)}")
+        lines.append(f"{histogram}_count{{{labels}}} {route.count}")
+
+    families = (
+        ("electrochain_http_request_duration_quantile_seconds", "gauge", "Оценка p50/p95/p99 по корзинам", None),
+        ("electrochain_http_requests_total", "counter", "Число запросов", "count"),
+        ("electrochain_http_request_errors_total", "counter", "Ответы 5xx и необработанные исключения", "errors"),
+        ("electrochain_http_request_db_seconds_total", "counter", "Суммарное время SQL-запросов", "db_time"),
+        ("electrochain_http_request_db_queries_total", "counter", "Число SQL-запросов", "queries"),
+    )
+    for name, kind, description, attribute in families:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (view, method), route in routes:
+            labels = f'view="{label_value(view)}",method="{label_value(method)}"'
+            if attribute is not None:
+                lines.append(f"{name}{{{labels}}} {format_number(getattr(route, attribute))}")
+                continue
+            for quantile in QUANTILES:
+                value = estimate_quantile(quantile, route.buckets)
+                if value is not None:
+                    lines.append(f'{name}{{{labels},quantile="{quantile}"}} {format_number(float(value))}')
+    return "\n".join(lines) + "\n"
+
+
+def prometheus_text():
+    """Метрики всех процессов в текстовом формате Prometheus"""
+    return render_prometheus(registry.collect())
+
+
+def has_metrics_access(request):
+    """Bearer-токен METRICS_TOKEN (для Prometheus) или сессия сотрудника с is_staff"""
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return True
+    return request.user.is_authenticated and request.user.is_staff
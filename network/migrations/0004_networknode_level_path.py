@@ -0,0 +1,63 @@
+# Generated by Django 6.0.2 on 2026-10-17 00:52
+
+from collections import deque
+
+from django.db import migrations, models
+
+
+def populate_hierarchy(apps, schema_editor):
+    # Копия network.hierarchy.rebuild_hierarchy на момент миграции: код приложения может меняться
+    NetworkNode = apps.get_model("network", "NetworkNode")
+    children = {}
+    for pk, supplier_id in NetworkNode.objects.values_list("pk", "supplier_id").iterator():
+        children.setdefault(supplier_id, []).append(pk)
+
+    updated = []
+    queue = deque((pk, "", 0) for pk in children.get(None, []))
+    while queue:
+        pk, path, level = queue.popleft()
+        updated.append(NetworkNode(pk=pk, path=path, level=level))
+        queue.extend((child_pk, f"{path}{pk}/", level + 1) for child_pk in children.get(pk, []))
+
+    NetworkNode.objects.bulk_update(updated, ["path", "level"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0003_employee"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="networknode",
+            name="level",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="0 - завод или звено без поставщика",
+                verbose_name="Уровень иерархии",
+            ),
+        ),
+        migrations.AddField(
+            model_name="networknode",
+            name="path",
+            field=models.CharField(
+                blank=True,
+                default="",
+                editable=False,
+                help_text="Цепочка id поставщиков от корня, например 1/5/",
+                max_length=2048,
+                verbose_name="Путь в иерархии",
+            ),
+        ),
+        migrations.RunPython(populate_hierarchy, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="networknode",
+            index=models.Index(fields=["level"], name="network_net_level_be3a35_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="networknode",
+            index=models.Index(fields=["path"], name="network_node_path_like_idx", opclasses=["varchar_pattern_ops"]),
+        ),
+    ]
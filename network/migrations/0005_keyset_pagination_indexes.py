@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-17 01:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0004_networknode_level_path"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="networknode",
+            index=models.Index(fields=["name", "id"], name="network_node_name_keyset"),
+        ),
+        migrations.AddIndex(
+            model_name="networknode",
+            index=models.Index(fields=["debt", "id"], name="network_node_debt_keyset"),
+        ),
+        migrations.AddIndex(
+            model_name="networknode",
+            index=models.Index(fields=["created_at", "id"], name="network_node_created_keyset"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["release_date", "id"], name="product_release_keyset_idx"),
+        ),
+    ]
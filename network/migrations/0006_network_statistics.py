@@ -0,0 +1,77 @@
+# Generated by Django 6.0.2 on 2026-10-17 01:11
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q, Sum
+
+
+def populate_statistics(apps, schema_editor):
+    # Копия network.statistics.compute_groups на момент миграции: код приложения может меняться
+    NetworkNode = apps.get_model("network", "NetworkNode")
+    NetworkStatistics = apps.get_model("network", "NetworkStatistics")
+    rows = (
+        NetworkNode.objects.annotate(
+            has_supplier=ExpressionWrapper(Q(supplier__isnull=False), output_field=BooleanField())
+        )
+        .values("country", "node_type", "has_supplier")
+        .annotate(node_count=Count("id"), total_debt=Sum("debt"))
+        .order_by()
+    )
+    NetworkStatistics.objects.bulk_create(
+        NetworkStatistics(
+            country=row["country"],
+            node_type=row["node_type"],
+            has_supplier=row["has_supplier"],
+            node_count=row["node_count"],
+            total_debt=row["total_debt"] or Decimal(0),
+        )
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0005_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NetworkStatistics",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("country", models.CharField(max_length=100, verbose_name="Страна")),
+                (
+                    "node_type",
+                    models.CharField(
+                        choices=[
+                            ("factory", "Завод"),
+                            ("retail_network", "Розничная сеть"),
+                            ("individual_entrepreneur", "Индивидуальный предприниматель"),
+                        ],
+                        max_length=30,
+                        verbose_name="Тип звена",
+                    ),
+                ),
+                ("has_supplier", models.BooleanField(verbose_name="Есть поставщик")),
+                ("node_count", models.IntegerField(default=0, verbose_name="Количество звеньев")),
+                (
+                    "total_debt",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=20, verbose_name="Суммарная задолженность"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика сети",
+                "verbose_name_plural": "Статистика сети",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("country", "node_type", "has_supplier"), name="network_statistics_group"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 6.0.2 on 2026-10-17 01:21
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0006_network_statistics"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("clear_debt", "Очистка задолженности"),
+                            ("import_nodes", "Импорт звеньев"),
+                            ("rebuild_hierarchy", "Пересчет иерархии"),
+                            ("rebuild_statistics", "Пересчет статистики"),
+                        ],
+                        max_length=30,
+                        verbose_name="Тип задачи",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "В очереди"),
+                            ("running", "Выполняется"),
+                            ("succeeded", "Выполнена"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "params",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                        verbose_name="Параметры",
+                    ),
+                ),
+                (
+                    "result",
+                    models.JSONField(
+                        blank=True,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                        null=True,
+                        verbose_name="Результат",
+                    ),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Ошибка")),
+                ("processed", models.PositiveIntegerField(default=0, verbose_name="Обработано")),
+                ("total", models.PositiveIntegerField(blank=True, null=True, verbose_name="Всего")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Создана")),
+                ("started_at", models.DateTimeField(blank=True, null=True, verbose_name="Начата")),
+                ("finished_at", models.DateTimeField(blank=True, null=True, verbose_name="Завершена")),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="network_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Автор",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Фоновая задача",
+                "verbose_name_plural": "Фоновые задачи",
+                "ordering": ["-created_at"],
+                "indexes": [models.Index(fields=["status", "created_at"], name="network_job_queue_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 6.0.2 on 2026-10-17 01:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+# Триграммные индексы для поиска с опечатками и для icontains (Django строит UPPER(...) LIKE)
+TRIGRAM_INDEXES = {
+    "network_node_name_trgm_idx": ("network_networknode", "name gin_trgm_ops"),
+    "network_node_city_trgm_idx": ("network_networknode", "UPPER(city) gin_trgm_ops"),
+    "product_name_trgm_idx": ("network_product", "name gin_trgm_ops"),
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """pg_trgm необязателен: без расширения остается только полнотекстовый поиск"""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, (table, expression) in TRIGRAM_INDEXES.items():
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({expression})")
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0007_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="networknode",
+            name="search_vector",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.contrib.postgres.search.CombinedSearchVector(
+                    django.contrib.postgres.search.CombinedSearchVector(
+                        django.contrib.postgres.search.CombinedSearchVector(
+                            django.contrib.postgres.search.SearchVector("name", config="simple", weight="A"),
+                            "||",
+                            django.contrib.postgres.search.SearchVector("email", config="simple", weight="B"),
+                            django.contrib.postgres.search.SearchConfig("simple"),
+                        ),
+                        "||",
+                        django.contrib.postgres.search.SearchVector("city", "country", config="simple", weight="C"),
+                        django.contrib.postgres.search.SearchConfig("simple"),
+                    ),
+                    "||",
+                    django.contrib.postgres.search.SearchVector("street", "phone", config="simple", weight="D"),
+                    django.contrib.postgres.search.SearchConfig("simple"),
+                ),
+                output_field=django.contrib.postgres.search.SearchVectorField(),
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.contrib.postgres.search.CombinedSearchVector(
+                    django.contrib.postgres.search.CombinedSearchVector(
+                        django.contrib.postgres.search.SearchVector("name", config="simple", weight="A"),
+                        "||",
+                        django.contrib.postgres.search.SearchVector("model", config="simple", weight="B"),
+                        django.contrib.postgres.search.SearchConfig("simple"),
+                    ),
+                    "||",
+                    django.contrib.postgres.search.SearchVector("description", config="simple", weight="C"),
+                    django.contrib.postgres.search.SearchConfig("simple"),
+                ),
+                output_field=django.contrib.postgres.search.SearchVectorField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="networknode",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["search_vector"], name="network_node_search_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["search_vector"], name="product_search_idx"),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
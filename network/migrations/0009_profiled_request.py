@@ -0,0 +1,54 @@
+# Generated by Django 6.0.2 on 2026-10-17 02:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0008_search_vectors"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProfiledRequest",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("method", models.CharField(max_length=10, verbose_name="Метод")),
+                ("path", models.CharField(max_length=500, verbose_name="Адрес")),
+                ("view_name", models.CharField(blank=True, max_length=200, verbose_name="Маршрут")),
+                (
+                    "profiler",
+                    models.CharField(
+                        choices=[("cprofile", "cProfile (детерминированный)"), ("sample", "Сэмплирование стеков")],
+                        max_length=20,
+                        verbose_name="Профилировщик",
+                    ),
+                ),
+                ("status_code", models.PositiveSmallIntegerField(blank=True, null=True, verbose_name="Статус ответа")),
+                ("duration_ms", models.FloatField(verbose_name="Длительность, мс")),
+                ("samples", models.PositiveIntegerField(blank=True, null=True, verbose_name="Снято стеков")),
+                ("artifact", models.BinaryField(verbose_name="Профиль")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Создан")),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="network_profiles",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Автор",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Профиль запроса",
+                "verbose_name_plural": "Профили запросов",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
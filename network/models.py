@@ -1,8 +1,25 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import connection, models, transaction
 from django.utils import timezone
 
+from .hierarchy import child_path, move_subtree, path_ids, validate_supplier
+from .statistics import STATISTICS_FIELDS, record_node_save
+
+SEARCH_CONFIG = "simple"  # Без стемминга: названия, email и адреса на русском и латинице
+
+
+def search_vector(*weighted_fields):
+    """Взвешенный tsvector по группам полей: ("A", "name"), ("B", "email", ...)"""
+    vectors = [SearchVector(*fields, weight=weight, config=SEARCH_CONFIG) for weight, *fields in weighted_fields]
+    combined = vectors[0]
+    for vector in vectors[1:]:
+        combined = combined + vector
+    return combined
+
 
 class Product(models.Model):
     """Модель продукта/товара с требованиями из ТЗ"""
@@ -24,11 +41,23 @@ class Product(models.Model):
         help_text="Цена в рублях",
     )
 
+    # Полнотекстовый поиск (вычисляется СУБД при записи строки)
+    search_vector = models.GeneratedField(
+        expression=search_vector(("A", "name"), ("B", "model"), ("C", "description")),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
     class Meta:
         verbose_name = "Продукт"
         verbose_name_plural = "Продукты"
         ordering = ["name", "model"]
         constraints = [models.UniqueConstraint(fields=["name", "model"], name="unique_product_name_model")]
+        indexes = [
+            # Ключ курсорной пагинации при сортировке по дате выхода
+            models.Index(fields=["release_date", "id"], name="product_release_keyset_idx"),
+            GinIndex(fields=["search_vector"], name="product_search_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.model} ({self.release_date.year})"
@@ -40,6 +69,14 @@ class Product(models.Model):
         return self.release_date > six_months_ago
 
 
+def _fetch_for_share(queryset):
+    """Первая строка values_list() с блокировкой FOR SHARE (select_for_update() умеет только FOR UPDATE)"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"{sql} FOR SHARE", params)
+        return cursor.fetchone()
+
+
 class NetworkNode(models.Model):
     """Модель звена сети с полным соответствием требованиям ТЗ"""
 
@@ -67,6 +104,19 @@ class NetworkNode(models.Model):
         help_text="Вышестоящее звено в цепочке поставок",
     )
 
+    # Материализованная иерархия (поддерживается в save() и network.hierarchy)
+    level = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Уровень иерархии", help_text="0 - завод или звено без поставщика"
+    )
+    path = models.CharField(
+        max_length=2048,
+        default="",
+        blank=True,
+        editable=False,
+        verbose_name="Путь в иерархии",
+        help_text="Цепочка id поставщиков от корня, например 1/5/",
+    )
+
     # === 4. КОНТАКТЫ ===
     email = models.EmailField(unique=True, verbose_name="Электронная почта", help_text="Контактный email для связи")
 
@@ -116,6 +166,13 @@ class NetworkNode(models.Model):
         auto_now=True, verbose_name="Время последнего обновления"  # Автоматически при обновлении
     )
 
+    # Полнотекстовый поиск (вычисляется СУБД при записи строки)
+    search_vector = models.GeneratedField(
+        expression=search_vector(("A", "name"), ("B", "email"), ("C", "city", "country"), ("D", "street", "phone")),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
     class Meta:
         verbose_name = "Звено сети"
         verbose_name_plural = "Звенья сети"
@@ -126,26 +183,42 @@ class NetworkNode(models.Model):
             models.Index(fields=["country"]),
             models.Index(fields=["created_at"]),
             models.Index(fields=["supplier"]),
+            models.Index(fields=["level"]),
+            models.Index(fields=["path"], name="network_node_path_like_idx", opclasses=["varchar_pattern_ops"]),
+            # Ключи курсорной пагинации (поле сортировки + id)
+            models.Index(fields=["name", "id"], name="network_node_name_keyset"),
+            models.Index(fields=["debt", "id"], name="network_node_debt_keyset"),
+            models.Index(fields=["created_at", "id"], name="network_node_created_keyset"),
+            GinIndex(fields=["search_vector"], name="network_node_search_idx"),
         ]
 
     def __str__(self):
         return f"{self.get_node_type_display()}: {self.name}"
 
     @property
-    def level(self):
+    def children_path(self):
+        """Путь, который хранится у непосредственных потомков звена"""
+        return child_path(self.path, self.pk)
+
+    def get_descendants(self, max_depth=None):
         """
-        Динамически вычисляет уровень иерархии.
-        0 - Завод (у него нет поставщика)
-        1 - Прямой поставщик от завода
-        2 - Второй уровень и т.д.
+        Все звенья, которые снабжаются данным звеном напрямую или через посредников.
+        Один индексный запрос по path; depth - расстояние от данного звена.
         """
-        if not hasattr(self, "_level_cache"):
-            if self.supplier is None:
-                self._level_cache = 0
-            else:
-                # Используем рекурсию с кешированием через БД
-                self._level_cache = self.supplier.level + 1
-        return self._level_cache
+        queryset = NetworkNode.objects.filter(path__startswith=self.children_path)
+        if max_depth is not None:
+            queryset = queryset.filter(level__lte=self.level + max_depth)
+        return queryset.annotate(depth=models.F("level") - self.level).order_by("level", "name", "id")
+
+    def get_ancestors(self, max_depth=None):
+        """
+        Цепочка поставщиков от ближайшего до корневого (завода).
+        Id предков берутся из path, поэтому достаточно одного запроса.
+        """
+        queryset = NetworkNode.objects.filter(pk__in=path_ids(self.path))
+        if max_depth is not None:
+            queryset = queryset.filter(level__gte=self.level - max_depth)
+        return queryset.annotate(depth=models.Value(self.level) - models.F("level")).order_by("-level")
 
     @property
     def full_address(self):
@@ -169,28 +242,85 @@ class NetworkNode(models.Model):
         from django.core.exceptions import ValidationError
 
         # Завод не может иметь поставщика
-        if self.node_type == self.NodeType.FACTORY and self.supplier:
+        if self.node_type == self.NodeType.FACTORY and self.supplier_id:
             raise ValidationError({"supplier": "Завод не может иметь поставщика!"})
 
-        # Проверка циклических ссылок
-        if self.pk and self.supplier:
-            visited = set()
-            current = self.supplier
-
-            while current:
-                if current.pk == self.pk:
-                    raise ValidationError({"supplier": "Обнаружена циклическая ссылка в цепочке поставщиков!"})
-                if current in visited:
-                    break
-                visited.add(current)
-                current = current.supplier
+        # Проверка циклических ссылок (один запрос независимо от глубины цепочки)
+        validate_supplier(self.pk, self.supplier_id)
 
         super().clean()
 
     def save(self, *args, **kwargs):
-        """Переопределяем save для дополнительной валидации"""
+        """Переопределяем save для дополнительной валидации и поддержки иерархии"""
         self.full_clean()  # Вызываем clean метод
-        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get("update_fields")
+        updates_hierarchy = update_fields is None or "supplier" in update_fields
+        updates_statistics = update_fields is None or not set(STATISTICS_FIELDS).isdisjoint(update_fields)
+        if not updates_hierarchy and not updates_statistics:
+            super().save(*args, **kwargs)
+            return
+
+        if update_fields is not None and updates_hierarchy:
+            kwargs["update_fields"] = set(update_fields) | {"path", "level"}
+
+        with transaction.atomic():
+            # Сохраненная строка звена читается с FOR UPDATE: параллельное сохранение того же звена ждет,
+            # иначе дельты статистики учли бы старое значение дважды. Поставщику достаточно FOR SHARE:
+            # его path и level не меняются до конца сохранения, а соседние звенья сохраняются параллельно.
+            # Блокировки берутся по порядку pk.
+            old_row = supplier_row = None
+            supplier_id = self.supplier_id if updates_hierarchy else None
+            for pk in sorted(pk for pk in (self.pk, supplier_id) if pk is not None):
+                if pk == self.pk:
+                    old_row = (
+                        NetworkNode.objects.filter(pk=pk)
+                        .select_for_update()
+                        .values_list("path", "level", "country", "node_type", "supplier_id", "debt")
+                        .first()
+                    )
+                else:
+                    supplier_row = _fetch_for_share(NetworkNode.objects.filter(pk=pk).values_list("path", "level"))
+
+            if updates_hierarchy:
+                if self.supplier_id is None:
+                    self.path, self.level = "", 0
+                else:
+                    supplier_path, supplier_level = supplier_row
+                    self.path, self.level = child_path(supplier_path, self.supplier_id), supplier_level + 1
+
+            super().save(*args, **kwargs)
+
+            if updates_statistics:
+                record_node_save(self, old_row[2:] if old_row else None, update_fields)
+
+            if updates_hierarchy and old_row and old_row[0] != self.path:
+                move_subtree(NetworkNode, self.pk, old_row[0], self.path)
+
+
+class NetworkStatistics(models.Model):
+    """
+    Статистика звеньев по группам (страна, тип, есть ли поставщик).
+    Поддерживается инкрементально модулем network.statistics.
+    """
+
+    country = models.CharField(max_length=100, verbose_name="Страна")
+    node_type = models.CharField(max_length=30, choices=NetworkNode.NodeType.choices, verbose_name="Тип звена")
+    has_supplier = models.BooleanField(verbose_name="Есть поставщик")
+    node_count = models.IntegerField(default=0, verbose_name="Количество звеньев")
+    total_debt = models.DecimalField(
+        max_digits=20, decimal_places=2, default=0, verbose_name="Суммарная задолженность"
+    )
+
+    class Meta:
+        verbose_name = "Статистика сети"
+        verbose_name_plural = "Статистика сети"
+        constraints = [
+            models.UniqueConstraint(fields=["country", "node_type", "has_supplier"], name="network_statistics_group")
+        ]
+
+    def __str__(self):
+        return f"{self.country} / {self.get_node_type_display()}: {self.node_count}"
 
 
 class Employee(models.Model):
@@ -235,3 +365,83 @@ class Employee(models.Model):
         """Обновляет дату последнего входа"""
         self.last_login_date = timezone.now()
         self.save(update_fields=["last_login_date"])
+
+
+class Job(models.Model):
+    """Фоновая задача для долгих массовых операций (выполняется командой run_jobs)"""
+
+    class Kind(models.TextChoices):
+        CLEAR_DEBT = "clear_debt", "Очистка задолженности"
+        IMPORT_NODES = "import_nodes", "Импорт звеньев"
+        REBUILD_HIERARCHY = "rebuild_hierarchy", "Пересчет иерархии"
+        REBUILD_STATISTICS = "rebuild_statistics", "Пересчет статистики"
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "В очереди"
+        RUNNING = "running", "Выполняется"
+        SUCCEEDED = "succeeded", "Выполнена"
+        FAILED = "failed", "Ошибка"
+
+    kind = models.CharField(max_length=30, choices=Kind.choices, verbose_name="Тип задачи")
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING, verbose_name="Статус")
+    params = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder, verbose_name="Параметры")
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name="Результат")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    processed = models.PositiveIntegerField(default=0, verbose_name="Обработано")
+    total = models.PositiveIntegerField(null=True, blank=True, verbose_name="Всего")
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="network_jobs", verbose_name="Автор"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начата")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершена")
+    # Воркер обновляет во время выполнения; задача без сигнала дольше JOB_STALE_TIMEOUT считается брошенной
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Последний сигнал воркера")
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ["-created_at"]
+        indexes = [
+            # Выбор следующей задачи воркером: status = pending ORDER BY created_at
+            models.Index(fields=["status", "created_at"], name="network_job_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def progress(self):
+        """Прогресс в процентах (None, если объем заранее неизвестен)"""
+        if not self.total:
+            return 100 if self.status == self.Status.SUCCEEDED else None
+        return min(100, round(self.processed * 100 / self.total))
+
+
+class ProfiledRequest(models.Model):
+    """Профиль одного запроса, снятый по заголовку X-Profile суперпользователя (network/profiling.py)"""
+
+    class Profiler(models.TextChoices):
+        CPROFILE = "cprofile", "cProfile (детерминированный)"
+        SAMPLE = "sample", "Сэмплирование стеков"
+
+    method = models.CharField(max_length=10, verbose_name="Метод")
+    path = models.CharField(max_length=500, verbose_name="Адрес")
+    view_name = models.CharField(max_length=200, blank=True, verbose_name="Маршрут")
+    profiler = models.CharField(max_length=20, choices=Profiler.choices, verbose_name="Профилировщик")
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Статус ответа")
+    duration_ms = models.FloatField(verbose_name="Длительность, мс")
+    samples = models.PositiveIntegerField(null=True, blank=True, verbose_name="Снято стеков")
+    artifact = models.BinaryField(verbose_name="Профиль")
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="network_profiles", verbose_name="Автор"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
+
+    class Meta:
+        verbose_name = "Профиль запроса"
+        verbose_name_plural = "Профили запросов"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.get_profiler_display()}, {self.duration_ms:.0f} мс)"
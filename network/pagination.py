@@ -0,0 +1,208 @@
+"""
+Курсорная (keyset) пагинация.
+
+Включается явно: если клиент не передал page_size или cursor, список
+возвращается целиком, как раньше. Страница выбирается условием
+WHERE (name, id) > (последнее значение), а не OFFSET, поэтому стоимость
+запроса не зависит от того, насколько далеко клиент пролистал список.
+"""
+
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по составному ключу сортировки.
+
+    Сортировка берется из запроса (OrderingFilter уже применил ее к queryset),
+    иначе используется ordering пагинатора. К ней добавляется уникальное поле,
+    чтобы ключ однозначно определял позицию даже при одинаковых значениях
+    (например, одинаковая задолженность).
+    """
+
+    ordering = ("id",)
+    ordering_is_unique = False  # Однозначна ли ordering без добавления unique_field
+    unique_field = "id"
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    default_page_size = 100
+    max_page_size = 1000
+    invalid_cursor_message = "Некорректный курсор."
+
+    def get_page_size(self, request):
+        """Размер страницы или None, если клиент не включал пагинацию"""
+        raw_size = request.query_params.get(self.page_size_query_param)
+        if raw_size is None:
+            return self.default_page_size if self.cursor_query_param in request.query_params else None
+        try:
+            page_size = int(raw_size)
+        except ValueError:
+            return self.default_page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by)
+        if not ordering or not all(isinstance(field, str) for field in ordering):
+            ordering = list(self.ordering)
+            if self.ordering_is_unique:
+                return ordering
+        if self.unique_field not in [field.lstrip("-") for field in ordering]:
+            # Направление совпадает с первым полем, чтобы индекс (поле, id) читался в одну сторону
+            direction = "-" if ordering[0].startswith("-") else ""
+            ordering.append(f"{direction}{self.unique_field}")
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.page_queryset(queryset, request)
+        if page_queryset is None:
+            return None
+        return self.page_results(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """То же для асинхронных представлений (чтение через async ORM)"""
+        page_queryset = self.page_queryset(queryset, request)
+        if page_queryset is None:
+            return None
+        return self.page_results([obj async for obj in page_queryset])
+
+    def page_queryset(self, queryset, request):
+        """Запрос страницы (page_size + 1 строк) или None, если пагинация не включена"""
+        self.page_size = self.get_page_size(request)
+        if self.page_size is None:
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_ordering = self.get_ordering(queryset)
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+
+        values, self.reverse = self.decode_cursor(request)
+        self.has_cursor = values is not None
+        ordering = [self.reverse_field(field) for field in self.page_ordering] if self.reverse else self.page_ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.after_q(ordering, values))
+        return queryset[: self.page_size + 1]
+
+    def page_results(self, results):
+        """Обрезает лишнюю строку и запоминает ключи соседних страниц"""
+        reverse = self.reverse
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        # Ссылки на соседние страницы
+        self.next_values = self.previous_values = None
+        if results:
+            if has_more or reverse:
+                self.next_values = self.row_values(results[-1])
+            if (has_more and reverse) or (self.has_cursor and not reverse):
+                self.previous_values = self.row_values(results[0])
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.build_link(self.next_values, reverse=False)),
+                    ("previous", self.build_link(self.previous_values, reverse=True)),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    @staticmethod
+    def reverse_field(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def after_q(ordering, values):
+        """
+        Условие "строго после позиции" для составного ключа:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        Первый член использует индекс по первому полю сортировки.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    def row_values(self, obj):
+        if isinstance(obj, dict):  # Строка values() (быстрая сериализация списков)
+            return [obj[field.lstrip("-")] for field in self.page_ordering]
+        return [getattr(obj, field.lstrip("-")) for field in self.page_ordering]
+
+    def encode_cursor(self, values, reverse):
+        payload = {
+            "o": self.page_ordering,
+            "v": [None if value is None else str(value) for value in values],
+            "r": int(reverse),
+        }
+        return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if payload["o"] != self.page_ordering:
+                raise ValueError("Курсор построен для другой сортировки")
+            values = [
+                self.field_for(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.page_ordering, payload["v"], strict=True)
+            ]
+            return values, bool(payload["r"])
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def field_for(self, name):
+        """Поле модели или аннотации (например, search_rank) для разбора значения курсора"""
+        if name in self.annotations:
+            return self.annotations[name].output_field
+        return self.model._meta.get_field(name)
+
+    def build_link(self, values, reverse):
+        if values is None:
+            return None
+        url = replace_query_param(self.base_url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values, reverse))
+
+
+class NetworkNodeKeysetPagination(KeysetPagination):
+    """Звенья сети: по умолчанию (name, id)"""
+
+    ordering = ("name", "id")
+    ordering_is_unique = True
+
+
+class ProductKeysetPagination(KeysetPagination):
+    """Продукты: по умолчанию (name, model) - уникальная пара по ограничению модели"""
+
+    ordering = ("name", "model")
+    ordering_is_unique = True
@@ -1,6 +1,7 @@
 from rest_framework import permissions
 
-from .models import Employee
+from .access import get_access_context
+from .activity import last_seen
 
 
 class IsActiveEmployee(permissions.BasePermission):
@@ -27,24 +28,22 @@ class IsActiveEmployee(permissions.BasePermission):
         if request.user.is_superuser:
             return True
 
-        try:
-            # Получаем профиль сотрудника
-            employee = request.user.employee_profile
+        context = get_access_context(request)
 
-            # Проверяем, активен ли сотрудник
-            if not employee.is_active:
-                self.message = "Ваш аккаунт сотрудника деактивирован. Обратитесь к администратору."
-                return False
+        # Если у пользователя нет профиля сотрудника
+        if not context.has_profile:
+            self.message = "Профиль сотрудника не найден. Обратитесь к администратору."
+            return False
 
-            # Обновляем дату последнего входа
-            employee.update_last_login()
+        # Проверяем, активен ли сотрудник
+        if not context.is_active:
+            self.message = "Ваш аккаунт сотрудника деактивирован. Обратитесь к администратору."
+            return False
 
-            return True
+        # Отмечаем активность (запись в БД выполняется отложенно)
+        last_seen.touch(context.employee)
 
-        except Employee.DoesNotExist:
-            # Если у пользователя нет профиля сотрудника
-            self.message = "Профиль сотрудника не найден. Обратитесь к администратору."
-            return False
+        return True
 
 
 class IsAdminOrReadOnlyForEmployees(permissions.BasePermission):
@@ -79,31 +78,9 @@ class DepartmentPermission(permissions.BasePermission):
             return True
 
         # Проверяем профиль сотрудника
-        try:
-            employee = request.user.employee_profile
-
-            if not employee.is_active:
-                return False
-
-            # Разные отделы - разные права
-            department = employee.department.lower()
-
-            # Администраторы - полный доступ
-            if department in ["администрация", "administration", "руководство"]:
-                return True
-
-            # Отдел продаж - доступ к сети и продуктам
-            elif department in ["продажи", "sales", "торговый отдел"]:
-                # Разрешаем все методы кроме DELETE
-                return request.method != "DELETE"
-
-            # Отдел аналитики - только чтение
-            elif department in ["аналитика", "analytics", "отдел анализа"]:
-                return request.method in permissions.SAFE_METHODS
-
-            # Остальные - только безопасные методы
-            else:
-                return request.method in permissions.SAFE_METHODS
-
-        except Employee.DoesNotExist:
+        context = get_access_context(request)
+        if not context.has_profile or not context.is_active:
             return False
+
+        # Разные отделы - разные права (см. access.DEPARTMENT_POLICIES)
+        return context.allows_method(request.method)
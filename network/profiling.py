@@ -0,0 +1,264 @@
+"""
+Профилирование отдельных запросов по требованию суперпользователя.
+
+Запрос с заголовком "X-Profile: cprofile" или "X-Profile: sample" (или
+параметром ?_profile=...) от суперпользователя выполняется под
+профилировщиком, профиль сохраняется в ProfiledRequest и доступен в админке
+("Профили запросов") для скачивания; ответ получает заголовок X-Profile-Id.
+
+- cprofile - детерминированный cProfile: каждый вызов функции, файл pstats
+  (pstats.Stats, snakeviz). Точные числа вызовов, но код замедляется. В
+  процессе одновременно работает один cProfile (на Python 3.12+ второй не
+  запускается), поэтому параллельный запрос с cprofile получает 409.
+- sample - фоновый поток раз в REQUEST_PROFILER_INTERVAL секунд снимает стек
+  потока запроса; результат - свернутые стеки (flamegraph.pl) или формат
+  speedscope. Замедление мало, короткие функции могут не попасть в выборку.
+
+Профилируется поток, в котором выполняется middleware. Под ASGI это поток
+цикла событий: в профиль попадает код async-представления, но и другие
+запросы, выполняющиеся в нем в это же время, а запросы к БД из
+sync_to_async - нет. Чтение потоковых ответов (export) после выхода из
+middleware в профиль не попадает. Для остальных запросов middleware только
+проверяет заголовок и параметр, в синхронном и асинхронном стеке.
+"""
+
+import cProfile
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.http import JsonResponse
+
+PROFILE_HEADER = "HTTP_X_PROFILE"
+PROFILE_PARAM = "_profile"
+
+DEFAULT_INTERVAL = 0.005  # Чаще не имеет смысла: поток запроса отдает GIL раз в sys.getswitchinterval()
+DEFAULT_KEEP = 200
+
+# Форматы выгрузки: профилировщик -> {формат: (тип содержимого, расширение файла)}
+ARTIFACT_FORMATS = {
+    "cprofile": {"pstats": ("application/octet-stream", "pstats")},
+    "sample": {
+        "speedscope": ("application/json", "speedscope.json"),
+        "collapsed": ("text/plain; charset=utf-8", "collapsed.txt"),
+    },
+}
+
+_cprofile_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """cProfile уже работает для другого запроса процесса"""
+
+
+class CProfileRun:
+    """cProfile на время запроса; результат - файл pstats"""
+
+    def start(self):
+        if not _cprofile_lock.acquire(blocking=False):
+            raise ProfilerBusy
+        try:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        except BaseException:
+            _cprofile_lock.release()
+            raise
+
+    def stop(self):
+        """(артефакт, число снимков)"""
+        try:
+            self.profile.disable()
+        finally:
+            _cprofile_lock.release()
+        self.profile.create_stats()
+        # Формат файла pstats: marshal словаря статистики (как Stats.dump_stats)
+        return marshal.dumps(self.profile.stats), None
+
+
+class StackSampler:
+    """Сэмплирующий профилировщик: стек потока thread_id раз в interval секунд из фонового потока"""
+
+    def __init__(self, thread_id=None, interval=DEFAULT_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """(свернутые стеки, число снимков)"""
+        self._stop.set()
+        self._thread.join()
+        return self.collapsed().encode(), self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def collapsed(self):
+        """Свернутые стеки: "корень;...;лист число" в строке"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame):
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def collapsed_to_speedscope(collapsed, name, sample_ms):
+    """Свернутые стеки -> файл speedscope (профиль типа sampled, вес стека - sample_ms на снимок)"""
+    frames, index, samples, weights = [], {}, [], []
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(" ")
+        sample = []
+        for frame in stack.split(";"):
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame})
+            sample.append(index[frame])
+        samples.append(sample)
+        weights.append(int(count) * sample_ms)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "electrochain",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+        ],
+    }
+
+
+def render_artifact(profile, artifact_format):
+    """Профиль в формате выгрузки: (содержимое, тип содержимого, имя файла)"""
+    content_type, extension = ARTIFACT_FORMATS[profile.profiler][artifact_format]
+    content = bytes(profile.artifact)
+    if artifact_format == "speedscope":
+        # Фактический период снимков: поток запроса отдает GIL не чаще sys.getswitchinterval()
+        sample_ms = profile.duration_ms / profile.samples if profile.samples else 0
+        data = collapsed_to_speedscope(content.decode(), str(profile), sample_ms)
+        content = json.dumps(data, ensure_ascii=False).encode()
+    return content, content_type, f"profile-{profile.pk}.{extension}"
+
+
+def profiler_interval():
+    return getattr(settings, "REQUEST_PROFILER_INTERVAL", DEFAULT_INTERVAL)
+
+
+def requested_profiler(request):
+    """Профилировщик из заголовка X-Profile или параметра _profile (None - запрос без профиля)"""
+    return request.META.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+
+
+class RequestProfilerMiddleware:
+    """Профилирование запроса суперпользователя по X-Profile; ставится после AuthenticationMiddleware"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profiler = requested_profiler(request)
+        if not profiler or not request.user.is_superuser:
+            return self.get_response(request)
+
+        run, error = self.start(profiler)
+        if error is not None:
+            return error
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            artifact, samples = run.stop()
+        return self.finish(request, response, profiler, started, artifact, samples)
+
+    async def __acall__(self, request):
+        profiler = requested_profiler(request)
+        if not profiler or not (await request.auser()).is_superuser:
+            return await self.get_response(request)
+
+        run, error = self.start(profiler)
+        if error is not None:
+            return error
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            artifact, samples = run.stop()
+        return await sync_to_async(self.finish)(request, response, profiler, started, artifact, samples)
+
+    def start(self, profiler):
+        """Запускает профилировщик: (профилировщик, None) или (None, ответ с ошибкой)"""
+        if profiler not in ARTIFACT_FORMATS:
+            return None, JsonResponse({"error": f"X-Profile: ожидается {' или '.join(ARTIFACT_FORMATS)}"}, status=400)
+        run = CProfileRun() if profiler == "cprofile" else StackSampler(interval=profiler_interval())
+        try:
+            run.start()
+        except ProfilerBusy:
+            error = {"error": "X-Profile: cprofile уже выполняется для другого запроса, повторите позже"}
+            return None, JsonResponse(error, status=409)
+        return run, None
+
+    def finish(self, request, response, profiler, started, artifact, samples):
+        duration = (time.perf_counter() - started) * 1000
+        record = self.save(request, response, profiler, duration, artifact, samples)
+        response["X-Profile-Id"] = str(record.pk)
+        return response
+
+    def save(self, request, response, profiler, duration, artifact, samples):
+        from .models import ProfiledRequest
+
+        match = request.resolver_match
+        record = ProfiledRequest.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:500],
+            view_name=(match.view_name if match else "")[:200],
+            profiler=profiler,
+            status_code=response.status_code,
+            duration_ms=round(duration, 3),
+            samples=samples,
+            artifact=artifact,
+            created_by=request.user,
+        )
+        # Хранятся последние REQUEST_PROFILER_KEEP профилей
+        keep = getattr(settings, "REQUEST_PROFILER_KEEP", DEFAULT_KEEP)
+        stale = ProfiledRequest.objects.values_list("pk", flat=True)[keep:]
+        ProfiledRequest.objects.filter(pk__in=list(stale)).delete()
+        return record
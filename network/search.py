@@ -0,0 +1,101 @@
+"""
+Полнотекстовый поиск по звеньям сети и продуктам.
+
+Вместо OR из icontains по нескольким полям (последовательное чтение всей
+таблицы) используется хранимый столбец search_vector (GeneratedField,
+пересчитывается СУБД при записи строки) с GIN-индексом. Каждое слово
+запроса ищется как префикс, результаты упорядочиваются по релевантности.
+
+Если в БД установлено расширение pg_trgm (миграция 0008 создает его и
+триграммные индексы, когда это возможно), к совпадениям добавляются
+похожие названия - поиск с опечатками.
+"""
+
+import re
+
+from django.contrib.admin.views.main import ORDER_VAR
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramWordSimilarity)
+from django.db import connection
+from django.db.models import F, IntegerField, Q
+from django.db.models.functions import Cast
+from rest_framework import filters
+
+from .models import SEARCH_CONFIG
+
+RANK_SCALE = 1_000_000  # Релевантность хранится целым числом: стабильный ключ для курсора
+
+# Символы синтаксиса tsquery, которые нельзя передавать из пользовательского ввода
+_TSQUERY_SPECIAL = re.compile(r"[':&|!()<>*\\]")
+
+_trigram_available = None
+
+
+def trigram_available():
+    """Установлено ли расширение pg_trgm (проверяется один раз на процесс)"""
+    global _trigram_available
+    if _trigram_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available = cursor.fetchone() is not None
+    return _trigram_available
+
+
+def build_query(search):
+    """Запрос tsquery: все слова обязательны, каждое - как префикс ('сет':* & 'моск':*)"""
+    terms = [term for term in _TSQUERY_SPECIAL.sub(" ", search).lower().split() if term]
+    if not terms:
+        return None
+    return SearchQuery(" & ".join(f"'{term}':*" for term in terms), search_type="raw", config=SEARCH_CONFIG)
+
+
+def search_queryset(queryset, search, trigram_fields=("name",)):
+    """Фильтрует queryset по строке поиска и сортирует по релевантности (search_rank)"""
+    query = build_query(search)
+    if query is None:
+        return queryset
+
+    condition = Q(search_vector=query)
+    rank = SearchRank(F("search_vector"), query)
+    if trigram_fields and trigram_available():
+        for field in trigram_fields:
+            condition |= Q(**{f"{field}__trigram_word_similar": search})
+            rank = rank + TrigramWordSimilarity(search, field)
+
+    return (
+        queryset.filter(condition)
+        .annotate(search_rank=Cast(rank * RANK_SCALE, IntegerField()))
+        .order_by("-search_rank", "-id")
+    )
+
+
+class RankedSearchFilter(filters.SearchFilter):
+    """
+    Фильтр DRF: параметр ?search= ищется по search_vector модели.
+    Поля для поиска с опечатками - атрибут вида trigram_search_fields.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        trigram_fields = getattr(view, "trigram_search_fields", ("name",))
+        return search_queryset(queryset, " ".join(terms), trigram_fields)
+
+
+class RankedSearchAdminMixin:
+    """
+    Поиск в админке через search_vector вместо icontains по search_fields.
+    ChangeList сортирует список до поиска, поэтому здесь результаты упорядочиваются
+    по релевантности, а выбранный пользователем столбец сортировки сохраняется.
+    """
+
+    trigram_search_fields = ("name",)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        results = search_queryset(queryset, search_term, self.trigram_search_fields)
+        if request.GET.get(ORDER_VAR):
+            results = results.order_by(*queryset.query.order_by)
+        return results, False
@@ -1,21 +1,44 @@
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Prefetch
 from rest_framework import serializers
 
-from .models import Employee, NetworkNode, Product
+from .fieldsets import SparseFieldsetSerializerMixin
+from .hierarchy import validate_supplier
+from .instrumentation import PhaseTimingSerializerMixin
+from .models import Employee, Job, NetworkNode, Product
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(PhaseTimingSerializerMixin, SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для модели Product"""
 
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ("search_vector",)  # Служебное поле поиска
         read_only_fields = ("id",)
 
 
-class NetworkNodeSerializer(serializers.ModelSerializer):
+def validate_supplier_cycle(instance, data):
+    """Проверка циклических ссылок общим валидатором иерархии"""
+    supplier = data.get("supplier")
+    try:
+        validate_supplier(getattr(instance, "pk", None), supplier.pk if supplier else None)
+    except DjangoValidationError as exc:
+        raise serializers.ValidationError(exc.message_dict)
+
+
+class NetworkNodeSerializer(PhaseTimingSerializerMixin, SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для чтения данных NetworkNode"""
 
+    expandable_fields = {"products": ("products_info",), "supplier": ("supplier_name", "supplier_type")}
+    field_columns = {
+        "full_address": ("country", "city", "street", "house_number", "postal_code"),
+        "supplier_name": ("supplier", "supplier__name"),
+        "supplier_type": ("supplier", "supplier__node_type"),
+    }
+    field_select_related = {"supplier_name": "supplier", "supplier_type": "supplier"}
+    field_prefetch = {"products": "products", "products_info": "products"}
+
     level = serializers.IntegerField(read_only=True)
     supplier_name = serializers.CharField(source="supplier.name", read_only=True)
     supplier_type = serializers.CharField(source="supplier.get_node_type_display", read_only=True)
@@ -24,17 +47,30 @@ class NetworkNodeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = NetworkNode
-        fields = "__all__"
+        exclude = ("path", "search_vector")  # Служебные поля иерархии и поиска
         read_only_fields = ("id", "created_at", "updated_at", "level")
 
+    @classmethod
+    def prefetch_for(cls, lookup, names):
+        if lookup == "products" and "products_info" not in names:
+            # Нужны только id продуктов
+            return Prefetch("products", queryset=Product.objects.only("id"))
+        return super().prefetch_for(lookup, names)
+
+
+class NetworkNodeHierarchySerializer(NetworkNodeSerializer):
+    """Сериализатор звена с глубиной относительно звена, от которого строится иерархия"""
+
+    depth = serializers.IntegerField(read_only=True)
+
 
 class NetworkNodeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания NetworkNode"""
 
     class Meta:
         model = NetworkNode
-        exclude = ("debt",)  # Исключаем debt при создании
-        read_only_fields = ("id", "created_at", "updated_at")
+        exclude = ("debt", "path", "search_vector")  # Исключаем debt при создании
+        read_only_fields = ("id", "created_at", "updated_at", "level")
 
     def validate(self, data):
         """Дополнительная валидация"""
@@ -42,10 +78,7 @@ class NetworkNodeCreateSerializer(serializers.ModelSerializer):
         if data.get("node_type") == NetworkNode.NodeType.FACTORY and data.get("supplier"):
             raise serializers.ValidationError({"supplier": "Завод не может иметь поставщика!"})
 
-        # Проверка циклических ссылок (упрощенная)
-        supplier = data.get("supplier")
-        if supplier and supplier.supplier and supplier.supplier == data.get("self"):
-            raise serializers.ValidationError({"supplier": "Обнаружена циклическая ссылка в цепочке поставщиков!"})
+        validate_supplier_cycle(self.instance, data)
 
         return data
 
@@ -55,8 +88,8 @@ class NetworkNodeUpdateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = NetworkNode
-        exclude = ("debt",)  # Запрещаем обновление debt через API
-        read_only_fields = ("id", "created_at", "updated_at")
+        exclude = ("debt", "path", "search_vector")  # Запрещаем обновление debt через API
+        read_only_fields = ("id", "created_at", "updated_at", "level")
 
     def validate(self, data):
         """Дополнительная валидация при обновлении"""
@@ -68,10 +101,35 @@ class NetworkNodeUpdateSerializer(serializers.ModelSerializer):
         if self.instance and self.instance.node_type == NetworkNode.NodeType.FACTORY and data.get("supplier"):
             raise serializers.ValidationError({"supplier": "Завод не может иметь поставщика!"})
 
+        validate_supplier_cycle(self.instance, data)
+
         return data
 
 
-class EmployeeSerializer(serializers.ModelSerializer):
+class JobSerializer(PhaseTimingSerializerMixin, serializers.ModelSerializer):
+    """Сериализатор статуса фоновой задачи"""
+
+    progress = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "kind",
+            "status",
+            "processed",
+            "total",
+            "progress",
+            "result",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class EmployeeSerializer(PhaseTimingSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для модели Employee"""
 
     full_name = serializers.CharField(source="user.get_full_name", read_only=True)
@@ -0,0 +1,345 @@
+"""
+Инкрементально поддерживаемая статистика сети.
+
+Таблица NetworkStatistics хранит по группе (страна, тип звена, есть ли
+поставщик) количество звеньев и сумму задолженности. Групп немного, поэтому
+сводка API и главная страница читают их целиком одним запросом вместо
+агрегатов по всей таблице звеньев.
+
+Изменения применяются дельтами в той же транзакции, что и сами данные:
+сохранение звена (NetworkNode.save), массовая очистка задолженности
+(clear_debt) и массовый импорт. При удалении поставщика потомки теряют
+его через SET_NULL без сигналов, поэтому затронутые страны пересчитываются
+заново - один раз на операцию удаления (delete() звена или QuerySet, каскад),
+а не на каждую удаленную строку. Команда network_statistics перестраивает и
+сверяет таблицу.
+
+Здесь же - сводки задолженности по поддеревьям (по материализованному path).
+"""
+
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (BooleanField, Count, ExpressionWrapper, F, Max,
+                              Q, Sum)
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from .hierarchy import root_id_expression
+
+# Поля звена, от которых зависит статистика
+STATISTICS_FIELDS = ("country", "node_type", "supplier", "debt")
+
+DEFAULT_CLEAR_DEBT_CHUNK_SIZE = 1000
+
+
+def _models():
+    return apps.get_model("network", "NetworkNode"), apps.get_model("network", "NetworkStatistics")
+
+
+def group_key(country, node_type, supplier_id):
+    return country, node_type, supplier_id is not None
+
+
+def compute_groups(queryset):
+    """Группы (страна, тип, есть поставщик) -> (количество, задолженность) одним GROUP BY"""
+    rows = (
+        queryset.annotate(has_supplier=ExpressionWrapper(Q(supplier__isnull=False), output_field=BooleanField()))
+        .values("country", "node_type", "has_supplier")
+        .annotate(node_count=Count("id"), total_debt=Sum("debt"))
+        .order_by()
+    )
+    return {
+        (row["country"], row["node_type"], row["has_supplier"]): (row["node_count"], row["total_debt"] or Decimal(0))
+        for row in rows
+    }
+
+
+def apply_deltas(deltas):
+    """Прибавляет дельты {группа: (количество, задолженность)} к сохраненной статистике"""
+    _, NetworkStatistics = _models()
+    for (country, node_type, has_supplier), (count, debt) in deltas.items():
+        if not count and not debt:
+            continue
+        lookup = {"country": country, "node_type": node_type, "has_supplier": has_supplier}
+        changes = {"node_count": F("node_count") + count, "total_debt": F("total_debt") + debt}
+        if not NetworkStatistics.objects.filter(**lookup).update(**changes):
+            # Новая группа: создаем пустую строку (параллельная вставка не мешает) и повторяем UPDATE
+            NetworkStatistics.objects.bulk_create([NetworkStatistics(**lookup)], ignore_conflicts=True)
+            NetworkStatistics.objects.filter(**lookup).update(**changes)
+
+
+def _add(deltas, key, count, debt):
+    old_count, old_debt = deltas.get(key, (0, Decimal(0)))
+    deltas[key] = (old_count + count, old_debt + Decimal(debt))
+
+
+def record_node_save(node, stored=None, update_fields=None):
+    """
+    Учитывает сохранение звена. stored - значения STATISTICS_FIELDS из БД
+    до сохранения (None для нового звена).
+    """
+    current = (node.country, node.node_type, node.supplier_id, node.debt)
+    if stored is not None and update_fields is not None:
+        # Поля вне update_fields в БД не изменились
+        current = tuple(
+            value if field in update_fields else old_value
+            for field, value, old_value in zip(STATISTICS_FIELDS, current, stored)
+        )
+
+    deltas = {}
+    if stored is not None:
+        _add(deltas, group_key(*stored[:3]), -1, -stored[3])
+    _add(deltas, group_key(*current[:3]), 1, current[3])
+    apply_deltas(deltas)
+
+
+def record_nodes_created(nodes):
+    """Учитывает звенья, вставленные в обход save() (bulk_create)"""
+    deltas = {}
+    for node in nodes:
+        _add(deltas, group_key(node.country, node.node_type, node.supplier_id), 1, node.debt)
+    apply_deltas(deltas)
+
+
+def _clear_debt_chunk(queryset):
+    """
+    Обнуляет задолженность порции одним запросом и возвращает старые значения:
+    UPDATE ... FROM (SELECT id, debt ... FOR UPDATE) old ... RETURNING.
+    Строки блокируются в подзапросе, поэтому old.debt - именно то значение,
+    которое было очищено, даже при параллельных изменениях.
+    """
+    NetworkNode, _ = _models()
+    inner = queryset.select_for_update(of=("self",)).values("pk", "debt")
+    inner_sql, params = inner.query.get_compiler(connection=connection).as_sql()
+    quote = connection.ops.quote_name
+    sql = (
+        f"UPDATE {quote(NetworkNode._meta.db_table)} AS node SET debt = 0 "
+        f"FROM ({inner_sql}) AS old (id, debt) WHERE node.id = old.id "
+        "RETURNING node.id, old.debt, node.country, node.node_type, node.supplier_id"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def clear_debt(queryset=None, ids=None, chunk_size=None, on_progress=None):
+    """
+    Обнуляет задолженность звеньев (queryset или явный список ids) порциями по
+    chunk_size в одной транзакции и вычитает ее из статистики.
+    on_progress(обработано) вызывается после каждой порции.
+    Возвращает список (id, старая задолженность).
+    """
+    NetworkNode, _ = _models()
+    chunk_size = chunk_size or getattr(settings, "CLEAR_DEBT_CHUNK_SIZE", DEFAULT_CLEAR_DEBT_CHUNK_SIZE)
+    cleared, deltas = [], {}
+
+    def collect(rows):
+        for pk, old_debt, country, node_type, supplier_id in rows:
+            cleared.append((pk, old_debt))
+            _add(deltas, group_key(country, node_type, supplier_id), 0, -old_debt)
+        if on_progress is not None:
+            on_progress(len(cleared))
+        return rows
+
+    with transaction.atomic():
+        if ids is not None:
+            ids = sorted(set(ids))
+            for start in range(0, len(ids), chunk_size):
+                collect(_clear_debt_chunk(NetworkNode.objects.filter(pk__in=ids[start : start + chunk_size])))
+        else:
+            # Порции по возрастанию id (keyset), без OFFSET
+            last_pk = None
+            while True:
+                chunk = queryset.order_by("pk")
+                if last_pk is not None:
+                    chunk = chunk.filter(pk__gt=last_pk)
+                rows = collect(_clear_debt_chunk(chunk[:chunk_size]))
+                if len(rows) < chunk_size:
+                    break
+                last_pk = max(row[0] for row in rows)
+        apply_deltas(deltas)
+    return cleared
+
+
+def recompute(countries=None):
+    """Пересчитывает статистику по странам (или целиком, если countries=None)"""
+    NetworkNode, NetworkStatistics = _models()
+    nodes, stored = NetworkNode.objects.all(), NetworkStatistics.objects.all()
+    if countries is not None:
+        nodes, stored = nodes.filter(country__in=countries), stored.filter(country__in=countries)
+
+    with transaction.atomic():
+        stored.delete()
+        NetworkStatistics.objects.bulk_create(
+            NetworkStatistics(
+                country=country, node_type=node_type, has_supplier=has_supplier, node_count=count, total_debt=debt
+            )
+            for (country, node_type, has_supplier), (count, debt) in compute_groups(nodes).items()
+        )
+
+
+def verify():
+    """Расхождения сохраненной статистики с фактическими данными: {группа: (сохранено, факт)}"""
+    NetworkNode, NetworkStatistics = _models()
+    actual = compute_groups(NetworkNode.objects.all())
+    stored = {
+        (row.country, row.node_type, row.has_supplier): (row.node_count, row.total_debt)
+        for row in NetworkStatistics.objects.filter(node_count__gt=0)
+    }
+    return {
+        key: (stored.get(key), actual.get(key))
+        for key in stored.keys() | actual.keys()
+        if stored.get(key) != actual.get(key)
+    }
+
+
+def _summary_rows():
+    _, NetworkStatistics = _models()
+    return NetworkStatistics.objects.filter(node_count__gt=0)
+
+
+def summary():
+    """Сводка для API и главной страницы: один запрос к таблице статистики"""
+    return _summarize(_summary_rows())
+
+
+async def asummary():
+    """summary() для асинхронных представлений"""
+    return _summarize([row async for row in _summary_rows()])
+
+
+def _summarize(rows):
+    NetworkNode, _ = _models()
+    NodeType = NetworkNode.NodeType
+
+    totals = {"total": 0, "total_debt": Decimal(0), "with_supplier": 0, "without_supplier": 0}
+    by_type = {node_type: 0 for node_type in NodeType.values}
+    countries = {}
+    for row in rows:
+        totals["total"] += row.node_count
+        totals["total_debt"] += row.total_debt
+        totals["with_supplier" if row.has_supplier else "without_supplier"] += row.node_count
+        by_type[row.node_type] = by_type.get(row.node_type, 0) + row.node_count
+        count, debt = countries.get(row.country, (0, Decimal(0)))
+        countries[row.country] = (count + row.node_count, debt + row.total_debt)
+
+    total = totals["total"]
+    statistics = {
+        "total": total,
+        "factories": by_type[NodeType.FACTORY],
+        "retail_networks": by_type[NodeType.RETAIL_NETWORK],
+        "entrepreneurs": by_type[NodeType.INDIVIDUAL_ENTREPRENEUR],
+        "total_debt": totals["total_debt"] if total else None,
+        "avg_debt": totals["total_debt"] / total if total else None,
+        "with_supplier": totals["with_supplier"],
+        "without_supplier": totals["without_supplier"],
+    }
+    by_country = [
+        {"country": country, "count": count, "total_debt": debt}
+        for country, (count, debt) in sorted(countries.items(), key=lambda item: (-item[1][0], item[0]))
+    ]
+    return statistics, by_country
+
+
+def _debt_aggregates():
+    return {
+        "nodes": Count("id"),
+        "nodes_with_debt": Count("id", filter=Q(debt__gt=0)),
+        "total_debt": Sum("debt"),
+        "max_debt": Max("debt"),
+    }
+
+
+def _rollup(rows, base_level=0):
+    """Итог по поддереву и разбивка по глубине из строк GROUP BY level"""
+    by_depth = [
+        {
+            "depth": row["level"] - base_level,
+            "nodes": row["nodes"],
+            "nodes_with_debt": row["nodes_with_debt"],
+            "total_debt": row["total_debt"],
+            "max_debt": row["max_debt"],
+        }
+        for row in rows
+    ]
+    return {
+        "nodes": sum(row["nodes"] for row in by_depth),
+        "nodes_with_debt": sum(row["nodes_with_debt"] for row in by_depth),
+        "total_debt": sum((row["total_debt"] for row in by_depth), Decimal(0)),
+        "max_debt": max((row["max_debt"] for row in by_depth), default=Decimal(0)),
+        "by_depth": by_depth,
+    }
+
+
+def subtree_debt_rollup(node):
+    """
+    Задолженность поддерева звена (включая само звено) по глубине.
+    Один GROUP BY level по индексу path.
+    """
+    NetworkNode, _ = _models()
+    rows = (
+        NetworkNode.objects.filter(Q(pk=node.pk) | Q(path__startswith=node.children_path))
+        .values("level")
+        .annotate(**_debt_aggregates())
+        .order_by("level")
+    )
+    return {"node": node.pk, "name": node.name, **_rollup(rows, base_level=node.level)}
+
+
+def factories_debt_rollup():
+    """
+    Задолженность сетей всех заводов: один GROUP BY (корень, уровень)
+    по всей таблице и один запрос названий заводов.
+    """
+    NetworkNode, _ = _models()
+    factories = NetworkNode.objects.filter(node_type=NetworkNode.NodeType.FACTORY, supplier__isnull=True)
+    rows = (
+        NetworkNode.objects.annotate(root_id=root_id_expression())
+        .filter(root_id__in=factories.values("pk"))
+        .values("root_id", "level")
+        .annotate(**_debt_aggregates())
+        .order_by("root_id", "level")
+    )
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row["root_id"], []).append(row)
+    return [
+        {"node": pk, "name": name, **_rollup(grouped.get(pk, []))}
+        for pk, name in factories.order_by("name", "pk").values_list("pk", "name")
+    ]
+
+
+def _delete_batch(instance, origin):
+    """
+    Состояние операции удаления: звенья, для которых еще не пришел post_delete,
+    и затронутые страны. Хранится на объекте, с которого началось удаление
+    (origin сигнала): Collector отправляет все pre_delete до первого post_delete.
+    """
+    owner = instance if origin is None else origin
+    batch = getattr(owner, "_statistics_delete_batch", None)
+    if batch is None:
+        batch = owner._statistics_delete_batch = {"pending": set(), "countries": set()}
+    return batch
+
+
+@receiver(pre_delete, sender="network.NetworkNode", dispatch_uid="network_statistics_collect_countries")
+def collect_countries_on_delete(sender, instance, origin=None, **kwargs):
+    # Потомки удаляемого звена станут звеньями без поставщика - их страны тоже затронуты
+    batch = _delete_batch(instance, origin)
+    batch["pending"].add(instance.pk)
+    batch["countries"].add(instance.country)
+    batch["countries"].update(sender.objects.filter(supplier_id=instance.pk).values_list("country", flat=True))
+
+
+@receiver(post_delete, sender="network.NetworkNode", dispatch_uid="network_statistics_recompute")
+def recompute_on_delete(sender, instance, origin=None, **kwargs):
+    # Пересчет - после последнего звена операции, когда все строки удалены и потомки отсоединены
+    batch = _delete_batch(instance, origin)
+    batch["pending"].discard(instance.pk)
+    if not batch["pending"]:
+        recompute(batch["countries"] or {instance.country})
+        batch["countries"] = set()
@@ -1,10 +1,40 @@
-from django.contrib.auth.models import User
-from django.test import TestCase
-from django.urls import reverse
+import base64
+import csv
+import io
+import json
+import pstats
+import re
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import Permission, User
+from django.core.handlers.base import BaseHandler
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import (AsyncClient, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import (APIRequestFactory, APITestCase,
+                                 force_authenticate)
 
-from network.models import Employee, NetworkNode, Product
+from network import profiling, statistics
+from network.access import shared_cache
+from network.activity import LastSeenTracker
+from network.benchmarks.cases import CASES, DATASETS
+from network.benchmarks.runner import compare, run_suite
+from network.importer import NetworkImporter
+from network.jobs import Heartbeat, claim_next, enqueue, run_pending
+from network.metrics import MetricsRegistry, estimate_quantile
+from network.models import Employee, Job, NetworkNode, Product, ProfiledRequest
+from network.profiling import StackSampler, collapsed_to_speedscope
+from network.views import ProductViewSet
 
 
 class ProductAPITest(APITestCase):
@@ -123,6 +153,93 @@ class NetworkNodeAPITest(APITestCase):
         response = self.client.post(self.nodes_url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def test_update_supplier_cycle_rejected(self):
+        """Назначение потомка поставщиком отклоняется сериализатором"""
+        entrepreneur = NetworkNode.objects.create(
+            name="ИП",
+            node_type="individual_entrepreneur",
+            supplier=self.retail,
+            email="ip@test.ru",
+            country="Россия",
+            city="Москва",
+            street="Торговая",
+            house_number="5",
+        )
+        url = reverse("networknode-detail", args=[self.retail.id])
+        response = self.client.patch(url, {"supplier": entrepreneur.id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["supplier"], ["Обнаружена циклическая ссылка в цепочке поставщиков!"])
+
+    def test_filter_by_level(self):
+        """Фильтрация по уровню возвращает пагинируемый QuerySet, а не список"""
+        response = self.client.get(self.nodes_url, {"level": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([node["id"] for node in response.data], [self.retail.id])
+
+    def test_filter_by_level_range(self):
+        """Фильтрация по диапазону уровней"""
+        response = self.client.get(self.nodes_url, {"level_gte": 0, "level_lte": 0})
+        self.assertEqual([node["id"] for node in response.data], [self.factory.id])
+
+        response = self.client.get(self.nodes_url, {"level_gte": 1, "country": "Россия"})
+        self.assertEqual([node["id"] for node in response.data], [self.retail.id])
+
+    def test_ordering_by_level(self):
+        """Сортировка по уровню выполняется в БД"""
+        response = self.client.get(self.nodes_url, {"ordering": "-level"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([node["level"] for node in response.data], [1, 0])
+
+    def test_suppliers_summary_reads_statistics(self):
+        """Сводка читается из таблицы статистики и учитывает массовую очистку задолженности"""
+        response = self.client.get(reverse("networknode-suppliers-summary"))
+        self.assertEqual(response.data["statistics"]["total"], 2)
+        self.assertEqual(response.data["statistics"]["total_debt"], Decimal("50000.00"))
+        self.assertEqual(
+            response.data["by_country"], [{"country": "Россия", "count": 2, "total_debt": Decimal("50000.00")}]
+        )
+
+        response = self.client.post(
+            reverse("networknode-bulk-clear-debt"), {"ids": [self.factory.id, self.retail.id]}, format="json"
+        )
+        self.assertEqual(response.data["cleared_count"], 2)
+        self.assertEqual(response.data["total_debt_cleared"], 50000.0)
+
+        response = self.client.get(reverse("networknode-suppliers-summary"))
+        self.assertEqual(response.data["statistics"]["total_debt"], Decimal("0.00"))
+        self.assertEqual(statistics.verify(), {})
+
+    def test_bulk_clear_debt_by_filters_and_subtree(self):
+        """Очистка по фильтрам списка или по поддереву возвращает старые значения по звеньям"""
+        url = reverse("networknode-bulk-clear-debt")
+        response = self.client.post(url, {"filters": {"debt_gt": 1000}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["cleared"], [{"id": self.retail.id, "old_debt": Decimal("50000.00")}])
+
+        NetworkNode.objects.filter(pk=self.retail.pk).update(debt=Decimal("10.00"))
+        statistics.recompute()
+        response = self.client.post(url, {"subtree": self.factory.id}, format="json")
+        self.assertEqual(response.data["cleared_count"], 2)
+        self.assertEqual(response.data["total_debt_cleared"], 10.0)
+        self.assertEqual(statistics.verify(), {})
+
+    def test_bulk_clear_debt_requires_single_target(self):
+        url = reverse("networknode-bulk-clear-debt")
+        for data in ({}, {"ids": [self.retail.id], "subtree": self.factory.id}, {"filters": {"debt_gt": "abc"}}):
+            response = self.client.post(url, data, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(NetworkNode.objects.get(pk=self.retail.pk).debt, Decimal("50000.00"))
+
+    def test_bulk_clear_debt_rejects_unknown_or_blank_filters(self):
+        """Опечатка в имени фильтра или только пустые значения - 400, а не очистка всей таблицы"""
+        url = reverse("networknode-bulk-clear-debt")
+        for filters in ({"contry": "Россия"}, {"country": ""}, {"country": " ", "city": "", "products_all": ""}):
+            with self.subTest(filters=filters):
+                response = self.client.post(url, {"filters": filters}, format="json")
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("contry", self.client.post(url, {"filters": {"contry": "X"}}, format="json").data["error"])
+        self.assertEqual(NetworkNode.objects.get(pk=self.retail.pk).debt, Decimal("50000.00"))
+
 
 class AuthenticationTest(APITestCase):
     """Тесты аутентификации"""
@@ -266,3 +383,1567 @@ class EmployeeModelTest(TestCase):
         self.assertIsNone(self.employee.last_login_date)
         self.employee.update_last_login()
         self.assertIsNotNone(self.employee.last_login_date)
+
+
+class NetworkNodeHierarchyAPITest(APITestCase):
+    """Тесты эндпоинтов descendants и ancestors"""
+
+    def create_node(self, name, node_type="retail_network", supplier=None):
+        return NetworkNode.objects.create(
+            name=name,
+            node_type=node_type,
+            supplier=supplier,
+            email=f"{name}@test.ru",
+            country="Россия",
+            city="Москва",
+            street="Тестовая",
+            house_number="1",
+        )
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass123", is_staff=True)
+        Employee.objects.create(user=self.user, department="Аналитика", position="Аналитик", is_active=True)
+        self.client.force_authenticate(user=self.user)
+
+        self.factory = self.create_node("factory", node_type="factory")
+        self.retail = self.create_node("retail", supplier=self.factory)
+        self.ip = self.create_node("ip", node_type="individual_entrepreneur", supplier=self.retail)
+        self.other = self.create_node("other", node_type="factory")
+
+    def test_descendants(self):
+        """Все потомки с глубиной относительно опорного звена"""
+        response = self.client.get(reverse("networknode-descendants", args=[self.factory.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(node["id"], node["depth"]) for node in response.data], [(self.retail.id, 1), (self.ip.id, 2)]
+        )
+
+    def test_descendants_max_depth_and_node_type(self):
+        """Ограничение глубины и фильтр по типу"""
+        url = reverse("networknode-descendants", args=[self.factory.id])
+        response = self.client.get(url, {"max_depth": 1})
+        self.assertEqual([node["id"] for node in response.data], [self.retail.id])
+
+        response = self.client.get(url, {"node_type": "individual_entrepreneur"})
+        self.assertEqual([node["id"] for node in response.data], [self.ip.id])
+
+        response = self.client.get(url, {"max_depth": 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ancestors(self):
+        """Цепочка поставщиков от ближайшего к заводу"""
+        response = self.client.get(reverse("networknode-ancestors", args=[self.ip.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(node["id"], node["depth"]) for node in response.data], [(self.retail.id, 1), (self.factory.id, 2)]
+        )
+
+    def test_ancestors_of_factory_is_empty(self):
+        """У завода нет поставщиков"""
+        response = self.client.get(reverse("networknode-ancestors", args=[self.factory.id]))
+        self.assertEqual(response.data, [])
+
+    def test_debt_rollup_for_node(self):
+        """Задолженность поддерева по глубине, включая само звено"""
+        NetworkNode.objects.filter(pk=self.retail.pk).update(debt=Decimal("100.00"))
+        NetworkNode.objects.filter(pk=self.ip.pk).update(debt=Decimal("40.50"))
+        with self.assertNumQueries(3):  # профиль сотрудника, звено, агрегат по поддереву
+            response = self.client.get(reverse("networknode-debt-rollup", args=[self.retail.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["nodes"], 2)
+        self.assertEqual(response.data["total_debt"], Decimal("140.50"))
+        self.assertEqual(response.data["max_debt"], Decimal("100.00"))
+        self.assertEqual(
+            [(row["depth"], row["nodes_with_debt"]) for row in response.data["by_depth"]], [(0, 1), (1, 1)]
+        )
+
+    def test_object_permissions_are_checked(self):
+        """Объектные разрешения применяются к опорному звену descendants, ancestors и debt_rollup"""
+        with mock.patch("network.permissions.DepartmentPermission.has_object_permission", return_value=False):
+            for name in ("networknode-descendants", "networknode-ancestors", "networknode-debt-rollup"):
+                with self.subTest(name=name):
+                    response = self.client.get(reverse(name, args=[self.retail.id]))
+                    self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_debt_rollup_for_factories(self):
+        """Сводка по всем заводам: каждая сеть считается отдельно"""
+        NetworkNode.objects.filter(pk=self.ip.pk).update(debt=Decimal("10.00"))
+        response = self.client.get(reverse("networknode-factories-debt-rollup"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rollups = {row["node"]: row for row in response.data}
+        self.assertEqual(rollups[self.factory.id]["nodes"], 3)
+        self.assertEqual(rollups[self.factory.id]["total_debt"], Decimal("10.00"))
+        self.assertEqual([row["depth"] for row in rollups[self.factory.id]["by_depth"]], [0, 1, 2])
+        self.assertEqual(rollups[self.other.id]["nodes"], 1)
+        self.assertEqual(rollups[self.other.id]["nodes_with_debt"], 0)
+
+
+class LastSeenTrackerTest(TestCase):
+    """Тесты отложенной записи активности сотрудников"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="tracked", password="testpass123", is_staff=True)
+        self.employee = Employee.objects.create(user=self.user, department="IT", position="Developer")
+        self.tracker = LastSeenTracker(flush_interval=60)
+
+    def test_touch_does_not_write_immediately(self):
+        """Отметка копится в памяти без запроса к БД"""
+        with self.assertNumQueries(0):
+            self.tracker.touch(self.employee)
+            self.tracker.touch(self.employee)
+
+        self.assertEqual(self.tracker.pending_count, 1)
+        self.employee.refresh_from_db()
+        self.assertIsNone(self.employee.last_login_date)
+
+    def test_flush_writes_batch(self):
+        """Накопленные отметки записываются одним запросом"""
+        other_user = User.objects.create_user(username="other", password="testpass123", is_staff=True)
+        other = Employee.objects.create(user=other_user, department="IT", position="Developer")
+        self.tracker.touch(self.employee)
+        self.tracker.touch(other)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.tracker.flush(), 2)
+
+        self.employee.refresh_from_db()
+        self.assertIsNotNone(self.employee.last_login_date)
+        self.assertEqual(self.tracker.pending_count, 0)
+
+    def test_flush_keeps_newer_value(self):
+        """Более старая отметка не перезаписывает более свежую"""
+        self.tracker.touch(self.employee)
+        newer = timezone.now() + timedelta(minutes=5)
+        Employee.objects.filter(pk=self.employee.pk).update(last_login_date=newer)
+
+        self.tracker.flush()
+
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.last_login_date, newer)
+
+    def test_recent_activity_is_not_recorded(self):
+        """Сотрудник, отмеченный в пределах интервала, не попадает в буфер"""
+        self.employee.update_last_login()
+        self.tracker.touch(self.employee)
+        self.assertEqual(self.tracker.pending_count, 0)
+
+    def test_request_does_not_update_employee_synchronously(self):
+        """Аутентифицированный GET не выполняет UPDATE сотрудника"""
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("networknode-list"))
+        self.assertFalse([query for query in queries if query["sql"].startswith('UPDATE "network_employee"')])
+
+    def test_failed_flush_keeps_pending(self):
+        """Ошибка записи возвращает отметки в буфер"""
+        self.tracker.touch(self.employee)
+        with mock.patch("django.db.models.QuerySet.update", side_effect=DatabaseError("недоступна")):
+            with self.assertRaises(DatabaseError):
+                self.tracker.flush()
+        self.assertEqual(self.tracker.pending_count, 1)
+        self.assertEqual(self.tracker.flush(), 1)
+
+
+class LastSeenBackgroundFlushTest(TransactionTestCase):
+    """Фоновый поток пишет отметки через свое соединение, поэтому строки должны быть зафиксированы"""
+
+    def setUp(self):
+        user = User.objects.create_user(username="tracked", password="testpass123", is_staff=True)
+        self.employee = Employee.objects.create(user=user, department="IT", position="Developer")
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_idle_process_flushes_within_interval(self):
+        """Отметки записываются без следующего запроса; поток завершается, когда буфер пуст"""
+        tracker = LastSeenTracker(flush_interval=0.05)
+        tracker.touch(self.employee)
+        self.wait_for(lambda: Employee.objects.get(pk=self.employee.pk).last_login_date is not None)
+        self.wait_for(lambda: tracker._flusher is None)
+
+    def test_flush_error_is_logged(self):
+        """Ошибка записи в фоновом потоке не теряет отметки и не выходит за пределы потока"""
+        tracker = LastSeenTracker(flush_interval=0.05)
+        original = LastSeenTracker.flush
+        calls = []
+
+        def flaky_flush(self):
+            calls.append(True)
+            if len(calls) == 1:
+                raise DatabaseError("недоступна")
+            return original(self)
+
+        with mock.patch.object(LastSeenTracker, "flush", flaky_flush), self.assertLogs("network.activity", "ERROR"):
+            tracker.touch(self.employee)
+            self.wait_for(lambda: len(calls) > 1)
+        self.wait_for(lambda: Employee.objects.get(pk=self.employee.pk).last_login_date is not None)
+
+
+class KeysetPaginationTest(APITestCase):
+    """Тесты курсорной пагинации"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", password="admin123", email="admin@test.ru")
+        self.client.force_authenticate(user=self.user)
+        self.nodes_url = reverse("networknode-list")
+        self.nodes = [
+            NetworkNode.objects.create(
+                name=f"Звено {index % 3}",
+                node_type="factory",
+                email=f"node{index}@test.ru",
+                country="Россия",
+                city="Москва",
+                street="Тестовая",
+                house_number=str(index),
+                debt=100 * (index % 2),
+            )
+            for index in range(7)
+        ]
+
+    def collect_pages(self, params):
+        """Проходит все страницы по ссылкам next и возвращает id в порядке выдачи"""
+        response = self.client.get(self.nodes_url, params)
+        ids = []
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), params["page_size"])
+            ids.extend(node["id"] for node in response.data["results"])
+            if not response.data["next"]:
+                return ids, response
+            response = self.client.get(response.data["next"])
+
+    def test_without_params_returns_plain_list(self):
+        """Без page_size/cursor ответ не меняется"""
+        response = self.client.get(self.nodes_url)
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 7)
+
+    def test_pages_follow_name_and_id(self):
+        """Страницы покрывают весь список без пропусков и повторов"""
+        ids, _ = self.collect_pages({"page_size": 3})
+        expected = list(NetworkNode.objects.order_by("name", "id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_pages_with_ordering_ties_and_filters(self):
+        """Сортировка по задолженности с одинаковыми значениями и фильтром"""
+        ids, _ = self.collect_pages({"page_size": 2, "ordering": "-debt", "country": "Россия"})
+        expected = list(NetworkNode.objects.order_by("-debt", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link(self):
+        """Ссылка previous возвращает предыдущую страницу"""
+        first = self.client.get(self.nodes_url, {"page_size": 3})
+        second = self.client.get(first.data["next"])
+        back = self.client.get(second.data["previous"])
+        self.assertEqual([node["id"] for node in back.data["results"]], [node["id"] for node in first.data["results"]])
+
+    def test_invalid_cursor(self):
+        """Некорректный курсор - 404"""
+        response = self.client.get(self.nodes_url, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_products_keyset(self):
+        """Продукты пагинируются по (name, model)"""
+        for index in range(5):
+            Product.objects.create(name="Продукт", model=f"M-{index}", release_date="2024-01-01")
+        view = ProductViewSet.as_view({"get": "list"})
+        factory = APIRequestFactory()
+
+        request = factory.get("/", {"page_size": 2})
+        force_authenticate(request, user=self.user)
+        response = view(request)
+        self.assertEqual([product["model"] for product in response.data["results"]], ["M-0", "M-1"])
+
+        request = factory.get(response.data["next"])
+        force_authenticate(request, user=self.user)
+        response = view(request)
+        self.assertEqual([product["model"] for product in response.data["results"]], ["M-2", "M-3"])
+
+
+class NetworkNodeSearchTest(APITestCase):
+    """Тесты полнотекстового поиска"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", password="admin123", email="admin@test.ru")
+        self.client.force_authenticate(user=self.user)
+        self.nodes_url = reverse("networknode-list")
+        self.factory = NetworkNode.objects.create(
+            name="Электрозавод Север",
+            node_type="factory",
+            email="north@test.ru",
+            country="Россия",
+            city="Москва",
+            street="Заводская",
+            house_number="1",
+        )
+        self.retail = NetworkNode.objects.create(
+            name="Сеть Москва-Электро",
+            node_type="retail_network",
+            email="retail@test.ru",
+            country="Россия",
+            city="Казань",
+            street="Баумана",
+            house_number="2",
+            supplier=self.factory,
+        )
+        self.other = NetworkNode.objects.create(
+            name="ИП Петров",
+            node_type="individual_entrepreneur",
+            email="petrov@test.ru",
+            country="Казахстан",
+            city="Алматы",
+            street="Абая",
+            house_number="3",
+        )
+
+    def search_ids(self, search, **params):
+        response = self.client.get(self.nodes_url, {"search": search, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"] if "results" in response.data else response.data
+        return [node["id"] for node in results]
+
+    def test_prefix_search(self):
+        """Каждое слово ищется как префикс"""
+        self.assertEqual(self.search_ids("электроз"), [self.factory.pk])
+        self.assertEqual(self.search_ids("петр"), [self.other.pk])
+
+    def test_all_terms_required(self):
+        """Все слова запроса должны совпасть"""
+        self.assertEqual(self.search_ids("сеть казань"), [self.retail.pk])
+        self.assertEqual(self.search_ids("сеть алматы"), [])
+
+    def test_ranked_by_field_weight(self):
+        """Совпадение в названии выше совпадения в городе"""
+        self.assertEqual(self.search_ids("москва"), [self.retail.pk, self.factory.pk])
+
+    def test_search_by_email_and_special_characters(self):
+        """Email находится целиком, символы синтаксис tsquery не ломают запрос"""
+        self.assertEqual(self.search_ids("petrov@test.ru"), [self.other.pk])
+        self.assertEqual(self.search_ids("петров & | ! ( :*"), [self.other.pk])
+
+    def test_search_with_keyset_pagination(self):
+        """Курсор строится по релевантности и id"""
+        first = self.client.get(self.nodes_url, {"search": "москва", "page_size": 1})
+        second = self.client.get(first.data["next"])
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [first.data["results"][0]["id"], second.data["results"][0]["id"]], [self.retail.pk, self.factory.pk]
+        )
+        self.assertIsNone(second.data["next"])
+
+    def test_search_field_not_serialized(self):
+        """Служебное поле поиска не попадает в ответ"""
+        response = self.client.get(reverse("networknode-detail", args=[self.factory.pk]))
+        self.assertNotIn("search_vector", response.data)
+
+    def test_city_filter(self):
+        """Фильтр по части названия города"""
+        response = self.client.get(self.nodes_url, {"city": "зан"})
+        self.assertEqual([node["id"] for node in response.data], [self.retail.pk])
+
+    def test_product_search(self):
+        """Продукты ищутся по названию, модели и описанию"""
+        lamp = Product.objects.create(
+            name="Лампа", model="LED-100", description="Энергосберегающая", release_date="2024-01-01"
+        )
+        Product.objects.create(name="Кабель", model="ВВГ-3", release_date="2024-01-01")
+        request = APIRequestFactory().get("/", {"search": "энергосбер"})
+        force_authenticate(request, user=self.user)
+        response = ProductViewSet.as_view({"get": "list"})(request)
+        self.assertEqual([product["id"] for product in response.data], [lamp.pk])
+        self.assertNotIn("search_vector", response.data[0])
+
+    def test_admin_search(self):
+        """Поиск в админке использует тот же индекс"""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("admin:network_networknode_changelist"), {"q": "электроз"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.context["cl"].queryset.values_list("pk", flat=True)), [self.factory.pk])
+
+    def test_admin_search_ordered_by_rank(self):
+        """Результаты поиска в админке идут по релевантности, если не выбран столбец сортировки"""
+        pharmacy = NetworkNode.objects.create(
+            name="Аптека",
+            node_type="retail_network",
+            email="pharmacy@test.ru",
+            country="Россия",
+            city="Москва",
+            street="Тверская",
+            house_number="4",
+        )
+        self.client.force_login(self.user)
+        url = reverse("admin:network_networknode_changelist")
+        rows = list(self.client.get(url, {"q": "москва"}).context["cl"].result_list)
+        self.assertEqual(rows[0], self.retail)  # Совпадение в названии выше совпадения в городе
+        self.assertEqual([node.pk for node in rows], self.search_ids("москва"))
+        self.assertIn(pharmacy, rows[1:])
+
+        # Выбранный пользователем столбец (o=1 - название) важнее релевантности
+        rows = list(self.client.get(url, {"q": "москва", "o": "1"}).context["cl"].result_list)
+        self.assertEqual(rows, [pharmacy, self.retail, self.factory])
+
+
+class AsyncReadAPITest(APITestCase):
+    """Асинхронные эндпоинты чтения отвечают так же, как синхронные"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="analyst", password="analyst123", is_staff=True)
+        self.employee = Employee.objects.create(
+            user=self.user, department="Аналитика", position="Аналитик", is_active=True
+        )
+        self.client.login(username="analyst", password="analyst123")
+
+        self.product = Product.objects.create(name="Лампа", model="LED-1", release_date="2024-01-01")
+        self.factory = NetworkNode.objects.create(
+            name="Завод",
+            node_type="factory",
+            email="factory@test.ru",
+            country="Россия",
+            city="Москва",
+            street="Заводская",
+            house_number="1",
+        )
+        self.factory.products.add(self.product)
+        for index in range(3):
+            NetworkNode.objects.create(
+                name=f"Розница {index}",
+                node_type="retail_network",
+                supplier=self.factory,
+                email=f"retail{index}@test.ru",
+                country="Казахстан" if index else "Россия",
+                city="Алматы",
+                street="Торговая",
+                house_number=str(index),
+            )
+
+    def assertSameResponse(self, sync_url, async_url, params=None):
+        expected = self.client.get(sync_url, params)
+        response = self.client.get(async_url, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        # Ссылки пагинации ведут на тот же вариант API
+        self.assertEqual(json.loads(response.content.decode().replace("/api/async/", "/api/")), expected.json())
+        return response
+
+    def test_list(self):
+        """Список с фильтрами, сортировкой и пагинацией"""
+        sync_url, async_url = reverse("networknode-list"), reverse("async-networknode-list")
+        self.assertSameResponse(sync_url, async_url)
+        self.assertSameResponse(sync_url, async_url, {"country": "Казахстан", "ordering": "-name"})
+        self.assertSameResponse(sync_url, async_url, {"fields": "id,name", "expand": "supplier"})
+        first = self.assertSameResponse(sync_url, async_url, {"page_size": 3}).json()
+        second = self.client.get(first["next"]).json()
+        ids = [node["id"] for node in first["results"] + second["results"]]
+        self.assertEqual(ids, list(NetworkNode.objects.order_by("name", "id").values_list("id", flat=True)))
+        self.assertIsNone(second["next"])
+
+    def test_retrieve(self):
+        """Звено и 404 для несуществующего"""
+        self.assertSameResponse(
+            reverse("networknode-detail", args=[self.factory.pk]),
+            reverse("async-networknode-detail", args=[self.factory.pk]),
+        )
+        self.assertSameResponse(reverse("networknode-detail", args=[0]), reverse("async-networknode-detail", args=[0]))
+
+    def test_by_country_and_summary(self):
+        """by_country (включая ошибку без параметра) и suppliers_summary"""
+        sync_url, async_url = reverse("networknode-by-country"), reverse("async-networknode-by-country")
+        self.assertSameResponse(sync_url, async_url, {"country": "россия"})
+        response = self.assertSameResponse(sync_url, async_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertSameResponse(
+            reverse("networknode-suppliers-summary"), reverse("async-networknode-suppliers-summary")
+        )
+
+    def test_permissions(self):
+        """Без входа и для неактивного сотрудника - те же отказы"""
+        url = reverse("async-networknode-list")
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.employee.is_active = False
+        self.employee.save()
+        self.client.login(username="analyst", password="analyst123")
+        self.assertSameResponse(reverse("networknode-list"), url)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_served_without_sync_adapter(self):
+        """
+        Под ASGI со стандартным MIDDLEWARE (и с включенным SQL_INSTRUMENTATION)
+        ни middleware, ни представление не уходят в sync_to_async
+        """
+        adapt_method_mode = BaseHandler.adapt_method_mode
+
+        def spy(handler, is_async, method, *args, **kwargs):
+            adapted_method = adapt_method_mode(handler, is_async, method, *args, **kwargs)
+            if adapted_method is not method:
+                adapted.append(kwargs.get("name") or repr(method).split(" of ")[0])
+            return adapted_method
+
+        url = reverse("async-networknode-list")
+        self.assertTrue(iscoroutinefunction(resolve(url).func))
+        for instrumentation in (False, True):
+            adapted = []
+            # Цепочка middleware собирается при первом запросе нового клиента
+            with (
+                self.subTest(instrumentation=instrumentation),
+                override_settings(SQL_INSTRUMENTATION=instrumentation),
+                mock.patch.object(BaseHandler, "adapt_method_mode", spy),
+            ):
+                client = AsyncClient()
+                await client.aforce_login(self.user)
+                response = await client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                # process_view у CsrfViewMiddleware Django всегда вызывает через sync_to_async
+                self.assertEqual(adapted, ["<bound method CsrfViewMiddleware.process_view"])
+
+
+class SparseFieldsetTest(APITestCase):
+    """Тесты параметров ?fields= и ?expand="""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", password="admin123", email="admin@test.ru")
+        self.client.force_authenticate(user=self.user)
+        self.nodes_url = reverse("networknode-list")
+        self.product = Product.objects.create(
+            name="Лампа", model="LED-1", description="Описание", release_date="2024-01-01"
+        )
+        self.factory = NetworkNode.objects.create(
+            name="Завод",
+            node_type="factory",
+            email="factory@test.ru",
+            country="Россия",
+            city="Москва",
+            street="Заводская",
+            house_number="1",
+        )
+        self.factory.products.add(self.product)
+        for index in range(3):
+            node = NetworkNode.objects.create(
+                name=f"Розница {index}",
+                node_type="retail_network",
+                supplier=self.factory,
+                email=f"retail{index}@test.ru",
+                country="Россия",
+                city="Москва",
+                street="Торговая",
+                house_number=str(index),
+            )
+            node.products.add(self.product)
+
+    def get_with_queries(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, [query["sql"] for query in queries]
+
+    def test_default_shape_unchanged(self):
+        """Без параметров - полный ответ, связи загружаются без N+1"""
+        response, queries = self.get_with_queries(self.nodes_url, {})
+        self.assertIn("products_info", response.data[0])
+        self.assertIn("supplier_name", response.data[1])
+        self.assertEqual(len(queries), 2)  # Звенья с поставщиком (JOIN) + продукты одним запросом
+
+    def test_narrow_fields_skip_relations(self):
+        """Узкий ответ: один запрос без JOIN и без чтения лишних столбцов"""
+        response, queries = self.get_with_queries(self.nodes_url, {"fields": "id,name,node_type,debt"})
+        self.assertEqual(set(response.data[0]), {"id", "name", "node_type", "debt"})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("JOIN", queries[0])
+        self.assertNotIn('"email"', queries[0])
+
+    def test_expand(self):
+        """Расширения добавляют связанные данные к выбранным полям"""
+        response, queries = self.get_with_queries(
+            self.nodes_url, {"fields": "id,name", "expand": "products,supplier", "country": "Россия"}
+        )
+        node = next(node for node in response.data if node["id"] != self.factory.pk)
+        self.assertEqual(set(node), {"id", "name", "products_info", "supplier_name", "supplier_type"})
+        self.assertEqual(node["supplier_name"], "Завод")
+        self.assertEqual(node["products_info"][0]["description"], "Описание")
+        self.assertEqual(len(queries), 2)
+
+        response, queries = self.get_with_queries(self.nodes_url, {"fields": "id,products"})
+        self.assertEqual(response.data[0]["products"], [self.product.pk])
+        self.assertNotIn('"description"', queries[1])
+
+    def test_retrieve_and_pagination(self):
+        """Поля работают для детального ответа и при курсорной пагинации с сортировкой"""
+        response = self.client.get(reverse("networknode-detail", args=[self.factory.pk]), {"fields": "id,level"})
+        self.assertEqual(response.data, {"id": self.factory.pk, "level": 0})
+
+        ids = []
+        params = {"fields": "id", "ordering": "-created_at", "page_size": 2}
+        response, queries = self.get_with_queries(self.nodes_url, params)
+        ids.extend(node["id"] for node in response.data["results"])
+        ids.extend(node["id"] for node in self.client.get(response.data["next"]).data["results"])
+        self.assertEqual(ids, list(NetworkNode.objects.order_by("-created_at", "-id").values_list("id", flat=True)))
+        self.assertEqual(len(queries), 1)
+
+    def test_unknown_names(self):
+        """Неизвестные поля и расширения - 400"""
+        response = self.client.get(self.nodes_url, {"fields": "id,password"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("fields", response.data)
+        response = self.client.get(self.nodes_url, {"expand": "employees"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_products_fields(self):
+        """Продукты: только выбранные столбцы"""
+        request = APIRequestFactory().get("/", {"fields": "id,name"})
+        force_authenticate(request, user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = ProductViewSet.as_view({"get": "list"})(request)
+        self.assertEqual(response.data, [{"id": self.product.pk, "name": "Лампа"}])
+        self.assertNotIn('"description"', queries[-1]["sql"])
+
+
+class FastListSerializationTest(APITestCase):
+    """Быстрая сериализация списков совпадает с ModelSerializer байт в байт"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", password="admin123", email="admin@test.ru")
+        self.client.force_authenticate(user=self.user)
+        self.nodes_url = reverse("networknode-list")
+        products = [
+            Product.objects.create(name="Лампа", model="LED-1", description="Свет", release_date="2024-01-01"),
+            Product.objects.create(name="Кабель", model="ВВГ", release_date="2023-05-10", price="99.90"),
+        ]
+        factory = NetworkNode.objects.create(
+            name="Завод",
+            node_type="factory",
+            email="factory@test.ru",
+            country="Россия",
+            city="Москва",
+            street="Заводская",
+            house_number="1",
+            postal_code="101000",
+        )
+        factory.products.set(products)
+        for index in range(4):
+            node = NetworkNode.objects.create(
+                name=f"Розница {index}",
+                node_type="retail_network",
+                supplier=factory,
+                email=f"retail{index}@test.ru",
+                phone="+79990000000" if index % 2 else "",
+                country="Россия",
+                city="Казань",
+                street='Торговая \u2028 "кавычки"',
+                house_number=str(index),
+                debt=Decimal("1234.50") * index,
+            )
+            node.products.set(products[index % 2 :])
+
+    def assertSameContent(self, url, params=None):
+        fast = self.client.get(url, params)
+        with override_settings(FAST_LIST_SERIALIZATION=False):
+            expected = self.client.get(url, params)
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, expected.content)
+        return fast
+
+    def test_nodes_identical(self):
+        """Полный ответ, фильтры, поиск, поля и страницы"""
+        self.assertSameContent(self.nodes_url)
+        self.assertSameContent(self.nodes_url, {"city": "Казань", "ordering": "-debt"})
+        self.assertSameContent(self.nodes_url, {"search": "розница"})
+        self.assertSameContent(self.nodes_url, {"fields": "id,name,debt", "expand": "supplier"})
+        self.assertSameContent(self.nodes_url, {"fields": "id,products,full_address"})
+
+        response = self.assertSameContent(self.nodes_url, {"page_size": 2, "ordering": "created_at"})
+        while response.data["next"]:
+            response = self.assertSameContent(response.data["next"])
+        self.assertSameContent(self.nodes_url, {"page_size": 2, "search": "розница"})
+
+    def test_products_identical(self):
+        """Список продуктов"""
+        for params in ({}, {"ordering": "-release_date"}, {"page_size": 1}):
+            request = APIRequestFactory().get("/", params)
+            force_authenticate(request, user=self.user)
+            view = ProductViewSet.as_view({"get": "list"})
+            fast = view(request).render().content
+            with override_settings(FAST_LIST_SERIALIZATION=False):
+                request = APIRequestFactory().get("/", params)
+                force_authenticate(request, user=self.user)
+                expected = view(request).render().content
+            self.assertEqual(fast, expected)
+
+    def test_query_count(self):
+        """Звенья с поставщиком (JOIN) и продукты с таблицей связи - два запроса, как у prefetch_related"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.nodes_url, {"page_size": 3})
+        self.assertEqual(len(queries), 2)
+
+
+class ProductAvailabilityTest(APITestCase):
+    """Матрица наличия продуктов и фильтры products_all/products_any"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", password="admin123", email="admin@test.ru")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("networknode-availability")
+        self.products = [
+            Product.objects.create(name=f"Продукт {index}", model=f"M-{index}", release_date="2024-01-01")
+            for index in range(10)
+        ]
+        self.factory = self.create_node("Завод", "factory", country="Китай")
+        self.retail = self.create_node("Розница", "retail_network", supplier=self.factory)
+        self.ip = self.create_node("ИП", "individual_entrepreneur", supplier=self.retail)
+        self.factory.products.set(self.products)
+        self.retail.products.set(self.products[0:3] + self.products[8:10])
+        self.ip.products.set([self.products[1], self.products[9]])
+
+    def create_node(self, name, node_type, supplier=None, country="Россия"):
+        return NetworkNode.objects.create(
+            name=name,
+            node_type=node_type,
+            supplier=supplier,
+            email=f"{node_type}@test.ru",
+            country=country,
+            city="Москва",
+            street="Тестовая",
+            house_number="1",
+        )
+
+    def decode_bitset(self, matrix):
+        """Строки bitset -> множества id продуктов"""
+        decoded = {}
+        for node_id, row in zip(matrix["nodes"], matrix["rows"]):
+            bits = base64.b64decode(row)
+            self.assertEqual(len(bits), matrix["row_bytes"])
+            decoded[node_id] = {
+                product_id
+                for index, product_id in enumerate(matrix["products"])
+                if bits[index // 8] & (0x80 >> index % 8)
+            }
+        return decoded
+
+    def expected(self, *nodes):
+        return {node.id: set(node.products.values_list("id", flat=True)) for node in nodes}
+
+    def test_bitset_matrix(self):
+        """Полная матрица: три запроса, строки совпадают со связями"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(response.data["products"], sorted(product.id for product in self.products))
+        self.assertEqual(response.data["links"], 17)
+        self.assertEqual(self.decode_bitset(response.data), self.expected(self.factory, self.retail, self.ip))
+
+    def test_runs_matrix_for_subtree(self):
+        """Поддерево звена в виде отрезков"""
+        response = self.client.get(self.url, {"subtree": self.retail.id, "encoding": "runs"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["nodes"], [self.retail.id, self.ip.id])
+        self.assertEqual(response.data["rows"], [[[0, 3], [8, 2]], [[1, 1], [9, 1]]])
+
+    def test_filters_and_columns(self):
+        """Фильтр по стране и ограничение столбцов"""
+        columns = [self.products[9].id, self.products[0].id]
+        response = self.client.get(self.url, {"country": "Россия", "products": ",".join(map(str, columns))})
+        self.assertEqual(response.data["nodes"], [self.retail.id, self.ip.id])
+        self.assertEqual(response.data["products"], sorted(columns))
+        self.assertEqual(
+            self.decode_bitset(response.data), {self.retail.id: set(columns), self.ip.id: {self.products[9].id}}
+        )
+
+    def test_products_all_and_any(self):
+        """Фильтры списка по наличию продуктов"""
+        nodes_url = reverse("networknode-list")
+        ids = f"{self.products[1].id},{self.products[9].id}"
+        response = self.client.get(nodes_url, {"products_all": ids})
+        self.assertEqual({node["id"] for node in response.data}, {self.factory.id, self.retail.id, self.ip.id})
+
+        ids = f"{self.products[2].id},{self.products[9].id}"
+        response = self.client.get(nodes_url, {"products_all": ids})
+        self.assertEqual({node["id"] for node in response.data}, {self.factory.id, self.retail.id})
+
+        response = self.client.get(nodes_url, {"products_any": f"{self.products[5].id},{self.products[2].id}"})
+        self.assertEqual({node["id"] for node in response.data}, {self.factory.id, self.retail.id})
+
+        response = self.client.get(self.url, {"products_all": ids, "encoding": "runs"})
+        self.assertEqual(response.data["nodes"], [self.factory.id, self.retail.id])
+
+    def test_product_linked_during_build(self):
+        """Продукт, созданный и привязанный после чтения столбцов, в матрицу не попадает"""
+        created = []
+
+        def link_new_product(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if not created and 'FROM "network_product"' in sql:
+                created.append(True)
+                product = Product.objects.create(name="Новый", model="NEW-1", release_date="2024-01-01")
+                self.factory.products.add(product)
+            return result
+
+        with connection.execute_wrapper(link_new_product):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["products"], sorted(product.id for product in self.products))
+        self.assertEqual(response.data["links"], 17)
+
+    def test_invalid_parameters(self):
+        """Неизвестная кодировка и некорректные id"""
+        self.assertEqual(self.client.get(self.url, {"encoding": "csv"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {"products": "1,a"}).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse("networknode-list"), {"products_all": "1,a"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class NetworkNodeExportTest(APITestCase):
+    """Тесты потоковой выгрузки"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", password="admin123", email="admin@test.ru")
+        self.client.force_authenticate(user=self.user)
+        self.product = Product.objects.create(name="Телевизор", model="TV-1", release_date="2024-01-01")
+        self.factory = NetworkNode.objects.create(
+            name="Завод",
+            node_type="factory",
+            email="factory@test.ru",
+            country="Китай",
+            city="Шэньчжэнь",
+            street="Заводская",
+            house_number="1",
+        )
+        self.factory.products.set([self.product])
+        self.retail = NetworkNode.objects.create(
+            name="Розница",
+            node_type="retail_network",
+            supplier=self.factory,
+            email="retail@test.ru",
+            country="Россия",
+            city="Москва",
+            street="Торговая",
+            house_number="2",
+            debt="1500.50",
+        )
+        self.export_url = reverse("networknode-export")
+
+    def export(self, params=None):
+        response = self.client.get(self.export_url, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_export(self):
+        """NDJSON содержит поставщика, уровень и продукты"""
+        rows = [json.loads(line) for line in self.export().splitlines()]
+        by_id = {row["id"]: row for row in rows}
+        self.assertEqual(by_id[self.factory.id]["product_ids"], [self.product.id])
+        self.assertEqual(by_id[self.retail.id]["supplier_name"], "Завод")
+        self.assertEqual(by_id[self.retail.id]["level"], 1)
+        self.assertEqual(by_id[self.retail.id]["debt"], "1500.50")
+
+    def test_csv_export_with_filter(self):
+        """CSV учитывает фильтры списка"""
+        rows = list(csv.DictReader(io.StringIO(self.export({"file_format": "csv", "country": "Китай"}))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["product_ids"], str(self.product.id))
+
+    def test_unknown_format(self):
+        """Неизвестный формат - 400"""
+        response = self.client.get(self.export_url, {"file_format": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_does_not_grow(self):
+        """Количество запросов не зависит от числа звеньев"""
+        with CaptureQueriesContext(connection) as small:
+            self.export()
+        for index in range(10):
+            NetworkNode.objects.create(
+                name=f"ИП {index}",
+                node_type="individual_entrepreneur",
+                supplier=self.retail,
+                email=f"ip{index}@test.ru",
+                country="Россия",
+                city="Москва",
+                street="Торговая",
+                house_number=str(index),
+            ).products.set([self.product])
+        with CaptureQueriesContext(connection) as large:
+            self.export()
+        self.assertEqual(len(small), len(large))
+
+
+class NetworkNodeImportTest(APITestCase):
+    """Тесты массового импорта"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", password="admin123", email="admin@test.ru")
+        self.client.force_authenticate(user=self.user)
+        self.product = Product.objects.create(name="Телевизор", model="TV-1", release_date="2024-01-01")
+        self.factory = NetworkNode.objects.create(
+            name="Завод",
+            node_type="factory",
+            email="factory@test.ru",
+            country="Китай",
+            city="Шэньчжэнь",
+            street="Заводская",
+            house_number="1",
+        )
+        self.import_url = reverse("networknode-import-nodes")
+
+    def row(self, email, node_type="retail_network", **extra):
+        return {
+            "name": email.split("@")[0],
+            "node_type": node_type,
+            "email": email,
+            "country": "Россия",
+            "city": "Москва",
+            "street": "Торговая",
+            "house_number": "1",
+            **extra,
+        }
+
+    def test_import_builds_hierarchy_from_file_references(self):
+        rows = [
+            # Потомок указан раньше поставщика - порядок вставки определяется по ссылкам
+            self.row("ip@test.ru", "individual_entrepreneur", supplier_email="retail@test.ru"),
+            self.row("retail@test.ru", supplier=self.factory.id, product_ids=[self.product.id]),
+        ]
+        response = self.client.post(self.import_url, {"rows": rows}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 2)
+
+        retail = NetworkNode.objects.get(email="retail@test.ru")
+        ip = NetworkNode.objects.get(email="ip@test.ru")
+        self.assertEqual((retail.level, retail.path), (1, f"{self.factory.id}/"))
+        self.assertEqual((ip.supplier_id, ip.level, ip.path), (retail.id, 2, f"{self.factory.id}/{retail.id}/"))
+        self.assertEqual(list(retail.products.all()), [self.product])
+        self.assertEqual(statistics.verify(), {})
+
+    def test_csv_upload(self):
+        content = (
+            "name,node_type,email,country,city,street,house_number,supplier,product_ids\n"
+            f"Сеть,retail_network,csv@test.ru,Россия,Москва,Торговая,1,{self.factory.id},{self.product.id}\n"
+        )
+        upload = io.BytesIO(content.encode())
+        upload.name = "nodes.csv"
+        response = self.client.post(self.import_url, {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(NetworkNode.objects.get(email="csv@test.ru").products.filter(pk=self.product.id).exists())
+
+    def test_errors_reject_whole_batch(self):
+        rows = [
+            self.row("ok@test.ru", supplier=self.factory.id),
+            self.row("factory@test.ru"),  # Email уже занят
+            self.row("bad-factory@test.ru", "factory", supplier=self.factory.id),
+            self.row("a@test.ru", supplier_email="b@test.ru"),
+            self.row("b@test.ru", supplier_email="a@test.ru"),
+            self.row("orphan@test.ru", supplier=999999, product_ids=[999999]),
+            self.row("debt@test.ru", debt="100"),
+        ]
+        response = self.client.post(self.import_url, {"rows": rows}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        errors = {item["row"]: item["errors"] for item in response.data["errors"]}
+        self.assertEqual(sorted(errors), [2, 3, 4, 5, 6, 7])
+        self.assertIn("email", errors[2])
+        self.assertIn("Завод не может иметь поставщика!", errors[3]["supplier"])
+        self.assertIn("циклическая", errors[4]["supplier"][0])
+        self.assertIn("product_ids", errors[6])
+        self.assertIn("debt", errors[7])
+        self.assertFalse(NetworkNode.objects.filter(email="ok@test.ru").exists())
+
+    def test_malformed_rows_are_row_errors(self):
+        """Строки не-объекты и нечисловые ссылки - ошибки строк с полем, а не 500"""
+        rows = [1, "x", self.row("a@test.ru", supplier="x"), self.row("b@test.ru", product_ids="1;x")]
+        response = self.client.post(self.import_url, {"rows": rows}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = {item["row"]: item["errors"] for item in response.data["errors"]}
+        fields = [list(errors[row]) for row in (1, 2, 3, 4)]
+        self.assertEqual(fields, [["non_field_errors"], ["non_field_errors"], ["supplier"], ["product_ids"]])
+
+        upload = io.BytesIO(b'1\n"x"\n')
+        upload.name = "nodes.ndjson"
+        response = self.client.post(self.import_url, {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([item["row"] for item in response.data["errors"]], [1, 2])
+
+    def test_email_taken_during_import(self):
+        """Email, занятый параллельно после проверки, - ошибка строки, а не 500"""
+        rows = [self.row(email, supplier=self.factory.id) for email in ("first@test.ru", "race@test.ru")]
+        check_products = NetworkImporter.check_products
+
+        def take_email(importer, product_ids):
+            # Параллельная вставка после проверки email (повторная проверка после отката ничего не создает)
+            if not NetworkNode.objects.filter(email="race@test.ru").exists():
+                NetworkNode.objects.create(**self.row("race@test.ru", node_type="factory"))
+            return check_products(importer, product_ids)
+
+        with mock.patch.object(NetworkImporter, "check_products", autospec=True, side_effect=take_email):
+            response = self.client.post(self.import_url, {"rows": rows}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["errors"], [{"row": 2, "errors": {"email": [mock.ANY]}}])
+        self.assertFalse(NetworkNode.objects.filter(email="first@test.ru").exists())
+
+    def test_duplicate_product_ids(self):
+        rows = [self.row("dup@test.ru", supplier=self.factory.id, product_ids=f"{self.product.id};{self.product.id}")]
+        response = self.client.post(self.import_url, {"rows": rows}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(list(NetworkNode.objects.get(email="dup@test.ru").products.all()), [self.product])
+
+    def test_dry_run_writes_nothing(self):
+        rows = [self.row("dry@test.ru", supplier=self.factory.id)]
+        response = self.client.post(f"{self.import_url}?dry_run=true", {"rows": rows}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(NetworkNode.objects.filter(email="dry@test.ru").exists())
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        def run(prefix, count):
+            rows = [self.row(f"{prefix}{index}@test.ru", supplier=self.factory.id) for index in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.import_url, {"rows": rows}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        run("warmup", 1)  # Первый импорт создает строку статистики для группы
+        self.assertEqual(run("small", 2), run("large", 20))
+
+
+class GenerateNetworkTest(TestCase):
+    """Тесты генератора синтетической сети"""
+
+    def generate(self, *args):
+        output = io.StringIO()
+        call_command(
+            "generate_network",
+            "--factories=2",
+            "--depth=3",
+            "--fan-out=2:3",
+            "--products=20",
+            "--density=0.2",
+            "--batch-size=7",
+            *args,
+            stdout=output,
+        )
+        return output.getvalue()
+
+    def snapshot(self):
+        """Данные без id и времени создания"""
+        nodes = NetworkNode.objects.order_by("email").values_list(
+            "name", "node_type", "supplier__email", "level", "country", "city", "debt", "phone"
+        )
+        products = NetworkNode.objects.order_by("email", "products__model").values_list("email", "products__model")
+        return list(nodes), list(products)
+
+    def test_hierarchy_and_statistics(self):
+        """Уровни, path и статистика согласованы, как при создании через save()"""
+        output = self.generate("--seed=1")
+        self.assertIn("Создано звеньев", output)
+        self.assertEqual(NetworkNode.objects.filter(level=0, node_type="factory", supplier=None).count(), 2)
+        self.assertEqual(NetworkNode.objects.filter(level=1).exclude(node_type="retail_network").count(), 0)
+        self.assertGreater(NetworkNode.objects.filter(level=3).count(), 0)
+        self.assertFalse(NetworkNode.objects.filter(node_type="individual_entrepreneur", children__isnull=False))
+        for node in NetworkNode.objects.exclude(supplier=None).select_related("supplier")[:50]:
+            self.assertEqual(node.path, node.supplier.children_path)
+            self.assertEqual(node.level, node.supplier.level + 1)
+        self.assertEqual(statistics.verify(), {})
+        self.assertEqual(Product.objects.count(), 20)
+
+    def test_reproducible(self):
+        """Одинаковый seed - одинаковые данные, другой seed - другие"""
+        self.generate("--seed=7")
+        first = self.snapshot()
+        NetworkNode.objects.all().delete()
+        Product.objects.all().delete()
+
+        self.generate("--seed=7")
+        self.assertEqual(self.snapshot(), first)
+        self.generate("--seed=8", "--label=other")
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_max_nodes_and_options(self):
+        """Ограничение числа звеньев, распределение задолженности, ошибки параметров"""
+        self.generate("--max-nodes=10", "--debt=uniform:100:200")
+        self.assertEqual(NetworkNode.objects.count(), 10)
+        self.assertFalse(NetworkNode.objects.exclude(supplier=None).exclude(debt__range=(100, 200)).exists())
+
+        with self.assertRaisesMessage(CommandError, "уже сгенерирована"):
+            self.generate()
+        with self.assertRaisesMessage(CommandError, "lognormal"):
+            self.generate("--label=x", "--debt=normal:1")
+        with self.assertRaisesMessage(CommandError, "Неизвестная страна"):
+            self.generate("--label=y", "--countries=Атлантида:1")
+
+
+class BenchmarkSuiteTest(TestCase):
+    """Тесты набора микробенчмарков (прогон на маленьком наборе и сравнение с базовыми)"""
+
+    def test_run_suite(self):
+        """Все сценарии выполняются; число запросов сценариев стабильно"""
+        tiny = {"tiny": {"factories": 2, "depth": 3, "fan_out": (2, 2), "products": 5, "density": 0.5}}
+        with mock.patch.dict(DATASETS, tiny, clear=True):
+            results = run_suite(repeat=1)
+        self.assertEqual(set(results["tiny"]), set(CASES))
+        self.assertEqual(results["tiny"]["permissions"]["queries"], 0 if shared_cache() else 1)
+        self.assertEqual(results["tiny"]["serialize_nodes"]["queries"], 0)
+        self.assertEqual(results["tiny"]["filter_subtree"]["queries"], 2)
+        self.assertFalse(NetworkNode.objects.exists())  # Набор откачен
+
+    def test_compare(self):
+        """Замедление сверх порога и рост числа запросов - регрессии"""
+        baseline = {"results": {"1k": {"a": {"ms": 10, "queries": 1}, "b": {"ms": 10, "queries": 1}}}}
+        results = {
+            "1k": {
+                "a": {"ms": 13, "queries": 1},
+                "b": {"ms": 10, "queries": 2},
+                "c": {"ms": 1, "queries": 0},
+            }
+        }
+        statuses = {row[1]: row[-1] for row in compare(results, baseline, threshold=0.25)}
+        self.assertEqual(statuses, {"a": "slower", "b": "queries", "c": "new"})
+        statuses = {row[1]: row[-1] for row in compare(results, baseline, threshold=0.5)}
+        self.assertEqual(statuses["a"], "ok")
+
+
+class JobAPITest(APITestCase):
+    """Тесты фоновых задач"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="sales", password="testpass123", is_staff=True)
+        Employee.objects.create(user=self.user, department="Продажи", position="Менеджер", is_active=True)
+        self.client.force_authenticate(user=self.user)
+        self.factory = NetworkNode.objects.create(
+            name="Завод",
+            node_type="factory",
+            email="factory@test.ru",
+            country="Китай",
+            city="Шэньчжэнь",
+            street="Заводская",
+            house_number="1",
+        )
+        self.retail = NetworkNode.objects.create(
+            name="Розница",
+            node_type="retail_network",
+            supplier=self.factory,
+            email="retail@test.ru",
+            country="Россия",
+            city="Москва",
+            street="Торговая",
+            house_number="2",
+            debt="1500.50",
+        )
+
+    def test_bulk_clear_debt_in_background(self):
+        response = self.client.post(
+            f"{reverse('networknode-bulk-clear-debt')}?async=true", {"subtree": self.factory.id}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_url = reverse("job-detail", args=[response.data["job_id"]])
+        self.assertEqual(self.client.get(job_url).data["status"], Job.Status.PENDING)
+        self.assertEqual(NetworkNode.objects.get(pk=self.retail.pk).debt, Decimal("1500.50"))
+
+        self.assertEqual(run_pending(), 1)
+        job = self.client.get(job_url).data
+        self.assertEqual(job["status"], Job.Status.SUCCEEDED)
+        self.assertEqual(job["progress"], 100)
+        self.assertEqual(job["result"]["cleared_count"], 2)
+        self.assertEqual(NetworkNode.objects.get(pk=self.retail.pk).debt, Decimal("0.00"))
+        self.assertEqual(statistics.verify(), {})
+
+    def test_clear_debt_report_is_bounded(self):
+        """В результате задачи хранится не больше CLEARED_REPORT_LIMIT звеньев, итоги - по всем"""
+        NetworkNode.objects.update(debt=Decimal("1.00"))
+        statistics.recompute()
+        with mock.patch("network.jobs.CLEARED_REPORT_LIMIT", 1):
+            enqueue(Job.Kind.CLEAR_DEBT, {"subtree": self.factory.id}, user=self.user)
+            run_pending()
+        result = Job.objects.get().result
+        self.assertEqual((result["cleared_count"], result["total_debt_cleared"]), (2, 2.0))
+        self.assertEqual(len(result["cleared"]), 1)
+        self.assertTrue(result["truncated"])
+
+    @override_settings(JOB_ASYNC_THRESHOLD=1)
+    def test_large_import_returns_accepted(self):
+        rows = [
+            {
+                "name": f"ИП {index}",
+                "node_type": "individual_entrepreneur",
+                "email": f"ip{index}@test.ru",
+                "city": "Москва",
+                "street": "Тестовая",
+                "house_number": "1",
+                "supplier": self.retail.id,
+            }
+            for index in range(2)
+        ]
+        response = self.client.post(reverse("networknode-import-nodes"), {"rows": rows}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        run_pending()
+        job = Job.objects.get(pk=response.data["job_id"])
+        self.assertEqual((job.status, job.processed, job.total), (Job.Status.SUCCEEDED, 2, 2))
+        self.assertEqual(NetworkNode.objects.filter(supplier=self.retail).count(), 2)
+
+    def test_failed_job_keeps_error_report(self):
+        job = enqueue(Job.Kind.IMPORT_NODES, {"rows": [{"name": "Без email"}]}, user=self.user)
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIn("email", job.result["errors"][0]["errors"])
+
+    def test_jobs_are_visible_to_author_only(self):
+        other = User.objects.create_user(username="other", password="testpass123")
+        job = enqueue(Job.Kind.REBUILD_STATISTICS, user=other)
+        response = self.client.get(reverse("job-detail", args=[job.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_claim_takes_oldest_pending_job(self):
+        first = enqueue(Job.Kind.REBUILD_STATISTICS)
+        enqueue(Job.Kind.REBUILD_HIERARCHY)
+        job = claim_next()
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual(Job.objects.get(pk=first.pk).status, Job.Status.RUNNING)
+
+    @override_settings(JOB_STALE_TIMEOUT=60)
+    def test_stale_running_job_fails(self):
+        """Выполняющаяся задача без сигнала воркера дольше JOB_STALE_TIMEOUT помечается ошибкой"""
+        stale, alive = enqueue(Job.Kind.REBUILD_STATISTICS), enqueue(Job.Kind.REBUILD_HIERARCHY)
+        claim_next(), claim_next()
+        Job.objects.filter(pk=stale.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=61))
+
+        self.assertIsNone(claim_next())
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, Job.Status.FAILED)
+        self.assertIn("Воркер перестал отвечать", stale.error)
+        self.assertIsNotNone(stale.finished_at)
+        self.assertEqual(Job.objects.get(pk=alive.pk).status, Job.Status.RUNNING)
+
+
+class JobHeartbeatTest(TransactionTestCase):
+    """Сигнал воркера пишется через отдельное соединение, поэтому строка задачи должна быть зафиксирована"""
+
+    def test_heartbeat_updates_running_job(self):
+        job = enqueue(Job.Kind.REBUILD_STATISTICS)
+        claim_next()
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+
+        heartbeat = Heartbeat(job, interval=0.01)
+        heartbeat.start()
+        deadline = time.monotonic() + 5
+        while Job.objects.get(pk=job.pk).heartbeat_at < timezone.now() - timedelta(minutes=1):
+            self.assertLess(time.monotonic(), deadline, "нет сигнала воркера")
+            time.sleep(0.01)
+        heartbeat.stop()
+
+
+@override_settings(SQL_INSTRUMENTATION=True, SQL_INSTRUMENTATION_SAMPLE_RATE=0)
+class RequestInstrumentationTest(APITestCase):
+    """Профилирование запросов: Server-Timing для персонала и журнал для выборки запросов"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="admin123", email="admin@test.ru")
+        self.user = User.objects.create_user(username="sales", password="testpass123")
+        Employee.objects.create(user=self.user, department="Продажи", position="Менеджер", is_active=True)
+        factory = NetworkNode.objects.create(
+            name="Завод",
+            node_type="factory",
+            email="factory@test.ru",
+            country="Китай",
+            city="Шэньчжэнь",
+            street="Заводская",
+            house_number="1",
+        )
+        factory.products.create(name="Лампа", model="LED-1", release_date="2024-01-01")
+        self.url = reverse("networknode-list")
+
+    def test_server_timing_for_staff(self):
+        """SQL и фазы auth, permissions, view, serialize и render в заголовке"""
+        self.client.force_login(self.admin)
+        timing = self.client.get(self.url)["Server-Timing"]
+        self.assertRegex(timing, r'sql;dur=[\d.]+;desc="[1-9]\d* queries"')
+        metrics = [item.split(";")[0] for item in timing.split(", ")]
+        self.assertEqual(metrics, ["total", "sql", "auth", "permissions", "view", "serialize", "render"])
+
+        detail_url = reverse("networknode-detail", args=[NetworkNode.objects.get().pk])
+        self.assertIn("serialize;dur=", self.client.get(detail_url)["Server-Timing"])
+
+    def test_sampled_request_is_logged(self):
+        """Запрос из выборки - строка JSON в журнале"""
+        self.client.force_login(self.admin)
+        with override_settings(SQL_INSTRUMENTATION_SAMPLE_RATE=1, SQL_INSTRUMENTATION_SLOWEST=2):
+            with self.assertLogs("network.instrumentation", level="INFO") as logs:
+                response = self.client.get(self.url)
+        self.assertIn("Server-Timing", response)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record["view"], record["status"]), ("networknode-list", 200))
+        self.assertGreater(record["queries"], 0)
+        self.assertEqual(len(record["slowest"]), 2)
+        self.assertTrue(all(re.match(r"\s*SELECT", item["sql"]) for item in record["slowest"]))
+        self.assertIn("serialize", record["phases"])
+
+    def test_not_profiled(self):
+        """Запросы не из выборки без is_staff и запросы при выключенном профилировании не профилируются"""
+        self.client.force_login(self.user)
+        with mock.patch("network.instrumentation.logger") as logger:
+            self.assertNotIn("Server-Timing", self.client.get(self.url))
+        logger.info.assert_not_called()
+
+        self.client.force_login(self.admin)
+        with override_settings(SQL_INSTRUMENTATION=False):
+            self.client.handler.load_middleware()
+            self.assertNotIn("Server-Timing", self.client.get(self.url))
+
+    async def test_async_request(self):
+        """Под ASGI в профиль попадают SQL из потоков sync_to_async и фазы DRF"""
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse("async-networknode-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'sql;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertIn("view;dur=", timing)
+
+
+class MetricsTest(APITestCase):
+    """Метрики запросов в формате Prometheus"""
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        patcher = mock.patch("network.metrics.registry", self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.admin = User.objects.create_superuser(username="admin", password="admin123", email="admin@test.ru")
+        self.node = NetworkNode.objects.create(
+            name="Завод",
+            node_type="factory",
+            email="factory@test.ru",
+            country="Китай",
+            city="Шэньчжэнь",
+            street="Заводская",
+            house_number="1",
+        )
+        self.url = reverse("metrics")
+
+    def metric(self, text, name, view, method="GET", extra=""):
+        """Значение метрики electrochain_http_<name> маршрута или None"""
+        pattern = rf'^electrochain_http_{name}{{view="{view}",method="{method}"{extra}}} (\S+)$'
+        match = re.search(pattern, text, re.MULTILINE)
+        return float(match.group(1)) if match else None
+
+    def test_records_requests_per_route(self):
+        """Запросы, время SQL и гистограмма по маршрутам и методам"""
+        self.client.force_login(self.admin)
+        self.client.get(reverse("networknode-list"))
+        self.client.get(reverse("networknode-list"))
+        self.client.post(reverse("networknode-clear-debt", args=[self.node.pk]))
+        self.client.get("/api/no-such-route/")
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        text = response.content.decode()
+        self.assertEqual(self.metric(text, "requests_total", "networknode-list"), 2)
+        infinity = ',le="\\+Inf"'
+        self.assertEqual(self.metric(text, "request_duration_seconds_bucket", "networknode-list", extra=infinity), 2)
+        self.assertGreater(self.metric(text, "request_db_queries_total", "networknode-list"), 0)
+        self.assertIsNotNone(
+            self.metric(text, "request_duration_quantile_seconds", "networknode-list", extra=',quantile="0.95"')
+        )
+        self.assertEqual(self.metric(text, "requests_total", "networknode-clear-debt", "POST"), 1)
+        self.assertEqual(self.metric(text, "request_errors_total", "networknode-clear-debt", "POST"), 0)
+        self.assertEqual(self.metric(text, "requests_total", "unresolved"), 1)
+
+    def test_unknown_methods_share_series(self):
+        """Произвольные методы не создают новых рядов метрик"""
+        self.client.force_login(self.admin)
+        self.client.generic("FOO1", "/api/no-such-route/")
+        self.client.generic("FOO2", reverse("networknode-list"))
+        text = self.client.get(self.url).content.decode()
+        self.assertNotIn("FOO", text)
+        self.assertEqual(self.metric(text, "requests_total", "unresolved", "other"), 1)
+        self.assertEqual(self.metric(text, "requests_total", "networknode-list", "other"), 1)
+
+    async def test_async_request(self):
+        """Под ASGI учитываются время и SQL-запросы async-представлений"""
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse("async-networknode-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        metrics = self.registry.snapshot()[("async-networknode-list", "GET")]
+        self.assertEqual(metrics.count, 1)
+        self.assertGreater(metrics.queries, 0)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_access(self):
+        """Bearer-токен или сотрудник с is_staff"""
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+        user = User.objects.create_user(username="sales", password="testpass123")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_aggregates_processes(self):
+        """Метрики других процессов читаются из METRICS_DIR, свой файл не учитывается дважды"""
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other = MetricsRegistry()
+            other.started += 1  # Другой процесс - другое имя файла
+            other.observe("home", "GET", 0.2, error=True, db_time=0.01, queries=3)
+            other.flush()
+
+            self.registry.observe("home", "GET", 0.003, queries=2)
+            self.registry.flush()
+            self.registry.observe("home", "GET", 0.004, queries=2)
+            home = self.registry.collect()[("home", "GET")]
+
+        self.assertEqual((home.count, home.errors, home.queries), (3, 1, 7))
+        self.assertEqual(home.buckets[0], 2)  # Обе записи текущего процесса до 5 мс
+        self.assertEqual(home.buckets[5], 1)  # 0.2 с - корзина до 0.25 с
+
+    def test_estimate_quantile(self):
+        """Интерполяция внутри корзины, как histogram_quantile"""
+        buckets = [0] * 12
+        buckets[0], buckets[4] = 50, 50  # До 5 мс и 50-100 мс
+        self.assertAlmostEqual(estimate_quantile(0.5, buckets), 0.005)
+        self.assertAlmostEqual(estimate_quantile(0.99, buckets), 0.099)
+        self.assertIsNone(estimate_quantile(0.5, [0] * 12))
+
+
+class RequestProfilerTest(APITestCase):
+    """Профилирование отдельных запросов по X-Profile"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="admin123", email="admin@test.ru")
+        NetworkNode.objects.create(
+            name="Завод",
+            node_type="factory",
+            email="factory@test.ru",
+            country="Китай",
+            city="Шэньчжэнь",
+            street="Заводская",
+            house_number="1",
+        )
+        self.url = reverse("networknode-list")
+        self.client.force_login(self.admin)
+
+    def download(self, profile, artifact_format):
+        url = reverse("admin:network_profiledrequest_download", args=[profile.pk, artifact_format])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("attachment", response["Content-Disposition"])
+        return response.content
+
+    def test_cprofile(self):
+        """Профиль cProfile сохраняется и скачивается файлом pstats"""
+        response = self.client.get(self.url, HTTP_X_PROFILE="cprofile")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile = ProfiledRequest.objects.get(pk=response["X-Profile-Id"])
+        self.assertEqual(profile.view_name, "networknode-list")
+        self.assertEqual((profile.profiler, profile.created_by), ("cprofile", self.admin))
+
+        with tempfile.NamedTemporaryFile(suffix=".pstats") as file:
+            file.write(self.download(profile, "pstats"))
+            file.flush()
+            functions = {name for _, _, name in pstats.Stats(file.name).stats}
+        self.assertIn("list", functions)
+
+        changelist = self.client.get(reverse("admin:network_profiledrequest_changelist"))
+        self.assertContains(changelist, "/download/pstats/")
+
+    def test_sampler(self):
+        """Параметр _profile=sample: свернутые стеки и файл speedscope"""
+        with override_settings(REQUEST_PROFILER_INTERVAL=0.001):
+            response = self.client.get(self.url, {"_profile": "sample"})
+        profile = ProfiledRequest.objects.get(pk=response["X-Profile-Id"])
+        self.assertEqual(profile.profiler, "sample")
+
+        collapsed = self.download(profile, "collapsed").decode()
+        self.assertEqual(sum(int(line.rpartition(" ")[2]) for line in collapsed.splitlines()), profile.samples)
+        speedscope = json.loads(self.download(profile, "speedscope"))
+        self.assertEqual(len(speedscope["profiles"][0]["samples"]), len(collapsed.splitlines()))
+        missing = reverse("admin:network_profiledrequest_download", args=[profile.pk, "pstats"])
+        self.assertEqual(self.client.get(missing).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stack_sampler(self):
+        """Снимки стека потока попадают в свернутые стеки"""
+
+        def busy_loop():
+            deadline = time.perf_counter() + 0.1
+            while time.perf_counter() < deadline:
+                pass
+
+        sampler = StackSampler(interval=0.001)
+        sampler.start()
+        busy_loop()
+        sampler.stop()
+        self.assertGreater(sampler.samples, 0)
+        self.assertIn("busy_loop (test_api.py:", sampler.collapsed())
+
+        data = collapsed_to_speedscope("a;b 3\na;c 1\n", "test", 2)
+        self.assertEqual(data["shared"]["frames"], [{"name": "a"}, {"name": "b"}, {"name": "c"}])
+        self.assertEqual(data["profiles"][0]["samples"], [[0, 1], [0, 2]])
+        self.assertEqual(data["profiles"][0]["weights"], [6, 2])
+
+    def test_only_superuser(self):
+        """Запросы без флага и запросы не суперпользователей не профилируются"""
+        self.assertNotIn("X-Profile-Id", self.client.get(self.url))
+        staff = User.objects.create_user(username="staff", password="testpass123", is_staff=True)
+        Employee.objects.create(user=staff, department="Продажи", position="Менеджер", is_active=True)
+        self.client.force_login(staff)
+        self.assertNotIn("X-Profile-Id", self.client.get(self.url, HTTP_X_PROFILE="cprofile"))
+        self.assertFalse(ProfiledRequest.objects.exists())
+
+    def test_invalid_profiler(self):
+        response = self.client.get(self.url, HTTP_X_PROFILE="perf")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_concurrent_cprofile(self):
+        """Пока cProfile занят другим запросом процесса - 409, затем профилирование снова доступно"""
+        with profiling._cprofile_lock:
+            response = self.client.get(self.url, HTTP_X_PROFILE="cprofile")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn("X-Profile-Id", self.client.get(self.url, HTTP_X_PROFILE="cprofile"))
+        self.assertIn("X-Profile-Id", self.client.get(self.url, HTTP_X_PROFILE="cprofile"))
+
+    def test_download_requires_view_permission(self):
+        """Сотруднику без права просмотра профилей скачивание запрещено"""
+        profile = ProfiledRequest.objects.get(pk=self.client.get(self.url, HTTP_X_PROFILE="cprofile")["X-Profile-Id"])
+        url = reverse("admin:network_profiledrequest_download", args=[profile.pk, "pstats"])
+        staff = User.objects.create_user(username="staff", password="testpass123", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        staff.user_permissions.add(Permission.objects.get(codename="view_profiledrequest"))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    async def test_async_request(self):
+        """Под ASGI профилируется async-представление"""
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse("async-networknode-list"), headers={"X-Profile": "sample"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile = await ProfiledRequest.objects.aget(pk=response["X-Profile-Id"])
+        self.assertEqual(profile.view_name, "async-networknode-list")
+
+    @override_settings(REQUEST_PROFILER_KEEP=2)
+    def test_keeps_latest(self):
+        """Хранятся последние REQUEST_PROFILER_KEEP профилей"""
+        ids = [self.client.get(self.url, HTTP_X_PROFILE="sample")["X-Profile-Id"] for _ in range(3)]
+        self.assertEqual(sorted(ProfiledRequest.objects.values_list("pk", flat=True)), sorted(map(int, ids[1:])))
+
+
+class HealthCheckTest(APITestCase):
+    """Тесты проверки готовности"""
+
+    def test_ready(self):
+        """Эндпоинт доступен без авторизации и сообщает о доступности БД"""
+        response = self.client.get(reverse("readiness"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["status"], "ok")
+        self.assertTrue(response.json()["database"]["ok"])
+
+    def test_database_unavailable(self):
+        """Недоступная БД - 503 без текста ошибки в ответе"""
+        with mock.patch("network.health.check_database", return_value=(False, None, "connection refused")):
+            response = self.client.get(reverse("readiness"))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.json(), {"status": "unavailable", "database": {"ok": False, "latency_ms": None}})
+
+    def test_check_database_command(self):
+        """Команда проверяет подключение и миграции"""
+        output = io.StringIO()
+        call_command("check_database", "--migrations", stdout=output)
+        self.assertIn("Все миграции применены", output.getvalue())
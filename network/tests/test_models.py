@@ -1,10 +1,17 @@
+import threading
 from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from network.models import NetworkNode, Product
+from network import statistics
+from network.hierarchy import creates_cycle
+from network.models import NetworkNode, NetworkStatistics, Product
 
 
 class ProductModelTest(TestCase):
@@ -145,3 +152,249 @@ class NetworkNodeModelTest(TestCase):
 
         with self.assertRaises(ValidationError):
             node.full_clean()
+
+
+class NetworkNodeHierarchyTest(TestCase):
+    """Тесты материализованной иерархии (level и path)"""
+
+    def create_node(self, name, node_type="retail_network", supplier=None):
+        return NetworkNode.objects.create(
+            name=name,
+            node_type=node_type,
+            supplier=supplier,
+            email=f"{name}@test.ru",
+            country="Россия",
+            city="Москва",
+            street="Тестовая",
+            house_number="1",
+        )
+
+    def setUp(self):
+        self.factory = self.create_node("factory", node_type="factory")
+        self.retail = self.create_node("retail", supplier=self.factory)
+        self.entrepreneur = self.create_node("ip", node_type="individual_entrepreneur", supplier=self.retail)
+
+    def test_level_and_path_stored_on_insert(self):
+        """Уровень и путь сохраняются при создании"""
+        self.entrepreneur.refresh_from_db()
+        self.assertEqual(self.entrepreneur.level, 2)
+        self.assertEqual(self.entrepreneur.path, f"{self.factory.pk}/{self.retail.pk}/")
+        self.assertEqual(self.factory.path, "")
+
+    def test_level_read_without_queries(self):
+        """Чтение уровня не требует обхода поставщиков"""
+        node = NetworkNode.objects.get(pk=self.entrepreneur.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(node.level, 2)
+
+    def test_supplier_change_moves_subtree(self):
+        """Смена поставщика пересчитывает всё поддерево"""
+        other_factory = self.create_node("factory2", node_type="factory")
+        middle = self.create_node("middle", supplier=other_factory)
+
+        self.retail.supplier = middle
+        self.retail.save()
+
+        self.entrepreneur.refresh_from_db()
+        self.assertEqual(self.retail.level, 2)
+        self.assertEqual(self.entrepreneur.level, 3)
+        self.assertEqual(self.entrepreneur.path, f"{other_factory.pk}/{middle.pk}/{self.retail.pk}/")
+
+    def test_supplier_deletion_reroots_subtree(self):
+        """Удаление поставщика делает его поддерево самостоятельным"""
+        self.factory.delete()
+
+        self.retail.refresh_from_db()
+        self.entrepreneur.refresh_from_db()
+        self.assertIsNone(self.retail.supplier)
+        self.assertEqual((self.retail.level, self.retail.path), (0, ""))
+        self.assertEqual((self.entrepreneur.level, self.entrepreneur.path), (1, f"{self.retail.pk}/"))
+
+    def test_bulk_deletion_of_chain(self):
+        """Массовое удаление нескольких звеньев одной цепочки"""
+        leaf = self.create_node("leaf", node_type="individual_entrepreneur", supplier=self.entrepreneur)
+        NetworkNode.objects.filter(pk__in=[self.factory.pk, self.retail.pk]).delete()
+
+        self.entrepreneur.refresh_from_db()
+        leaf.refresh_from_db()
+        self.assertEqual((self.entrepreneur.level, self.entrepreneur.path), (0, ""))
+        self.assertEqual((leaf.level, leaf.path), (1, f"{self.entrepreneur.pk}/"))
+
+    def test_cycle_detected_in_deep_chain(self):
+        """Цикл через несколько уровней обнаруживается одним запросом"""
+        chain = [self.entrepreneur]
+        for index in range(5):
+            chain.append(self.create_node(f"deep{index}", supplier=chain[-1]))
+
+        with self.assertNumQueries(1):
+            self.assertTrue(creates_cycle(self.retail.pk, chain[-1].pk))
+
+        self.retail.supplier = chain[-1]
+        with self.assertRaises(ValidationError):
+            self.retail.full_clean()
+
+    def test_self_supplier_is_cycle(self):
+        """Звено не может быть поставщиком самого себя"""
+        self.retail.supplier = self.retail
+        with self.assertRaises(ValidationError):
+            self.retail.full_clean()
+
+    def test_moving_to_other_branch_is_not_cycle(self):
+        """Перенос в соседнюю ветку допустим"""
+        other = self.create_node("other", supplier=self.factory)
+        self.assertFalse(creates_cycle(self.entrepreneur.pk, other.pk))
+
+
+class NetworkStatisticsTest(TestCase):
+    """Тесты инкрементальной статистики сети"""
+
+    def create_node(self, name, node_type="retail_network", supplier=None, country="Россия", debt=0):
+        return NetworkNode.objects.create(
+            name=name,
+            node_type=node_type,
+            supplier=supplier,
+            email=f"{name}@test.ru",
+            country=country,
+            city="Москва",
+            street="Тестовая",
+            house_number="1",
+            debt=debt,
+        )
+
+    def setUp(self):
+        self.factory = self.create_node("factory", node_type="factory", country="Китай")
+        self.retail = self.create_node("retail", supplier=self.factory, debt="1000.50")
+        self.entrepreneur = self.create_node(
+            "ip", node_type="individual_entrepreneur", supplier=self.retail, country="Беларусь", debt="200.25"
+        )
+
+    def assertStatisticsConsistent(self):
+        self.assertEqual(statistics.verify(), {})
+
+    def test_created_nodes_are_counted(self):
+        stats, by_country = statistics.summary()
+        self.assertEqual(stats["total"], 3)
+        self.assertEqual(stats["factories"], 1)
+        self.assertEqual(stats["with_supplier"], 2)
+        self.assertEqual(stats["total_debt"], Decimal("1200.75"))
+        self.assertEqual(stats["avg_debt"], Decimal("400.25"))
+        self.assertEqual([row["country"] for row in by_country], ["Беларусь", "Китай", "Россия"])
+        self.assertStatisticsConsistent()
+
+    def test_updates_move_nodes_between_groups(self):
+        self.retail.debt = Decimal("10.00")
+        self.retail.country = "Казахстан"
+        self.retail.save()
+        self.entrepreneur.supplier = None
+        self.entrepreneur.save()
+        self.assertStatisticsConsistent()
+
+        # update_fields: поля вне списка в БД не меняются
+        self.factory.country = "Вьетнам"
+        self.factory.debt = Decimal("5.00")
+        self.factory.save(update_fields=["debt"])
+        self.assertStatisticsConsistent()
+
+    def test_save_locks_stored_row(self):
+        """
+        Старая строка читается с FOR UPDATE: параллельные сохранения звена не учтут
+        одно значение дважды. Поставщик читается с FOR SHARE
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.retail.save()
+        locks = [query["sql"] for query in queries if query["sql"].endswith(("FOR UPDATE", "FOR SHARE"))]
+        self.assertEqual(len(locks), 2)
+        self.assertIn(f"= {self.factory.pk} ", locks[0])
+        self.assertTrue(locks[0].endswith("FOR SHARE"))
+        self.assertIn(f"= {self.retail.pk} ", locks[1])
+        self.assertTrue(locks[1].endswith("FOR UPDATE"))
+
+    def test_delete_recomputes_children_groups(self):
+        self.retail.delete()
+        self.assertStatisticsConsistent()
+        self.assertEqual(statistics.summary()[0]["without_supplier"], 2)
+
+        NetworkNode.objects.all().delete()
+        self.assertStatisticsConsistent()
+        self.assertEqual(statistics.summary()[0]["total_debt"], None)
+
+    def test_bulk_delete_recomputes_once(self):
+        """Удаление многих звеньев одним delete() - один пересчет затронутых стран"""
+        for index in range(5):
+            self.create_node(f"shop{index}", supplier=self.entrepreneur, country="Казахстан", debt=index)
+        with mock.patch("network.statistics.recompute", wraps=statistics.recompute) as recompute:
+            NetworkNode.objects.exclude(node_type="factory").exclude(name="shop0").delete()
+        recompute.assert_called_once()
+        self.assertEqual(recompute.call_args.args[0], {"Россия", "Беларусь", "Казахстан"})
+        self.assertStatisticsConsistent()
+        self.assertEqual(statistics.summary()[0]["without_supplier"], 2)
+
+    def test_clear_debt(self):
+        cleared = statistics.clear_debt(NetworkNode.objects.all(), chunk_size=2)
+        self.assertEqual(
+            sorted(cleared),
+            [
+                (self.factory.pk, Decimal("0.00")),
+                (self.retail.pk, Decimal("1000.50")),
+                (self.entrepreneur.pk, Decimal("200.25")),
+            ],
+        )
+        self.assertFalse(NetworkNode.objects.filter(debt__gt=0).exists())
+        self.assertStatisticsConsistent()
+
+    def test_clear_debt_by_ids_in_chunks(self):
+        # 3 порции UPDATE ... RETURNING, 2 затронутые группы статистики, SAVEPOINT/RELEASE
+        with self.assertNumQueries(3 + 2 + 2):
+            cleared = statistics.clear_debt(ids=[self.entrepreneur.pk, self.retail.pk, 999999], chunk_size=1)
+        self.assertEqual(sorted(pk for pk, _ in cleared), [self.retail.pk, self.entrepreneur.pk])
+        self.assertStatisticsConsistent()
+
+    def test_summary_is_single_query(self):
+        with self.assertNumQueries(1):
+            statistics.summary()
+
+    def test_rebuild_repairs_drift(self):
+        NetworkStatistics.objects.update(node_count=0)
+        self.assertNotEqual(statistics.verify(), {})
+        statistics.recompute()
+        self.assertStatisticsConsistent()
+
+
+class NetworkNodeSaveLockTest(TransactionTestCase):
+    """Блокировки сохранения видны только между транзакциями"""
+
+    def create_node(self, name, node_type="retail_network", supplier=None):
+        return NetworkNode.objects.create(
+            name=name,
+            node_type=node_type,
+            supplier=supplier,
+            email=f"{name}@test.ru",
+            country="Россия",
+            city="Москва",
+            street="Тестовая",
+            house_number="1",
+        )
+
+    def test_siblings_save_concurrently(self):
+        """Сохранение звена не ждет незавершенного сохранения другого звена того же поставщика"""
+        factory = self.create_node("factory", node_type="factory")
+        first, second = self.create_node("first", supplier=factory), self.create_node("second", supplier=factory)
+        errors = []
+
+        def save_second():
+            try:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute("SET LOCAL lock_timeout = '2s'")
+                    second.save()
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            first.save()  # Блокировки держатся до конца транзакции
+            thread = threading.Thread(target=save_second)
+            thread.start()
+            thread.join()
+        self.assertEqual(errors, [])
@@ -1,7 +1,12 @@
+import os
+import tempfile
+
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from rest_framework.test import APIRequestFactory
 
+from network.access import get_access_context
 from network.models import Employee
 from network.permissions import DepartmentPermission, IsActiveEmployee
 from network.views import NetworkNodeViewSet
@@ -120,3 +125,81 @@ class PermissionsTest(TestCase):
         request = self.factory.delete("/")
         request.user = self.analyst_user
         self.assertFalse(permission.has_permission(request, self.view))
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.path.join(tempfile.gettempdir(), "electrochain-test-cache"),
+        }
+    }
+)
+class AccessContextTest(TestCase):
+    """Тесты общего контекста авторизации (с общим для процессов кешем)"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.view = NetworkNodeViewSet()
+        self.user = User.objects.create_user(username="sales", password="sales123", is_staff=True)
+        self.employee = Employee.objects.create(user=self.user, department="Продажи", position="Менеджер")
+
+    def make_request(self, method="get"):
+        request = getattr(self.factory, method)("/")
+        request.user = self.user
+        return request
+
+    def test_profile_loaded_once_per_request(self):
+        """Все проверки прав в рамках запроса используют один запрос к БД"""
+        request = self.make_request("post")
+        with self.assertNumQueries(1):
+            self.assertTrue(IsActiveEmployee().has_permission(request, self.view))
+            self.assertTrue(DepartmentPermission().has_permission(request, self.view))
+            self.assertTrue(IsActiveEmployee().has_permission(request, self.view))
+
+    def test_profile_cached_between_requests(self):
+        """Повторный запрос берет профиль из кеша"""
+        get_access_context(self.make_request())
+        with self.assertNumQueries(0):
+            context = get_access_context(self.make_request())
+        self.assertEqual(context.employee, self.employee)
+
+    def test_cache_invalidated_on_employee_change(self):
+        """Деактивация сотрудника сразу отражается в правах"""
+        self.assertTrue(IsActiveEmployee().has_permission(self.make_request(), self.view))
+
+        self.employee.is_active = False
+        self.employee.save()
+
+        self.assertFalse(IsActiveEmployee().has_permission(self.make_request(), self.view))
+
+    def test_context_follows_request_user(self):
+        """Смена request.user в рамках запроса приводит к новому контексту"""
+        analyst = User.objects.create_user(username="analyst", password="analyst123", is_staff=True)
+        Employee.objects.create(user=analyst, department="Аналитика", position="Аналитик")
+
+        request = self.make_request("post")
+        self.assertTrue(DepartmentPermission().has_permission(request, self.view))
+        request.user = analyst
+        self.assertFalse(DepartmentPermission().has_permission(request, self.view))
+
+    def test_department_policy_is_case_insensitive(self):
+        """Отдел сопоставляется без учета регистра, неизвестный отдел - только чтение"""
+        self.employee.department = "SALES"
+        self.employee.save()
+        self.assertTrue(get_access_context(self.make_request()).allows_method("POST"))
+        self.assertFalse(get_access_context(self.make_request()).allows_method("DELETE"))
+
+        self.employee.department = "Склад"
+        self.employee.save()
+        context = get_access_context(self.make_request())
+        self.assertTrue(context.allows_method("GET"))
+        self.assertFalse(context.allows_method("POST"))
+
+    def test_process_local_cache_is_not_used(self):
+        """С кешем в памяти процесса сброс не виден другим воркерам - профиль читается из БД"""
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            get_access_context(self.make_request())
+            with self.assertNumQueries(1):
+                get_access_context(self.make_request())
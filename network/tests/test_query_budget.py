@@ -0,0 +1,278 @@
+"""
+Бюджеты SQL-запросов для всех маршрутов проекта.
+
+Тест обходит зарегистрированные маршруты (API, аутентификация, веб-страницы,
+списки объектов в админке) и выполняет запрос к каждому на маленьком наборе
+данных и на наборе в несколько раз больше. Число запросов не должно зависеть
+от числа строк и превышать бюджет маршрута, суммарное время SQL - лимит
+маршрута. Маршрут без бюджета и не из списка исключений - ошибка теста:
+бюджет задается вместе с новым эндпоинтом.
+"""
+
+import itertools
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import URLResolver, get_resolver, resolve, reverse
+from rest_framework.authtoken.models import Token
+
+from network.generator import NetworkGenerator
+from network.jobs import enqueue
+from network.models import Employee, Job, NetworkNode, Product, ProfiledRequest
+
+SQL_TIME_BUDGET_MS = 250  # Суммарное время SQL одного запроса по умолчанию
+
+# Во сколько раз больший набор данных создается для второго прохода
+LARGE_SCALE = 5
+
+
+class Budget:
+    """
+    Запрос к маршруту и его бюджет. args и data - функции от теста (объекты
+    набора данных, уникальные значения для создающих запросов), url - адрес,
+    если reverse() возвращает адрес, перекрытый другим маршрутом.
+    """
+
+    def __init__(
+        self, queries, method="get", args=None, params=None, data=None, status=200, sql_ms=SQL_TIME_BUDGET_MS, url=None
+    ):
+        self.queries = queries
+        self.method = method
+        self.args = args
+        self.url = url
+        self.params = params
+        self.data = data
+        self.status = status
+        self.sql_ms = sql_ms
+
+
+def node_pk(test):
+    return [test.node.pk]
+
+
+def employee_pk(test):
+    return [test.employee.pk]
+
+
+def import_rows(test):
+    return {
+        "rows": [
+            {
+                "name": f"ИП бюджет {index}",
+                "node_type": "individual_entrepreneur",
+                "email": f"budget{index}@test.ru",
+                "city": "Москва",
+                "street": "Тестовая",
+                "house_number": "1",
+                "supplier": test.node.pk,
+            }
+            for index in (next(test.sequence), next(test.sequence))
+        ]
+    }
+
+
+def registration(test):
+    index = next(test.sequence)
+    return {
+        "username": f"budget{index}",
+        "email": f"budget{index}@test.ru",
+        "password": "Budget-pass-123",
+        "password_confirm": "Budget-pass-123",
+        "department": "Продажи",
+        "position": "Менеджер",
+    }
+
+
+def credentials(test):
+    return {"username": test.user.username, "password": "admin123"}
+
+
+BUDGETS = {
+    # API звеньев сети
+    "networknode-list": Budget(5),
+    "networknode-detail": Budget(5, args=node_pk),
+    "networknode-by-country": Budget(5, params={"country": "Россия"}),
+    "networknode-suppliers-summary": Budget(4),
+    "networknode-descendants": Budget(6, args=lambda test: [test.factory.pk]),
+    "networknode-ancestors": Budget(6, args=node_pk),
+    "networknode-debt-rollup": Budget(5, args=lambda test: [test.factory.pk]),
+    "networknode-factories-debt-rollup": Budget(5),
+    "networknode-export": Budget(5, params={"file_format": "csv"}),
+    "networknode-availability": Budget(6),
+    "networknode-clear-debt": Budget(12, method="post", args=node_pk),  # save(): звено FOR UPDATE, поставщик FOR SHARE
+    "networknode-bulk-clear-debt": Budget(8, method="post", data=lambda test: {"subtree": test.factory.pk}),
+    "networknode-import-nodes": Budget(9, method="post", data=import_rows, status=201),
+    # Продукты, сотрудники, задачи
+    # network.urls подключен и с префиксом api/, и без него: /api/products/ - веб-страница product_list
+    "product-list": Budget(4, url="/api/api/products/"),
+    "product-detail": Budget(4, args=lambda test: [test.product.pk]),
+    "employee-list": Budget(4),
+    "employee-detail": Budget(4, args=employee_pk),
+    "employee-activate": Budget(5, method="post", args=employee_pk),
+    "employee-deactivate": Budget(5, method="post", args=employee_pk),
+    "job-list": Budget(4),
+    "job-detail": Budget(4, args=lambda test: [test.job.pk]),
+    "api-root": Budget(2, url="/api/api/"),  # /api/ - главная страница
+    # Асинхронное чтение
+    "async-networknode-list": Budget(5),
+    "async-networknode-detail": Budget(5, args=node_pk),
+    "async-networknode-by-country": Budget(5, params={"country": "Россия"}),
+    "async-networknode-suppliers-summary": Budget(4),
+    # Аутентификация и служебные эндпоинты
+    "login": Budget(8, method="post", data=credentials),
+    "logout": Budget(5, method="post"),
+    "current-employee": Budget(3),
+    "register-employee": Budget(7, method="post", data=registration, status=201),
+    "profile": Budget(3),
+    "readiness": Budget(1),
+    "metrics": Budget(2),
+    "rest_framework:login": Budget(0),
+    # Веб-страницы
+    "home": Budget(6),
+    "network_list": Budget(4),
+    "product_list": Budget(4),
+    "about": Budget(2),
+    "login_page": Budget(2),
+    "logout_page": Budget(4, status=302),
+    "schema-swagger-ui": Budget(2),
+    "schema-redoc": Budget(2),
+    # Админка
+    "admin:index": Budget(3),
+    "admin:app_list": Budget(2, args=lambda test: ["network"]),
+    "admin:network_networknode_changelist": Budget(8),
+    "admin:network_product_changelist": Budget(5),
+    "admin:network_job_changelist": Budget(5),
+    "admin:network_profiledrequest_changelist": Budget(6),
+    "admin:network_profiledrequest_download": Budget(4, args=lambda test: [test.profile.pk, "speedscope"]),
+    "admin:auth_user_changelist": Budget(6),
+    "admin:auth_group_changelist": Budget(5),
+    "admin:authtoken_tokenproxy_changelist": Budget(5),
+}
+
+# Маршруты без бюджета: формы отдельных объектов и служебные страницы админки
+SKIPPED = {
+    "rest_framework:logout": "только POST с CSRF-формой DRF, выход проверяет logout",
+    "admin:login": "вход в админку",
+    "admin:logout": "выход из админки",
+    "admin:password_change": "форма смены пароля",
+    "admin:password_change_done": "страница после смены пароля",
+    "admin:autocomplete": "автодополнение виджетов форм",
+    "admin:jsi18n": "переводы для JavaScript",
+    "admin:view_on_site": "перенаправление на сайт",
+}
+SKIPPED_ADMIN_SUFFIXES = ("_add", "_change", "_delete", "_history", "_password_change")
+
+
+def registered_routes(patterns=None, namespace=None):
+    """Имена всех именованных маршрутов (с пространством имен, без повторов)"""
+    names = set()
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            inner = namespace
+            if pattern.namespace:
+                inner = f"{namespace}:{pattern.namespace}" if namespace else pattern.namespace
+            names |= registered_routes(pattern.url_patterns, inner)
+        elif pattern.name:
+            names.add(f"{namespace}:{pattern.name}" if namespace else pattern.name)
+    return names
+
+
+def is_skipped(name):
+    return name in SKIPPED or (name.startswith("admin:") and name.endswith(SKIPPED_ADMIN_SUFFIXES))
+
+
+class QueryBudgetTest(TestCase):
+    """Число SQL-запросов эндпоинтов не растет с числом строк и не превышает бюджет"""
+
+    def setUp(self):
+        self.sequence = itertools.count()
+        self.user = User.objects.create_superuser(username="admin", password="admin123", email="admin@test.ru")
+        Employee.objects.create(user=self.user, department="Продажи", position="Руководитель", is_active=True)
+        self.seed("small", 1)
+
+        self.factory = NetworkNode.objects.filter(level=0).order_by("pk").first()
+        self.node = NetworkNode.objects.filter(level=2).order_by("pk").first()
+        self.product = Product.objects.order_by("pk").first()
+        self.employee = Employee.objects.exclude(user=self.user).order_by("pk").first()
+        self.job = Job.objects.order_by("pk").first()
+        self.profile = ProfiledRequest.objects.order_by("pk").first()
+
+    def seed(self, label, scale):
+        """Сеть, продукты, сотрудники с токенами, задачи и профили запросов; объем пропорционален scale"""
+        NetworkGenerator(
+            factories=2 * scale, depth=3, fan_out=(2, 3), products=5 * scale, density=0.5, label=label, seed=scale
+        ).run()
+        for index in range(3 * scale):
+            user = User.objects.create_user(
+                username=f"{label}{index}", email=f"{label}{index}@test.ru", first_name="Иван", is_staff=True
+            )
+            Employee.objects.create(user=user, department="Продажи", position="Менеджер", is_active=True)
+            Token.objects.create(user=user)
+            enqueue(Job.Kind.REBUILD_STATISTICS, user=self.user)
+            ProfiledRequest.objects.create(
+                method="GET",
+                path="/api/api/nodes/",
+                view_name="networknode-list",
+                profiler=ProfiledRequest.Profiler.SAMPLE,
+                status_code=200,
+                duration_ms=10,
+                samples=2,
+                artifact=b"main (views.py:1);list (views.py:2) 2\n",
+                created_by=user,
+            )
+
+    def request(self, name, budget):
+        """Выполняет запрос маршрута; возвращает число SQL-запросов и их суммарное время, мс"""
+        client = Client()
+        client.force_login(self.user)
+        url = budget.url or reverse(name, args=budget.args(self) if budget.args else None)
+        self.assertEqual(resolve(url).view_name, name, f"{url} обрабатывает другой маршрут")
+        timings = []
+
+        def timer(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                timings.append(time.perf_counter() - started)
+
+        with connection.execute_wrapper(timer):
+            if budget.method == "get":
+                response = client.get(url, budget.params)
+            else:
+                data = budget.data(self) if budget.data else {}
+                response = client.post(url, json.dumps(data), content_type="application/json")
+            if response.streaming:
+                b"".join(response.streaming_content)
+
+        self.assertEqual(response.status_code, budget.status, f"{name}: {url}")
+        return len(timings), sum(timings) * 1000
+
+    def measure_all(self):
+        # Первый запрос маршрута прогревает кеши (ContentType, контекст доступа, статистика)
+        for name, budget in BUDGETS.items():
+            self.request(name, budget)
+        return {name: self.request(name, budget) for name, budget in BUDGETS.items()}
+
+    def test_every_route_has_budget(self):
+        """Новый маршрут нужно добавить в BUDGETS или SKIPPED"""
+        routes = registered_routes()
+        missing = sorted(name for name in routes if name not in BUDGETS and not is_skipped(name))
+        self.assertEqual(missing, [])
+        self.assertEqual(sorted(set(BUDGETS) - routes), [])  # Бюджеты удаленных маршрутов
+
+    def test_queries_do_not_grow_with_rows(self):
+        small = self.measure_all()
+        self.seed("large", LARGE_SCALE)
+        large = self.measure_all()
+        small_nodes = NetworkNode.objects.filter(email__endswith="@small.invalid").count()
+        self.assertGreater(NetworkNode.objects.count(), LARGE_SCALE * small_nodes)
+
+        for name, budget in BUDGETS.items():
+            with self.subTest(route=name):
+                self.assertEqual(large[name][0], small[name][0], "число запросов зависит от числа строк")
+                self.assertLessEqual(large[name][0], budget.queries)
+                self.assertLessEqual(large[name][1], budget.sql_ms)
@@ -2,14 +2,18 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from . import views
-from .views import (CurrentEmployeeView, EmployeeViewSet, LoginView,
-                    LogoutView, NetworkNodeViewSet, ProductViewSet,
+from .async_views import (AsyncNetworkNodeByCountryView,
+                          AsyncNetworkNodeDetailView, AsyncNetworkNodeListView,
+                          AsyncSuppliersSummaryView)
+from .views import (CurrentEmployeeView, EmployeeViewSet, JobViewSet,
+                    LoginView, LogoutView, NetworkNodeViewSet, ProductViewSet,
                     RegisterEmployeeView)
 
 router = DefaultRouter()
 router.register(r"network-nodes", NetworkNodeViewSet, basename="networknode")
 router.register(r"products", ProductViewSet, basename="product")
 router.register(r"employees", EmployeeViewSet, basename="employee")
+router.register(r"jobs", JobViewSet, basename="job")
 
 urlpatterns = [
     # API маршруты (с префиксом api/)
@@ -20,6 +24,23 @@ urlpatterns = [
     path("api/auth/me/", CurrentEmployeeView.as_view(), name="current-employee"),
     path("api/auth/register/", RegisterEmployeeView.as_view(), name="register-employee"),
     path("api/api-auth/", include("rest_framework.urls", namespace="rest_framework")),
+    path("api/health/ready/", views.readiness_check, name="readiness"),
+    path("api/metrics/", views.metrics, name="metrics"),
+    # Асинхронное чтение звеньев (под ASGI поток не блокируется на время запросов к БД)
+    path("api/async/network-nodes/", AsyncNetworkNodeListView.as_view(), name="async-networknode-list"),
+    path(
+        "api/async/network-nodes/by_country/",
+        AsyncNetworkNodeByCountryView.as_view(),
+        name="async-networknode-by-country",
+    ),
+    path(
+        "api/async/network-nodes/suppliers_summary/",
+        AsyncSuppliersSummaryView.as_view(),
+        name="async-networknode-suppliers-summary",
+    ),
+    path(
+        "api/async/network-nodes/<int:pk>/", AsyncNetworkNodeDetailView.as_view(), name="async-networknode-detail"
+    ),
     # Веб-страницы (без префикса)
     path("", views.home, name="home"),  # Главная страница
     path("network/", views.network_list, name="network_list"),
@@ -1,8 +1,10 @@
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.db.models import Avg, Count, Q, Sum
-from django.http import HttpResponseRedirect
+from django.db.models import Count
+from django.http import (HttpResponse, HttpResponseForbidden,
+                         HttpResponseRedirect, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import render
 from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
@@ -12,29 +14,73 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .access import get_access_context
 from .authentication import ActiveEmployeeAuthentication
-from .filters import NetworkNodeFilter
-from .models import Employee, NetworkNode, Product
+from .availability import MATRIX_ENCODINGS, availability_matrix
+from .export import EXPORT_FORMATS, iter_export_rows
+from .fastpath import FastListMixin
+from .fieldsets import SparseFieldsetViewMixin
+from .filters import NetworkNodeFilter, clear_debt_target
+from .health import readiness
+from .importer import import_network, parse_rows
+from .instrumentation import PhaseTimingViewMixin
+from .jobs import async_threshold, clear_debt_report, enqueue
+from .metrics import (PROMETHEUS_CONTENT_TYPE, has_metrics_access,
+                      prometheus_text)
+from .models import Employee, Job, NetworkNode, Product
+from .pagination import NetworkNodeKeysetPagination, ProductKeysetPagination
 from .permissions import (DepartmentPermission, IsActiveEmployee,
                           IsAdminOrReadOnlyForEmployees)
-from .serializers import (EmployeeSerializer, NetworkNodeCreateSerializer,
+from .search import RankedSearchFilter
+from .serializers import (EmployeeSerializer, JobSerializer,
+                          NetworkNodeCreateSerializer,
+                          NetworkNodeHierarchySerializer,
                           NetworkNodeSerializer, NetworkNodeUpdateSerializer,
                           ProductSerializer, UserRegistrationSerializer)
+from .statistics import clear_debt as clear_nodes_debt
+from .statistics import factories_debt_rollup, subtree_debt_rollup
+from .statistics import summary as statistics_summary
 
+# Подсказки по фильтрам в ответе suppliers_summary (общие для синхронного и асинхронного API)
+SUMMARY_FILTERS_AVAILABLE = {
+    "country": "Фильтр по стране: /api/network-nodes/?country=Россия",
+    "city": "Фильтр по городу: /api/network-nodes/?city=Москва",
+    "node_type": "Фильтр по типу: /api/network-nodes/?node_type=factory",
+    "debt": "Фильтр по задолженности: /api/network-nodes/?debt_gt=1000",
+    "has_supplier": "Фильтр по наличию поставщика: /api/network-nodes/?has_supplier=true",
+    "products": "Наличие продуктов: /api/network-nodes/?products_all=1,2 (или products_any=1,2)",
+}
 
-class ProductViewSet(viewsets.ModelViewSet):
+
+def wants_async(request):
+    return request.query_params.get("async", "").lower() in ("1", "true", "yes")
+
+
+def job_accepted(request, job):
+    """Ответ 202 Accepted со ссылкой на статус фоновой задачи"""
+    url = request.build_absolute_uri(reverse("job-detail", args=[job.pk]))
+    return Response({"job_id": job.pk, "status": job.status, "url": url}, status=status.HTTP_202_ACCEPTED)
+
+
+class ProductViewSet(PhaseTimingViewMixin, FastListMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """ViewSet для модели Product с проверкой прав доступа"""
 
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     authentication_classes = [ActiveEmployeeAuthentication]
     permission_classes = [IsActiveEmployee, IsAdminOrReadOnlyForEmployees]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ["name", "model"]
+    pagination_class = ProductKeysetPagination  # Включается параметрами page_size/cursor
+    filter_backends = [RankedSearchFilter, filters.OrderingFilter]
+    search_fields = ["name", "model", "description"]  # Поля search_vector (для схемы API)
+    trigram_search_fields = ["name"]
     ordering_fields = ["name", "release_date"]
 
+    def get_queryset(self):
+        # ?fields= - только нужные столбцы
+        return self.get_fieldset_queryset(super().get_queryset())
+
 
-class NetworkNodeViewSet(viewsets.ModelViewSet):
+class NetworkNodeViewSet(PhaseTimingViewMixin, FastListMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet для модели NetworkNode с проверкой прав доступа.
     """
@@ -42,16 +88,25 @@ class NetworkNodeViewSet(viewsets.ModelViewSet):
     queryset = NetworkNode.objects.all()
     authentication_classes = [ActiveEmployeeAuthentication]
     permission_classes = [IsActiveEmployee, DepartmentPermission]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = NetworkNodeKeysetPagination  # Включается параметрами page_size/cursor
+    filter_backends = [DjangoFilterBackend, RankedSearchFilter, filters.OrderingFilter]
     filterset_class = NetworkNodeFilter
-    search_fields = ["name", "email", "city", "country"]
+    search_fields = ["name", "email", "city", "country", "street", "phone"]  # Поля search_vector (для схемы API)
+    trigram_search_fields = ["name"]
     ordering_fields = ["name", "created_at", "debt", "level"]
+    fieldset_actions = ("list", "retrieve", "by_country")
+
+    def get_queryset(self):
+        # Поставщик и продукты подгружаются, только если попадают в ответ (?fields=, ?expand=)
+        return self.get_fieldset_queryset(super().get_queryset())
 
     def get_serializer_class(self):
         if self.action == "create":
             return NetworkNodeCreateSerializer
         elif self.action in ["update", "partial_update"]:
             return NetworkNodeUpdateSerializer
+        elif self.action in ["descendants", "ancestors"]:
+            return NetworkNodeHierarchySerializer
         return NetworkNodeSerializer
 
     def perform_create(self, serializer):
@@ -71,39 +126,149 @@ class NetworkNodeViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response({"error": "Параметр country обязателен"}, status=status.HTTP_400_BAD_REQUEST)
 
+    def _hierarchy_response(self, request, get_related):
+        """Общая обработка параметров max_depth и node_type для descendants/ancestors"""
+        max_depth = request.query_params.get("max_depth")
+        if max_depth is not None:
+            try:
+                max_depth = int(max_depth)
+                if max_depth < 1:
+                    raise ValueError
+            except ValueError:
+                return Response(
+                    {"error": "Параметр max_depth должен быть положительным целым числом"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        node_type = request.query_params.get("node_type")
+        if node_type and node_type not in NetworkNode.NodeType.values:
+            return Response({"error": "Неизвестный тип звена"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Параметр node_type относится к результату, поэтому опорное звено ищем без filter_queryset()
+        node = generics.get_object_or_404(self.get_queryset(), pk=self.kwargs["pk"])
+        self.check_object_permissions(request, node)
+
+        queryset = get_related(node, max_depth).select_related("supplier").prefetch_related("products")
+        if node_type:
+            queryset = queryset.filter(node_type=node_type)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=["get"])
+    def descendants(self, request, pk=None):
+        """Все звенья, снабжаемые данным звеном напрямую или через посредников"""
+        return self._hierarchy_response(request, NetworkNode.get_descendants)
+
+    @action(detail=True, methods=["get"])
+    def ancestors(self, request, pk=None):
+        """Цепочка поставщиков от данного звена до завода"""
+        return self._hierarchy_response(request, NetworkNode.get_ancestors)
+
+    @action(detail=True, methods=["get"])
+    def debt_rollup(self, request, pk=None):
+        """Задолженность всей сети ниже звена (включая его) с разбивкой по глубине"""
+        node = generics.get_object_or_404(self.get_queryset(), pk=pk)
+        self.check_object_permissions(request, node)
+        return Response(subtree_debt_rollup(node))
+
+    @action(detail=False, methods=["get"], url_path="debt_rollup")
+    def factories_debt_rollup(self, request):
+        """Задолженность сетей всех заводов с разбивкой по глубине"""
+        return Response(factories_debt_rollup())
+
     @action(detail=False, methods=["get"])
-    def suppliers_summary(self, request):
-        stats = NetworkNode.objects.aggregate(
-            total=Count("id"),
-            factories=Count("id", filter=Q(node_type="factory")),
-            retail_networks=Count("id", filter=Q(node_type="retail_network")),
-            entrepreneurs=Count("id", filter=Q(node_type="individual_entrepreneur")),
-            total_debt=Sum("debt"),
-            avg_debt=Avg("debt"),
-            with_supplier=Count("id", filter=Q(supplier__isnull=False)),
-            without_supplier=Count("id", filter=Q(supplier__isnull=True)),
-        )
+    def export(self, request):
+        """
+        Потоковая выгрузка звеньев в NDJSON (по умолчанию) или CSV: ?file_format=csv.
+        Учитывает все фильтры, поиск и сортировку списка.
+        """
+        file_format = request.query_params.get("file_format", "ndjson")
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"Поддерживаемые форматы: {', '.join(EXPORT_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST
+            )
 
-        countries = (
-            NetworkNode.objects.values("country")
-            .annotate(count=Count("id"), total_debt=Sum("debt"))
-            .order_by("-count")
-        )
+        stream, content_type = EXPORT_FORMATS[file_format]
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(stream(iter_export_rows(queryset)), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="network-nodes.{file_format}"'
+        return response
 
+    @action(detail=False, methods=["get"])
+    def availability(self, request):
+        """
+        Матрица наличия продуктов (звено x продукт) для отфильтрованных звеньев:
+        ?country=..., ?subtree=<id>, ?products_all=..., ?products=<id,...> (столбцы),
+        ?encoding=bitset (по умолчанию) или runs.
+        """
+        encoding = request.query_params.get("encoding", "bitset")
+        if encoding not in MATRIX_ENCODINGS:
+            return Response(
+                {"error": f"Поддерживаемые кодировки: {', '.join(MATRIX_ENCODINGS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        product_ids = request.query_params.get("products")
+        if product_ids is not None:
+            try:
+                product_ids = [int(pk) for pk in product_ids.split(",") if pk.strip()]
+            except ValueError:
+                return Response(
+                    {"error": "Параметр products должен содержать id через запятую"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(availability_matrix(queryset, product_ids, encoding))
+
+    @action(detail=False, methods=["post"], url_path="import")
+    def import_nodes(self, request):
+        """
+        Массовый импорт: файл (поле file, CSV или NDJSON) или JSON {"rows": [...]}.
+        Пакет проверяется целиком; при ошибках ничего не записывается.
+        ?dry_run=true - только проверка.
+        """
+        upload = request.FILES.get("file")
+        try:
+            if upload is not None:
+                file_format = request.data.get("file_format") or upload.name.rsplit(".", 1)[-1].lower()
+                rows = parse_rows(upload.read(), file_format)
+            else:
+                rows = request.data.get("rows")
+                if not isinstance(rows, list):
+                    raise ValueError("Передайте файл (file) или список строк (rows)")
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = request.query_params.get("dry_run", "").lower() in ("1", "true", "yes")
+        if wants_async(request) or len(rows) > async_threshold():
+            params = {"rows": rows, "dry_run": dry_run}
+            return job_accepted(request, enqueue(Job.Kind.IMPORT_NODES, params, user=request.user, total=len(rows)))
+
+        # Как и при создании через API, задолженность задать нельзя
+        result = import_network(rows, dry_run=dry_run, allow_debt=False)
+
+        if not result.is_valid:
+            return Response({"errors": result.error_report()}, status=status.HTTP_400_BAD_REQUEST)
+        if dry_run:
+            return Response({"valid": True, "rows": len(rows)})
         return Response(
-            {
-                "statistics": stats,
-                "by_country": list(countries),
-                "filters_available": {
-                    "country": "Фильтр по стране: /api/network-nodes/?country=Россия",
-                    "city": "Фильтр по городу: /api/network-nodes/?city=Москва",
-                    "node_type": "Фильтр по типу: /api/network-nodes/?node_type=factory",
-                    "debt": "Фильтр по задолженности: /api/network-nodes/?debt_gt=1000",
-                    "has_supplier": "Фильтр по наличию поставщика: /api/network-nodes/?has_supplier=true",
-                },
-            }
+            {"created": len(result.created_ids), "ids": result.created_ids}, status=status.HTTP_201_CREATED
         )
 
+    @action(detail=False, methods=["get"])
+    def suppliers_summary(self, request):
+        # Статистика поддерживается инкрементально (network.statistics)
+        stats, countries = statistics_summary()
+
+        return Response({"statistics": stats, "by_country": countries, "filters_available": SUMMARY_FILTERS_AVAILABLE})
+
     @action(detail=True, methods=["post"])
     def clear_debt(self, request, pk=None):
         """Только активные сотрудники могут очищать задолженность"""
@@ -137,25 +302,41 @@ class NetworkNodeViewSet(viewsets.ModelViewSet):
         if not permission.has_permission(request, self):
             return Response({"error": permission.message}, status=status.HTTP_403_FORBIDDEN)
 
-        ids = request.data.get("ids", [])
-        if not ids:
-            return Response({"error": "Необходимо указать ids объектов"}, status=status.HTTP_400_BAD_REQUEST)
+        target, error = clear_debt_target(request.data)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Большие пакеты выполняются фоновой задачей
+        threshold = async_threshold()
+        if "ids" in target:
+            size = len(target["ids"])
+        else:
+            size = target["queryset"].order_by()[: threshold + 1].count()  # Подсчет ограничен порогом
+        if wants_async(request) or size > threshold:
+            params = {key: request.data[key] for key in ("ids", "filters", "subtree") if key in request.data}
+            return job_accepted(request, enqueue(Job.Kind.CLEAR_DEBT, params, user=request.user))
 
-        queryset = NetworkNode.objects.filter(id__in=ids)
-        count = queryset.count()
-        total_debt = queryset.aggregate(total=Sum("debt"))["total"] or 0
+        return Response(clear_debt_report(clear_nodes_debt(**target)))
 
-        queryset.update(debt=0)
 
-        return Response(
-            {"message": "Задолженность очищена", "cleared_count": count, "total_debt_cleared": float(total_debt)}
-        )
+class JobViewSet(PhaseTimingViewMixin, viewsets.ReadOnlyModelViewSet):
+    """Статус и прогресс фоновых задач. Сотрудник видит свои задачи, суперпользователь - все"""
 
+    serializer_class = JobSerializer
+    authentication_classes = [ActiveEmployeeAuthentication]
+    permission_classes = [IsActiveEmployee]
 
-class EmployeeViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        queryset = Job.objects.all()
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(created_by=self.request.user)
+        return queryset
+
+
+class EmployeeViewSet(PhaseTimingViewMixin, viewsets.ModelViewSet):
     """ViewSet для управления сотрудниками (только для администраторов)"""
 
-    queryset = Employee.objects.all()
+    queryset = Employee.objects.select_related("user")
     serializer_class = EmployeeSerializer
     authentication_classes = [ActiveEmployeeAuthentication]
     permission_classes = [permissions.IsAdminUser]  # Только администраторы
@@ -188,7 +369,7 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         return Response({"status": "Сотрудник деактивирован"})
 
 
-class CurrentEmployeeView(APIView):
+class CurrentEmployeeView(PhaseTimingViewMixin, APIView):
     """Получение информации о текущем сотруднике"""
 
     authentication_classes = [ActiveEmployeeAuthentication]
@@ -199,15 +380,16 @@ class CurrentEmployeeView(APIView):
         if not permission.has_permission(request, self):
             return Response({"error": permission.message}, status=status.HTTP_403_FORBIDDEN)
 
-        try:
-            employee = request.user.employee_profile
-            serializer = EmployeeSerializer(employee)
-            return Response(serializer.data)
-        except Employee.DoesNotExist:
+        # Профиль уже загружен аутентификацией и проверкой прав
+        context = get_access_context(request)
+        if not context.has_profile:
             return Response({"error": "Профиль сотрудника не найден"}, status=status.HTTP_404_NOT_FOUND)
 
+        serializer = EmployeeSerializer(context.employee)
+        return Response(serializer.data)
+
 
-class RegisterEmployeeView(generics.CreateAPIView):
+class RegisterEmployeeView(PhaseTimingViewMixin, generics.CreateAPIView):
     """Регистрация нового сотрудника (только для администраторов)"""
 
     serializer_class = UserRegistrationSerializer
@@ -290,7 +472,7 @@ class LoginView(APIView):
         return Response({"error": "Неверные учетные данные"}, status=status.HTTP_401_UNAUTHORIZED)
 
 
-class LogoutView(APIView):
+class LogoutView(PhaseTimingViewMixin, APIView):
     """Выход из системы"""
 
     authentication_classes = [ActiveEmployeeAuthentication]
@@ -305,16 +487,30 @@ class LogoutView(APIView):
         return Response({"message": "Выход выполнен успешно"})
 
 
+def readiness_check(request):
+    """Готовность к приему запросов: 200, если БД доступна, иначе 503"""
+    ready, payload = readiness()
+    return JsonResponse(payload, status=200 if ready else 503)
+
+
+def metrics(request):
+    """Метрики запросов всех процессов в формате Prometheus (токен METRICS_TOKEN или is_staff)"""
+    if not has_metrics_access(request):
+        return HttpResponseForbidden()
+    return HttpResponse(prometheus_text(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
 def home(request):
     """Главная страница"""
     # Статистика
+    network_stats, _ = statistics_summary()
     stats = {
-        "factories": NetworkNode.objects.filter(node_type="factory").count(),
-        "retail": NetworkNode.objects.filter(node_type="retail_network").count(),
-        "entrepreneurs": NetworkNode.objects.filter(node_type="individual_entrepreneur").count(),
+        "factories": network_stats["factories"],
+        "retail": network_stats["retail_networks"],
+        "entrepreneurs": network_stats["entrepreneurs"],
         "products": Product.objects.count(),
-        "total_debt": NetworkNode.objects.aggregate(total=Sum("debt"))["total"] or 0,
-        "total_nodes": NetworkNode.objects.count(),
+        "total_debt": network_stats["total_debt"] or 0,
+        "total_nodes": network_stats["total"],
     }
 
     # Последние добавленные
@@ -348,8 +544,7 @@ def network_list(request):
     if sort == "debt":
         nodes = nodes.order_by("-debt")
     elif sort == "level":
-        # Сортируем через Python, так как level - свойство
-        nodes = sorted(nodes, key=lambda x: x.level)
+        nodes = nodes.order_by("level", "name")
     else:
         nodes = nodes.order_by("name")
 
@@ -365,7 +560,8 @@ def network_list(request):
 
 def product_list(request):
     """Список продуктов"""
-    products = Product.objects.all()
+    # Число звеньев - аннотацией, а не запросом на каждую карточку
+    products = Product.objects.annotate(nodes_count=Count("network_nodes"))
 
     # Фильтрация по году
     year = request.GET.get("year")